@@ -16,6 +16,8 @@ from app.config import get_settings
 from app.bot.handlers import router
 from app.database import init_db
 from app.scheduler import setup_scheduler, shutdown_scheduler
+from app.services.remnawave import get_remnawave_service
+from app.services.yookassa_service import get_yookassa_service
 
 logger = logging.getLogger(__name__)
 
@@ -33,6 +35,14 @@ async def start_bot():
     await init_db()
     logger.info("Database initialized")
 
+    # HTTP клиент Remnawave (общий пул для хендлеров и задач scheduler)
+    remnawave = get_remnawave_service()
+    await remnawave.start()
+
+    # HTTP клиент YooKassa (автоплатежи в scheduler)
+    yookassa = get_yookassa_service()
+    await yookassa.start()
+
     # Инициализация бота
     bot = Bot(
         token=settings.telegram_bot_token,
@@ -60,6 +70,8 @@ async def start_bot():
         # Graceful shutdown
         logger.info("Shutting down...")
         shutdown_scheduler()
+        await remnawave.close()
+        await yookassa.close()
         await bot.session.close()
         logger.info("Bot stopped")
 
@@ -16,6 +16,7 @@ from app.config import get_settings, ADMIN_IDS
 from app.database import async_session_maker
 from app.models.user import User
 from app.services.remnawave import get_remnawave_service
+from app.services.panel_mirror import apply_panel_state
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -187,17 +188,15 @@ async def check_channel_subscription(callback: CallbackQuery):
             if user.remnawave_uuid:
                 try:
                     remnawave = get_remnawave_service()
+                    # Без автоматических повторов: продление может быть относительным
+                    # (не идемпотентно), после таймаута дни могли уже добавиться
                     updated_user = await remnawave.update_user_expiration(
                         uuid=user.remnawave_uuid,
                         days_to_add=bonus_days
                     )
 
-                    # Обновляем локальную БД
-                    new_expire = updated_user.get("expireAt")
-                    if new_expire:
-                        user.subscription_expires_at = datetime.fromisoformat(
-                            new_expire.replace("Z", "+00:00")
-                        ).replace(tzinfo=None)
+                    # Обновляем локальное зеркало панели
+                    if apply_panel_state(user, updated_user):
                         user.is_active = True
 
                 except Exception as e:
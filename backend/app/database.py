@@ -1,13 +1,22 @@
 """
-Настройка базы данных SQLite + SQLAlchemy async.
+Настройка базы данных SQLAlchemy async.
+
+Поддерживаются sqlite+aiosqlite (по умолчанию, один файл на backend и bot)
+и postgresql+asyncpg (несколько воркеров uvicorn / реплик API).
 """
 
+import logging
 from pathlib import Path
+from typing import Optional
 
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.config import Settings, get_settings
 
-from app.config import get_settings
+logger = logging.getLogger(__name__)
 
 
 class Base(DeclarativeBase):
@@ -15,19 +24,90 @@ class Base(DeclarativeBase):
     pass
 
 
-# Создаём папку data если её нет
+# Числовые значения, которые SQLite возвращает при чтении PRAGMA
+_SYNCHRONOUS_VALUES = {"OFF": 0, "NORMAL": 1, "FULL": 2, "EXTRA": 3}
+_TEMP_STORE_VALUES = {"DEFAULT": 0, "FILE": 1, "MEMORY": 2}
+
+
+def sqlite_pragmas(settings: Optional[Settings] = None) -> list[tuple[str, str]]:
+    """
+    PRAGMA для соединения SQLite в порядке применения.
+    busy_timeout первым - переключение journal_mode само может ждать лок.
+    """
+    settings = settings or get_settings()
+    return [
+        ("busy_timeout", str(settings.sqlite_busy_timeout_ms)),
+        ("journal_mode", settings.sqlite_journal_mode.upper()),
+        ("synchronous", settings.sqlite_synchronous.upper()),
+        ("mmap_size", str(settings.sqlite_mmap_size)),
+        ("cache_size", str(settings.sqlite_cache_size)),
+        ("temp_store", settings.sqlite_temp_store.upper()),
+    ]
+
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas: list[tuple[str, str]]) -> None:
+    """Выполнить PRAGMA на новом DBAPI соединении"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas:
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def _expected_pragma_value(name: str, value: str):
+    """Значение в том виде, в котором его вернёт чтение PRAGMA"""
+    if name == "journal_mode":
+        return value.lower()
+    if name == "synchronous":
+        return _SYNCHRONOUS_VALUES.get(value, value)
+    if name == "temp_store":
+        return _TEMP_STORE_VALUES.get(value, value)
+    return int(value)
+
+
 settings = get_settings()
-db_path = settings.database_url.replace("sqlite+aiosqlite:///", "")
-if db_path.startswith("./"):
-    db_path = db_path[2:]
-Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+is_sqlite = settings.database_url.startswith("sqlite")
+
+if is_sqlite:
+    # Создаём папку data если её нет
+    db_path = settings.database_url.replace("sqlite+aiosqlite:///", "")
+    if db_path.startswith("./"):
+        db_path = db_path[2:]
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+
+
+def _engine_options() -> dict:
+    """Параметры create_async_engine для диалекта из database_url"""
+    # Пул задаётся явно: пул aiosqlite по умолчанию зависит от версии SQLAlchemy
+    # (в закреплённой 2.0.36 для файловой БД - NullPool, в новых - очередь без наших
+    # лимитов). С постоянным пулом PRAGMA выполняются один раз на соединение, кеш
+    # страниц (cache_size) живёт между запросами, а размер пула берётся из настроек
+    options = {
+        "echo": settings.debug,
+        "poolclass": AsyncAdaptedQueuePool,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout_seconds,
+    }
+    if is_sqlite:
+        options["connect_args"] = {"check_same_thread": False}
+    else:
+        # Соединения PostgreSQL рвутся при рестарте сервера / idle timeout прокси
+        options["pool_pre_ping"] = True
+        options["pool_recycle"] = settings.db_pool_recycle_seconds
+        # Время в БД наивное UTC, как datetime.utcnow() в коде и CURRENT_TIMESTAMP в SQLite
+        options["connect_args"] = {"server_settings": {"timezone": "UTC"}}
+    return options
+
 
 # Создаём async engine
-engine = create_async_engine(
-    settings.database_url,
-    echo=settings.debug,
-    connect_args={"check_same_thread": False},  # Для SQLite
-)
+engine = create_async_engine(settings.database_url, **_engine_options())
+
+if is_sqlite:
+    @event.listens_for(engine.sync_engine, "connect")
+    def _on_sqlite_connect(dbapi_connection, connection_record):
+        apply_sqlite_pragmas(dbapi_connection, sqlite_pragmas())
 
 # Session factory
 async_session_maker = async_sessionmaker(
@@ -37,11 +117,33 @@ async_session_maker = async_sessionmaker(
 )
 
 
+async def verify_sqlite_pragmas() -> dict:
+    """
+    Прочитать PRAGMA с соединения пула и сравнить с настройками.
+    Например, WAL недоступен на некоторых сетевых ФС, а mmap_size ограничен сборкой SQLite.
+
+    Returns: фактические значения {pragma: value}
+    """
+    actual = {}
+    async with engine.connect() as conn:
+        for name, value in sqlite_pragmas():
+            actual[name] = (await conn.exec_driver_sql(f"PRAGMA {name}")).scalar()
+            expected = _expected_pragma_value(name, value)
+            if actual[name] != expected:
+                logger.warning(f"SQLite PRAGMA {name}={actual[name]}, expected {expected}")
+
+    logger.info("SQLite pragmas: " + ", ".join(f"{k}={v}" for k, v in actual.items()))
+    return actual
+
+
 async def init_db():
     """Инициализация БД - создание таблиц"""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
+    if is_sqlite:
+        await verify_sqlite_pragmas()
+
 
 async def get_db() -> AsyncSession:
     """Dependency для получения сессии БД"""
@@ -50,4 +152,3 @@ async def get_db() -> AsyncSession:
             yield session
         finally:
             await session.close()
-
@@ -11,8 +11,11 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import get_settings
 from app.database import init_db
-from app.routers import users_router, payments_router, tariffs_router
+from app.routers import users_router, payments_router, tariffs_router, bootstrap_router
 from app.routers.admin import router as admin_router
+from app.services.remnawave import get_remnawave_service
+from app.services.yookassa_service import get_yookassa_service
+from app.services.payment_outbox import start_outbox_worker, stop_outbox_worker
 
 # Настройка логирования
 logging.basicConfig(
@@ -33,6 +36,7 @@ class AccessLogFilter(logging.Filter):
     """
     # Эндпоинты которые не логируем при успешном ответе (200)
     QUIET_ENDPOINTS = {
+        "/api/bootstrap",
         "/api/users/me/stats",
         "/api/users/me",
         "/api/tariffs",
@@ -69,11 +73,19 @@ async def lifespan(app: FastAPI):
     logger.info("Starting Oblepiha VPN Backend...")
     await init_db()
     logger.info("Database initialized")
+    remnawave = get_remnawave_service()
+    await remnawave.start()
+    yookassa = get_yookassa_service()
+    await yookassa.start()
+    start_outbox_worker()
     
     yield
     
     # Shutdown
     logger.info("Shutting down...")
+    await stop_outbox_worker()
+    await remnawave.close()
+    await yookassa.close()
 
 
 # Создаём приложение
@@ -103,6 +115,7 @@ app.add_middleware(
 app.include_router(users_router)
 app.include_router(payments_router)
 app.include_router(tariffs_router)
+app.include_router(bootstrap_router)
 app.include_router(admin_router)
 
 
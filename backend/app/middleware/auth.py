@@ -8,17 +8,12 @@ from typing import Optional
 from fastapi import Header, HTTPException, status
 
 from app.config import get_settings
-from app.services.telegram import validate_init_data, parse_user_from_init_data
-from app.schemas.user import UserFromTelegram
+from app.services.telegram import authenticate_init_data
+from app.schemas.user import TelegramUser
 
 logger = logging.getLogger(__name__)
 
 
-class TelegramUser(UserFromTelegram):
-    """Аутентифицированный пользователь Telegram"""
-    pass
-
-
 async def get_current_user(
     x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
 ) -> TelegramUser:
@@ -50,20 +45,13 @@ async def get_current_user(
             detail="Missing X-Telegram-Init-Data header",
         )
     
-    # Валидируем initData
-    if not validate_init_data(x_telegram_init_data):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid Telegram initData",
-        )
-    
-    # Парсим данные пользователя
-    user = parse_user_from_init_data(x_telegram_init_data)
+    # Валидируем initData и получаем пользователя (повторные запросы - из кеша)
+    user = authenticate_init_data(x_telegram_init_data)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not parse user from initData",
+            detail="Invalid Telegram initData",
         )
     
-    return TelegramUser(**user.model_dump())
+    return user
 
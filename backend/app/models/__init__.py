@@ -1,6 +1,11 @@
 from app.models.user import User
+from app.models import user_fts  # noqa: F401 - FTS5 индекс users (SQLite)
 from app.models.payment import Payment
+from app.models.payment_event import PaymentEvent
+from app.models.job_cursor import JobCursor
+from app.models.pending_extension import PendingExtension
 from app.models.referral import ReferralReward
+from app.models.daily_stats import DailyStats
+from app.models.grant_days_job import GrantDaysJob
 
-__all__ = ["User", "Payment", "ReferralReward"]
-
+__all__ = ["User", "Payment", "PaymentEvent", "JobCursor", "PendingExtension", "ReferralReward", "DailyStats", "GrantDaysJob"]
@@ -0,0 +1,56 @@
+"""
+Модель дневной сводки для графиков админки.
+"""
+
+from datetime import date, datetime
+from typing import Optional
+
+from sqlalchemy import BigInteger, Date, DateTime, Integer, Text, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class DailyStats(Base):
+    """
+    Показатели за один день по МСК.
+
+    Строки пересчитываются задачей scheduler (rollup_daily_stats) по курсору
+    в job_cursors: каждый запуск считает только дни начиная с курсора,
+    а /api/admin/timeseries читает готовые строки, не трогая users / payments.
+    """
+
+    __tablename__ = "daily_stats"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+
+    # Пользователи
+    new_users: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+    # Платежи (succeeded, по paid_at)
+    trials: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    paid_payments: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    # Первая оплата платного тарифа пользователем
+    paid_conversions: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    revenue: Mapped[int] = mapped_column(BigInteger, default=0, nullable=False)  # В копейках
+    # JSON: tariff_id -> выручка в копейках
+    revenue_by_tariff_json: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    # Автопродления
+    auto_renew_succeeded: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    auto_renew_failed: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+    # Бонусы
+    channel_bonuses: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    referral_bonuses: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    referral_bonus_days: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime,
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False
+    )
+
+    def __repr__(self) -> str:
+        return f"<DailyStats(day={self.day}, new_users={self.new_users}, revenue={self.revenue})>"
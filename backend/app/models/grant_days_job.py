@@ -0,0 +1,71 @@
+"""
+Модель задачи массового начисления дней подписки.
+"""
+
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Boolean, DateTime, Integer, String, Text, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class GrantDaysJob(Base):
+    """
+    Задача начисления дней когорте пользователей (/api/admin/grant-days).
+
+    Пользователи обрабатываются пачками в порядке users.id, last_user_id - курсор
+    обработанных. Перед запросом в панель пачка отмечается в in_flight_until_id.
+    Если панель недоступна или процесс упал между запросом и commit, при продолжении
+    пачка сверяется с панелью: продлеваются только те, до кого продление не дошло,
+    неоднозначные попадают в uncertain (id - в логе).
+
+    Статусы: running -> completed
+             running -> failed (панель недоступна, ошибка БД) -> running (продолжение)
+    Упавший процесс оставляет running без обновления updated_at - такую задачу
+    тоже можно продолжить.
+    """
+
+    __tablename__ = "grant_days_jobs"
+
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+
+    # Параметры
+    days: Mapped[int] = mapped_column(Integer, nullable=False)
+    cohort: Mapped[str] = mapped_column(String(16), nullable=False)
+    telegram_ids_json: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    include_expired: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+
+    # Состояние
+    status: Mapped[str] = mapped_column(String(16), default="running", nullable=False)
+    last_user_id: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    in_flight_until_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(String(512), nullable=True)
+
+    # Прогресс
+    total: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    processed: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    extended: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    failed: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    skipped_expired: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    uncertain: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+    # Временные метки (updated_at - пульс работающей задачи)
+    started_at: Mapped[datetime] = mapped_column(
+        DateTime,
+        server_default=func.now(),
+        nullable=False
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime,
+        server_default=func.now(),
+        nullable=False
+    )
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    def __repr__(self) -> str:
+        return (
+            f"<GrantDaysJob(id={self.id}, days={self.days}, cohort={self.cohort}, "
+            f"status={self.status}, processed={self.processed}/{self.total})>"
+        )
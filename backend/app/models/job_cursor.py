@@ -0,0 +1,35 @@
+"""
+Модель курсора фоновой задачи.
+"""
+
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import DateTime, String, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class JobCursor(Base):
+    """
+    Позиция, до которой фоновая задача уже обработала данные.
+
+    Задачи scheduler хранят здесь курсор между запусками, чтобы каждый
+    запуск обрабатывал только новое, а не весь интервал заново
+    (например, сверка платежей с YooKassa).
+    """
+
+    __tablename__ = "job_cursors"
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    position: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime,
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False
+    )
+
+    def __repr__(self) -> str:
+        return f"<JobCursor(name={self.name}, position={self.position})>"
@@ -6,7 +6,7 @@
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import BigInteger, Boolean, DateTime, ForeignKey, Integer, String, func
+from sqlalchemy import BigInteger, Boolean, DateTime, ForeignKey, Index, Integer, String, Text, func, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -20,6 +20,21 @@ class Payment(Base):
     """
     
     __tablename__ = "payments"
+    __table_args__ = (
+        # Поиск свежего pending платежа для повторного нажатия "Оплатить"
+        Index("ix_payments_reuse_lookup", "telegram_id", "tariff_id", "status", "created_at"),
+        # Автопродление: недавние платежи пользователя по статусу
+        Index("ix_payments_user_status_created", "user_id", "status", "created_at"),
+        # Статистика админки: оплаченные платежи за период
+        Index("ix_payments_status_paid_at", "status", "paid_at"),
+        # Дневная сводка: неудачные автоплатежи за день
+        Index(
+            "ix_payments_auto_status_created",
+            "status", "created_at",
+            sqlite_where=text("is_auto_payment = 1"),
+            postgresql_where=text("is_auto_payment = TRUE"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     
@@ -36,6 +51,9 @@ class Payment(Base):
     # YooKassa данные
     yookassa_payment_id: Mapped[Optional[str]] = mapped_column(String(64), unique=True, nullable=True, index=True)
     payment_method_id: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    confirmation_url: Mapped[Optional[str]] = mapped_column(String(512), nullable=True)
+    # Запрошено сохранение способа оплаты (setup_auto_renew)
+    save_payment_method: Mapped[bool] = mapped_column(Boolean, default=False)
 
     # Статус: pending, waiting_for_capture, succeeded, canceled
     status: Mapped[str] = mapped_column(String(32), default="pending", nullable=False)
@@ -45,7 +63,8 @@ class Payment(Base):
     auto_payment_attempt: Mapped[int] = mapped_column(Integer, default=0)
     
     # Дополнительные данные (JSON строка)
-    metadata_json: Mapped[Optional[str]] = mapped_column(String(2048), nullable=True)
+    # Text: объект платежа YooKassa бывает длиннее 2048 символов (PostgreSQL проверяет длину)
+    metadata_json: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     
     # Временные метки
     created_at: Mapped[datetime] = mapped_column(
@@ -54,6 +73,13 @@ class Payment(Base):
         nullable=False
     )
     paid_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    # Когда подписка продлена по этому платежу (повторные уведомления не продлевают снова)
+    extended_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    # expireAt в панели до продления и expireAt, который выставляется по этому платежу.
+    # Записываются до первого запроса в панель: повтор после таймаута сверяет их
+    # с панелью, а не добавляет дни снова
+    extension_base_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    extension_target_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
     
     def __repr__(self) -> str:
         return f"<Payment(id={self.id}, user_id={self.user_id}, status={self.status}, amount={self.amount})>"
@@ -0,0 +1,67 @@
+"""
+Модель входящего уведомления YooKassa (outbox).
+"""
+
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import DateTime, Index, Integer, String, Text, UniqueConstraint, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class PaymentEvent(Base):
+    """
+    Уведомление YooKassa (журнал + очередь обработки).
+
+    Webhook только сохраняет событие и сразу отвечает 200,
+    обработку (продление подписки, уведомления, реферальный бонус)
+    выполняет фоновый воркер (app/services/payment_outbox.py).
+
+    UNIQUE (yookassa_payment_id, event) - журнал событий: повторная доставка
+    того же уведомления отсекается в webhook одним запросом по индексу.
+
+    Статусы: pending -> processing -> done
+             pending -> processing -> pending (повтор с задержкой) -> ... -> failed
+    """
+
+    __tablename__ = "payment_events"
+    __table_args__ = (
+        UniqueConstraint("yookassa_payment_id", "event", name="uq_payment_events_payment_event"),
+        # Выборка воркера: due события по статусу
+        Index("ix_payment_events_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+
+    # Данные уведомления
+    yookassa_payment_id: Mapped[str] = mapped_column(String(64), nullable=False)
+    event: Mapped[str] = mapped_column(String(64), nullable=False)  # payment.succeeded, payment.canceled, ...
+    payload: Mapped[str] = mapped_column(Text, nullable=False)  # JSON объекта платежа
+
+    # Обработка
+    status: Mapped[str] = mapped_column(String(16), default="pending", nullable=False)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    next_attempt_at: Mapped[datetime] = mapped_column(
+        DateTime,
+        server_default=func.now(),
+        nullable=False
+    )
+    # Когда событие взято в processing (брошенные дольше таймаута возвращаются в очередь)
+    claimed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    last_error: Mapped[Optional[str]] = mapped_column(String(512), nullable=True)
+
+    # Временные метки
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime,
+        server_default=func.now(),
+        nullable=False
+    )
+    processed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    def __repr__(self) -> str:
+        return (
+            f"<PaymentEvent(id={self.id}, payment={self.yookassa_payment_id}, "
+            f"event={self.event}, status={self.status})>"
+        )
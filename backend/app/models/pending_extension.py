@@ -0,0 +1,63 @@
+"""
+Модель очереди продлений по оплаченным платежам.
+"""
+
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import DateTime, ForeignKey, Index, Integer, String, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class PendingExtension(Base):
+    """
+    Продление подписки, которое нужно выполнить по оплаченному платежу.
+
+    Создаётся в той же транзакции, что и статус succeeded платежа, поэтому
+    оплата без продления не теряется: если Remnawave недоступна или remnawave_uuid
+    не найден, задача scheduler повторяет продление с экспоненциальной задержкой.
+
+    Статусы: pending -> processing -> done
+             pending -> processing -> pending (повтор) -> ... -> dead (разбор в админке)
+
+    UNIQUE payment_id - по одному платежу одна задача продления.
+    """
+
+    __tablename__ = "pending_extensions"
+    __table_args__ = (
+        # Выборка задачи scheduler: due продления по статусу
+        Index("ix_pending_extensions_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+
+    payment_id: Mapped[int] = mapped_column(ForeignKey("payments.id"), nullable=False, unique=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False, index=True)
+    days: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    # Обработка
+    status: Mapped[str] = mapped_column(String(16), default="pending", nullable=False)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    next_attempt_at: Mapped[datetime] = mapped_column(
+        DateTime,
+        server_default=func.now(),
+        nullable=False
+    )
+    claimed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    last_error: Mapped[Optional[str]] = mapped_column(String(512), nullable=True)
+
+    # Временные метки
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime,
+        server_default=func.now(),
+        nullable=False
+    )
+    completed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    def __repr__(self) -> str:
+        return (
+            f"<PendingExtension(id={self.id}, payment_id={self.payment_id}, "
+            f"days={self.days}, status={self.status}, attempts={self.attempts})>"
+        )
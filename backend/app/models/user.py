@@ -6,7 +6,7 @@
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import BigInteger, Boolean, DateTime, String, func
+from sqlalchemy import BigInteger, Boolean, DateTime, Index, String, func, text
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.database import Base
@@ -21,6 +21,36 @@ class User(Base):
     """
     
     __tablename__ = "users"
+    __table_args__ = (
+        # Уведомления об истечении и "истекает сегодня/завтра" в админке
+        Index(
+            "ix_users_active_expires",
+            "subscription_expires_at", "last_notification_sent_at",
+            sqlite_where=text("is_active = 1"),
+            postgresql_where=text("is_active = TRUE"),
+        ),
+        # Кандидаты на автопродление
+        Index(
+            "ix_users_auto_renew_expires",
+            "subscription_expires_at", "payment_method_id",
+            sqlite_where=text("auto_renew_enabled = 1"),
+            postgresql_where=text("auto_renew_enabled = TRUE"),
+        ),
+        # Статистика админки
+        Index("ix_users_created_at", "created_at"),
+        Index(
+            "ix_users_channel_bonus_received_at",
+            "channel_bonus_received_at",
+            sqlite_where=text("channel_bonus_received_at IS NOT NULL"),
+            postgresql_where=text("channel_bonus_received_at IS NOT NULL"),
+        ),
+        Index(
+            "ix_users_trial_used",
+            "telegram_id",
+            sqlite_where=text("trial_used = 1"),
+            postgresql_where=text("trial_used = TRUE"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     
@@ -38,6 +68,12 @@ class User(Base):
     # Статус подписки (кешируем локально)
     subscription_expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
     is_active: Mapped[bool] = mapped_column(Boolean, default=False)
+
+    # Зеркало состояния в Remnawave (обновляется sync и путями записи)
+    remnawave_status: Mapped[Optional[str]] = mapped_column(String(16), nullable=True)  # ACTIVE, DISABLED, LIMITED, EXPIRED
+    traffic_used_bytes: Mapped[int] = mapped_column(BigInteger, default=0)
+    traffic_limit_bytes: Mapped[int] = mapped_column(BigInteger, default=0)
+    panel_synced_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
     
     # Реферальная система (на будущее)
     referrer_id: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True, index=True)
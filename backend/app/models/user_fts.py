@@ -0,0 +1,59 @@
+"""
+Полнотекстовый индекс пользователей для поиска в админке (SQLite FTS5).
+
+users_fts - external content таблица над users: хранит только индекс,
+текст берётся из users по rowid = users.id. Триггеры обновляют индекс
+при INSERT / DELETE и при UPDATE только индексируемых колонок -
+синхронизация с Remnawave и прочие обновления users его не трогают.
+
+Для новой БД таблица и триггеры создаются вместе с users (create_all),
+для существующей - миграцией add_users_fts. В PostgreSQL не создаются.
+"""
+
+from sqlalchemy import DDL, event
+
+from app.models.user import User
+
+USERS_FTS_COLUMNS = (
+    "telegram_username",
+    "first_name",
+    "last_name",
+    "referral_code",
+    "remnawave_username",
+)
+
+_columns = ", ".join(USERS_FTS_COLUMNS)
+_new_values = ", ".join(f"new.{column}" for column in USERS_FTS_COLUMNS)
+_old_values = ", ".join(f"old.{column}" for column in USERS_FTS_COLUMNS)
+
+USERS_FTS_DDL = [
+    # prefix - отдельные индексы префиксов 2 и 3 символов для быстрого "ив*"
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(
+        {_columns},
+        content='users',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS users_fts_ai AFTER INSERT ON users BEGIN
+        INSERT INTO users_fts(rowid, {_columns}) VALUES (new.id, {_new_values});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS users_fts_ad AFTER DELETE ON users BEGIN
+        INSERT INTO users_fts(users_fts, rowid, {_columns}) VALUES ('delete', old.id, {_old_values});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS users_fts_au AFTER UPDATE OF {_columns} ON users BEGIN
+        INSERT INTO users_fts(users_fts, rowid, {_columns}) VALUES ('delete', old.id, {_old_values});
+        INSERT INTO users_fts(rowid, {_columns}) VALUES (new.id, {_new_values});
+    END
+    """,
+]
+
+for _statement in USERS_FTS_DDL:
+    event.listen(User.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
@@ -3,26 +3,59 @@
 Все эндпоинты требуют проверки админского доступа.
 """
 
-from datetime import datetime, timedelta, timezone
+import json
+import logging
+from datetime import date, datetime, time, timedelta, timezone
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from pydantic import BaseModel
-from sqlalchemy import select, func, and_, or_
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from sqlalchemy import select, func, and_, or_, case
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.config import ADMIN_IDS
-from app.database import get_db
+from app.config import ADMIN_IDS, get_settings
+from app.database import async_session_maker, get_db
 from app.middleware.auth import TelegramUser, get_current_user
 from app.models.user import User
 from app.models.payment import Payment
-
-
+from app.models.daily_stats import DailyStats
+from app.models.payment_event import PaymentEvent
+from app.models.pending_extension import PendingExtension
+from app.services.admin_export import (
+    MEDIA_TYPES,
+    PAYMENT_STATUSES,
+    USER_STATUS_FILTERS,
+    ExportFormat,
+    ExportTable,
+    build_export_query,
+    stream_export,
+)
+from app.services.cache import TTLCache
+from app.services.user_search import search_users
+from app.services.remnawave import get_remnawave_service
+from app.services.payment_outbox import notify_outbox
+from app.services.grant_days import (
+    GrantCohort,
+    GrantDaysConflictError,
+    get_grant_job,
+    list_grant_jobs,
+    resume_grant_days,
+    start_grant_days,
+)
+
+
+logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/admin", tags=["admin"])
 
 # Московское время UTC+3
 MSK = timezone(timedelta(hours=3))
 
+_stats_cache: Optional[TTLCache] = None
+
+# Максимальный интервал /timeseries в днях
+TIMESERIES_MAX_DAYS = 366
+
 
 def get_msk_today_bounds() -> tuple[datetime, datetime, datetime]:
     """Возвращает начало сегодня, начало завтра и начало послезавтра по МСК"""
@@ -39,6 +72,11 @@ def get_msk_today_bounds() -> tuple[datetime, datetime, datetime]:
     return today_start_utc, tomorrow_start_utc, day_after_tomorrow_utc
 
 
+def msk_day_start(day: date) -> datetime:
+    """Начало МСК-дня в UTC (naive datetime для SQLite)"""
+    return datetime.combine(day, time.min, tzinfo=MSK).astimezone(timezone.utc).replace(tzinfo=None)
+
+
 async def require_admin(user: TelegramUser = Depends(get_current_user)) -> TelegramUser:
     """Dependency для проверки админского доступа"""
     if user.id not in ADMIN_IDS:
@@ -89,6 +127,94 @@ class StatsResponse(BaseModel):
     generated_at: str
 
 
+class DailyStatsPoint(BaseModel):
+    day: date
+    new_users: int
+    trials: int
+    paid_payments: int
+    paid_conversions: int
+    # Выручка в рублях
+    revenue: int
+    revenue_by_tariff: dict[str, int]
+    auto_renew_succeeded: int
+    auto_renew_failed: int
+    channel_bonuses: int
+    referral_bonuses: int
+    referral_bonus_days: int
+    # Когда строка пересчитана (сегодняшний день неполный)
+    updated_at: datetime
+
+
+class AdminUserItem(BaseModel):
+    id: int
+    telegram_id: int
+    telegram_username: Optional[str] = None
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    referral_code: Optional[str] = None
+    remnawave_username: Optional[str] = None
+    is_active: Optional[bool] = None
+    subscription_expires_at: Optional[datetime] = None
+    auto_renew_enabled: Optional[bool] = None
+    trial_used: Optional[bool] = None
+    created_at: datetime
+
+
+class GrantDaysRequest(BaseModel):
+    days: int = Field(ge=1, le=9999)
+    cohort: GrantCohort
+    telegram_ids: list[int] = []
+    # Продлевать ли истёкшие подписки (от текущего момента, по одному запросу на юзера)
+    include_expired: bool = False
+
+
+class GrantDaysJobItem(BaseModel):
+    id: str
+    days: int
+    cohort: str
+    include_expired: bool
+    status: str
+    total: int
+    processed: int
+    extended: int
+    failed: int
+    skipped_expired: int
+    # Пачка была в запросе к панели при падении процесса - не продлевалась повторно
+    uncertain: int
+    last_user_id: int
+    error: Optional[str] = None
+    started_at: datetime
+    updated_at: datetime
+    finished_at: Optional[datetime] = None
+
+
+class PaymentEventItem(BaseModel):
+    id: int
+    yookassa_payment_id: str
+    event: str
+    status: str
+    attempts: int
+    next_attempt_at: datetime
+    last_error: Optional[str] = None
+    created_at: datetime
+    processed_at: Optional[datetime] = None
+
+
+class PendingExtensionItem(BaseModel):
+    id: int
+    payment_id: int
+    user_id: int
+    telegram_id: Optional[int] = None
+    yookassa_payment_id: Optional[str] = None
+    days: int
+    status: str
+    attempts: int
+    next_attempt_at: datetime
+    last_error: Optional[str] = None
+    created_at: datetime
+    completed_at: Optional[datetime] = None
+
+
 # === Эндпоинты ===
 
 @router.get("/me", response_model=AdminMeResponse)
@@ -100,116 +226,34 @@ async def admin_me(admin: TelegramUser = Depends(require_admin)):
     )
 
 
-@router.get("/stats", response_model=StatsResponse)
-async def get_stats(
-    admin: TelegramUser = Depends(require_admin),
-    db: AsyncSession = Depends(get_db)
-):
-    """Получить статистику для админ-панели"""
-
-    today_start, tomorrow_start, day_after_tomorrow = get_msk_today_bounds()
-    now = datetime.utcnow()
-
-    # === Основные метрики ===
-
-    # Активные подписки
-    active_result = await db.execute(
-        select(func.count()).select_from(User).where(User.is_active == True)
-    )
-    active_subscriptions = active_result.scalar() or 0
+def _count_if(condition):
+    """SUM(CASE WHEN condition THEN 1 ELSE 0 END) - счётчик внутри общего агрегата"""
+    return func.sum(case((condition, 1), else_=0))
 
-    # Новые юзеры сегодня
-    new_users_result = await db.execute(
-        select(func.count()).select_from(User).where(User.created_at >= today_start)
-    )
-    new_users_today = new_users_result.scalar() or 0
 
-    # Триалы сегодня (оплаченные)
-    trials_result = await db.execute(
-        select(func.count()).select_from(Payment).where(
-            and_(
+def paid_payments_stats_query(today_start: datetime):
+    """
+    Счётчики по оплаченным платежам одним агрегатом (по индексу статуса).
+    trial_converted - юзеры с trial, которые потом купили платный тариф
+    """
+    return (
+        select(
+            _count_if(and_(
                 Payment.tariff_id == "trial",
-                Payment.status == "succeeded",
-                Payment.paid_at >= today_start
-            )
-        )
-    )
-    trials_today = trials_result.scalar() or 0
-
-    # Истекает сегодня (с текущего момента до 00:00 МСК завтра)
-    expiring_today_result = await db.execute(
-        select(func.count()).select_from(User).where(
-            and_(
-                User.subscription_expires_at >= now,
-                User.subscription_expires_at < tomorrow_start,
-                User.is_active == True
-            )
-        )
-    )
-    expiring_today = expiring_today_result.scalar() or 0
-
-    # Истекает завтра (00:00 МСК завтра до 00:00 МСК послезавтра)
-    expiring_tomorrow_result = await db.execute(
-        select(func.count()).select_from(User).where(
-            and_(
-                User.subscription_expires_at >= tomorrow_start,
-                User.subscription_expires_at < day_after_tomorrow,
-                User.is_active == True
-            )
-        )
-    )
-    expiring_tomorrow = expiring_tomorrow_result.scalar() or 0
-
-    # === Дополнительные метрики ===
-
-    # Автопродления активны
-    auto_renew_result = await db.execute(
-        select(func.count()).select_from(User).where(User.auto_renew_enabled == True)
-    )
-    auto_renew_enabled = auto_renew_result.scalar() or 0
-
-    # Бонусы за канал сегодня
-    channel_bonus_today_result = await db.execute(
-        select(func.count()).select_from(User).where(
-            User.channel_bonus_received_at >= today_start
-        )
-    )
-    channel_bonus_today = channel_bonus_today_result.scalar() or 0
-
-    # Бонусы за канал всего
-    channel_bonus_total_result = await db.execute(
-        select(func.count()).select_from(User).where(
-            User.channel_bonus_received_at.isnot(None)
+                Payment.paid_at >= today_start,
+            )).label("trials_today"),
+            func.count(func.distinct(case(
+                (and_(User.trial_used == True, Payment.tariff_id != "trial"), Payment.telegram_id),
+            ))).label("trial_converted"),
         )
+        .select_from(Payment)
+        .outerjoin(User, User.telegram_id == Payment.telegram_id)
+        .where(Payment.status == "succeeded")
     )
-    channel_bonus_total = channel_bonus_total_result.scalar() or 0
 
-    # Рефералы (пришедшие по ссылке)
-    referrals_result = await db.execute(
-        select(func.count()).select_from(User).where(User.referrer_id.isnot(None))
-    )
-    referrals_total = referrals_result.scalar() or 0
 
-    # Топ 5 рефереров
-    top_referrers_query = (
-        select(
-            User.telegram_id,
-            User.telegram_username,
-            User.first_name,
-            func.count().label("referral_count")
-        )
-        .select_from(User)
-        .join(
-            User,
-            User.referrer_id == User.telegram_id,
-            isouter=False
-        )
-        .group_by(User.telegram_id, User.telegram_username, User.first_name)
-        .order_by(func.count().desc())
-        .limit(5)
-    )
-
-    # Альтернативный запрос через подзапрос
+def top_referrers_query(limit: int = 5):
+    """Рефереры с наибольшим числом приглашённых"""
     referrer_counts = (
         select(
             User.referrer_id.label("referrer_telegram_id"),
@@ -219,8 +263,7 @@ async def get_stats(
         .group_by(User.referrer_id)
         .subquery()
     )
-
-    top_referrers_result = await db.execute(
+    return (
         select(
             User.telegram_id,
             User.telegram_username,
@@ -229,70 +272,417 @@ async def get_stats(
         )
         .join(referrer_counts, User.telegram_id == referrer_counts.c.referrer_telegram_id)
         .order_by(referrer_counts.c.cnt.desc())
-        .limit(5)
+        .limit(limit)
     )
 
-    top_referrers = [
-        TopReferrer(
-            telegram_id=row.telegram_id,
-            username=row.telegram_username,
-            first_name=row.first_name,
-            referral_count=row.referral_count
-        )
-        for row in top_referrers_result.all()
-    ]
 
-    # === Конверсия trial → платный ===
+def get_stats_cache() -> TTLCache:
+    """Кеш статистики админки (начало МСК-дня в UTC -> StatsResponse)"""
+    global _stats_cache
+    if _stats_cache is None:
+        # Две записи - сегодня и (на границе суток) вчера
+        _stats_cache = TTLCache(max_size=2, ttl_seconds=get_settings().admin_stats_cache_seconds)
+    return _stats_cache
 
-    # Всего юзеров с trial
-    trial_users_result = await db.execute(
-        select(func.count()).select_from(User).where(User.trial_used == True)
-    )
-    trial_users_total = trial_users_result.scalar() or 0
 
-    # Юзеры с trial, которые потом купили платный тариф
-    # (есть succeeded платёж с tariff_id != 'trial')
-    trial_converted_result = await db.execute(
-        select(func.count(func.distinct(Payment.telegram_id)))
-        .select_from(Payment)
-        .join(User, User.telegram_id == Payment.telegram_id)
-        .where(
-            and_(
-                User.trial_used == True,
-                Payment.tariff_id != "trial",
-                Payment.status == "succeeded"
-            )
+async def _compute_stats(
+    today_start: datetime,
+    tomorrow_start: datetime,
+    day_after_tomorrow: datetime,
+) -> StatsResponse:
+    """Посчитать статистику: один проход по users, один по оплаченным payments"""
+    now = datetime.utcnow()
+
+    async with async_session_maker() as db:
+        # === Счётчики по users ===
+        users_result = await db.execute(
+            select(
+                func.count().label("total_users"),
+                _count_if(User.is_active == True).label("active_subscriptions"),
+                _count_if(User.created_at >= today_start).label("new_users_today"),
+                # Истекает сегодня (с текущего момента до 00:00 МСК завтра)
+                _count_if(and_(
+                    User.is_active == True,
+                    User.subscription_expires_at >= now,
+                    User.subscription_expires_at < tomorrow_start,
+                )).label("expiring_today"),
+                # Истекает завтра (00:00 МСК завтра до 00:00 МСК послезавтра)
+                _count_if(and_(
+                    User.is_active == True,
+                    User.subscription_expires_at >= tomorrow_start,
+                    User.subscription_expires_at < day_after_tomorrow,
+                )).label("expiring_tomorrow"),
+                _count_if(User.auto_renew_enabled == True).label("auto_renew_enabled"),
+                _count_if(User.channel_bonus_received_at >= today_start).label("channel_bonus_today"),
+                _count_if(User.channel_bonus_received_at.isnot(None)).label("channel_bonus_total"),
+                _count_if(User.referrer_id.isnot(None)).label("referrals_total"),
+                _count_if(User.trial_used == True).label("trial_users_total"),
+            ).select_from(User)
         )
-    )
-    trial_converted = trial_converted_result.scalar() or 0
+        # SUM по пустой таблице - NULL
+        users = {key: value or 0 for key, value in users_result.one()._mapping.items()}
+
+        # === Счётчики по оплаченным платежам ===
+        payments_result = await db.execute(paid_payments_stats_query(today_start))
+        payments = {key: value or 0 for key, value in payments_result.one()._mapping.items()}
+
+        # === Топ 5 рефереров ===
+        top_referrers_result = await db.execute(top_referrers_query(limit=5))
+
+        top_referrers = [
+            TopReferrer(
+                telegram_id=row.telegram_id,
+                username=row.telegram_username,
+                first_name=row.first_name,
+                referral_count=row.referral_count
+            )
+            for row in top_referrers_result.all()
+        ]
 
     # Процент конверсии
+    trial_users_total = users["trial_users_total"]
+    trial_converted = payments["trial_converted"]
     trial_conversion_percent = (
         round(trial_converted / trial_users_total * 100, 1)
         if trial_users_total > 0 else 0.0
     )
 
-    # === Мета ===
-
-    total_users_result = await db.execute(
-        select(func.count()).select_from(User)
-    )
-    total_users = total_users_result.scalar() or 0
-
     return StatsResponse(
-        active_subscriptions=active_subscriptions,
-        new_users_today=new_users_today,
-        trials_today=trials_today,
-        expiring_today=expiring_today,
-        expiring_tomorrow=expiring_tomorrow,
-        auto_renew_enabled=auto_renew_enabled,
-        channel_bonus_today=channel_bonus_today,
-        channel_bonus_total=channel_bonus_total,
-        referrals_total=referrals_total,
+        active_subscriptions=users["active_subscriptions"],
+        new_users_today=users["new_users_today"],
+        trials_today=payments["trials_today"],
+        expiring_today=users["expiring_today"],
+        expiring_tomorrow=users["expiring_tomorrow"],
+        auto_renew_enabled=users["auto_renew_enabled"],
+        channel_bonus_today=users["channel_bonus_today"],
+        channel_bonus_total=users["channel_bonus_total"],
+        referrals_total=users["referrals_total"],
         top_referrers=top_referrers,
         trial_users_total=trial_users_total,
         trial_converted=trial_converted,
         trial_conversion_percent=trial_conversion_percent,
-        total_users=total_users,
+        total_users=users["total_users"],
         generated_at=datetime.now(MSK).strftime("%d.%m.%Y %H:%M МСК")
     )
+
+
+@router.get("/stats", response_model=StatsResponse)
+async def get_stats(admin: TelegramUser = Depends(require_admin)):
+    """
+    Получить статистику для админ-панели.
+
+    Результат кешируется на admin_stats_cache_seconds в пределах МСК-дня:
+    несколько админов с открытым дашбордом дают один расчёт.
+    """
+    bounds = get_msk_today_bounds()
+    return await get_stats_cache().get_or_load(bounds[0], lambda: _compute_stats(*bounds))
+
+
+@router.get("/timeseries", response_model=list[DailyStatsPoint])
+async def get_timeseries(
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    admin: TelegramUser = Depends(require_admin),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Дневные показатели для графиков (МСК-даты, from и to включительно).
+    По умолчанию - последние 30 дней. Читает готовую сводку daily_stats,
+    которую пересчитывает scheduler.
+    """
+    if date_to is None:
+        date_to = datetime.now(MSK).date()
+    if date_from is None:
+        date_from = date_to - timedelta(days=29)
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    if (date_to - date_from).days >= TIMESERIES_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range is limited to {TIMESERIES_MAX_DAYS} days")
+
+    result = await db.execute(
+        select(DailyStats)
+        .where(DailyStats.day >= date_from, DailyStats.day <= date_to)
+        .order_by(DailyStats.day)
+    )
+    return [
+        DailyStatsPoint(
+            day=row.day,
+            new_users=row.new_users,
+            trials=row.trials,
+            paid_payments=row.paid_payments,
+            paid_conversions=row.paid_conversions,
+            revenue=row.revenue // 100,  # Из копеек в рубли
+            revenue_by_tariff={
+                tariff_id: amount // 100
+                for tariff_id, amount in json.loads(row.revenue_by_tariff_json or "{}").items()
+            },
+            auto_renew_succeeded=row.auto_renew_succeeded,
+            auto_renew_failed=row.auto_renew_failed,
+            channel_bonuses=row.channel_bonuses,
+            referral_bonuses=row.referral_bonuses,
+            referral_bonus_days=row.referral_bonus_days,
+            updated_at=row.updated_at,
+        )
+        for row in result.scalars().all()
+    ]
+
+
+@router.get("/export/{table}")
+async def export_table(
+    table: ExportTable,
+    export_format: ExportFormat = Query("csv", alias="format"),
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    status_filter: Optional[str] = Query(None, alias="status"),
+    admin: TelegramUser = Depends(require_admin),
+):
+    """
+    Выгрузка users или payments потоком (format=csv | ndjson).
+
+    from / to - МСК-даты по created_at, включительно.
+    status: для payments - статус платежа, для users - active / inactive.
+    Сумма платежа - в рублях.
+    """
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    allowed_statuses = USER_STATUS_FILTERS if table == "users" else PAYMENT_STATUSES
+    if status_filter and status_filter not in allowed_statuses:
+        raise HTTPException(
+            status_code=400,
+            detail=f"status for {table} must be one of: {', '.join(allowed_statuses)}"
+        )
+
+    query = build_export_query(
+        table,
+        created_from=msk_day_start(date_from) if date_from else None,
+        created_to=msk_day_start(date_to + timedelta(days=1)) if date_to else None,
+        status_filter=status_filter,
+    )
+
+    filename = "_".join(
+        part for part in (table, date_from and date_from.isoformat(), date_to and date_to.isoformat(), status_filter)
+        if part
+    )
+    logger.info(
+        f"Admin {admin.id} started export: {table}, format={export_format}, "
+        f"from={date_from}, to={date_to}, status={status_filter}"
+    )
+    return StreamingResponse(
+        stream_export(table, export_format, query),
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{export_format}"'},
+    )
+
+
+@router.get("/users/search", response_model=list[AdminUserItem])
+async def search_users_endpoint(
+    q: str = Query(min_length=1, max_length=100),
+    limit: int = 20,
+    admin: TelegramUser = Depends(require_admin),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Поиск пользователя: "@username", имя / фамилия, реферальный код или telegram id.
+    Слова ищутся по префиксу: "ив пет" найдёт "Иван Петров".
+    """
+    users = await search_users(db, q, limit=min(limit, 100))
+    return [AdminUserItem.model_validate(user, from_attributes=True) for user in users]
+
+
+@router.get("/remnawave/cache")
+async def get_remnawave_cache_stats(admin: TelegramUser = Depends(require_admin)):
+    """Статистика кеша пользователей Remnawave в этом процессе (для подбора TTL)"""
+    return get_remnawave_service().cache_stats()
+
+
+@router.get("/remnawave/circuit")
+async def get_remnawave_circuit_stats(admin: TelegramUser = Depends(require_admin)):
+    """Состояние circuit breaker Remnawave в этом процессе"""
+    return get_remnawave_service().circuit_stats()
+
+
+@router.post("/grant-days", response_model=GrantDaysJobItem)
+async def grant_days(
+    request: GrantDaysRequest,
+    admin: TelegramUser = Depends(require_admin),
+):
+    """
+    Начислить дни подписки когорте пользователей.
+
+    Выполняется в фоне, прогресс - GET /api/admin/grant-days/{job_id}.
+    Когорты: all, active, trial_used, auto_renew, telegram_ids.
+    Прерванную задачу продолжают через /resume: запуск заново начислил бы дни дважды,
+    поэтому пока такая же задача не завершена, возвращается 409.
+    """
+    if request.cohort == "telegram_ids" and not request.telegram_ids:
+        raise HTTPException(status_code=400, detail="telegram_ids required for this cohort")
+
+    try:
+        job = await start_grant_days(
+            days=request.days,
+            cohort=request.cohort,
+            telegram_ids=request.telegram_ids,
+            include_expired=request.include_expired,
+        )
+    except GrantDaysConflictError as e:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Job {e.job_id} with the same parameters is not finished, resume it instead",
+        )
+    logger.info(
+        f"Admin {admin.id} started grant days job {job.id}: "
+        f"+{request.days} days, cohort={request.cohort}"
+    )
+    return GrantDaysJobItem.model_validate(job, from_attributes=True)
+
+
+@router.get("/grant-days", response_model=list[GrantDaysJobItem])
+async def get_grant_days_jobs(admin: TelegramUser = Depends(require_admin)):
+    """Последние задачи начисления дней"""
+    jobs = await list_grant_jobs()
+    return [GrantDaysJobItem.model_validate(job, from_attributes=True) for job in jobs]
+
+
+@router.get("/grant-days/{job_id}", response_model=GrantDaysJobItem)
+async def get_grant_days_job(
+    job_id: str,
+    admin: TelegramUser = Depends(require_admin),
+):
+    """Прогресс задачи начисления дней"""
+    job = await get_grant_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return GrantDaysJobItem.model_validate(job, from_attributes=True)
+
+
+@router.post("/grant-days/{job_id}/resume", response_model=GrantDaysJobItem)
+async def resume_grant_days_job(
+    job_id: str,
+    admin: TelegramUser = Depends(require_admin),
+):
+    """
+    Продолжить failed задачу (например, панель была недоступна) или задачу,
+    процесс которой упал, с пачки, на которой она остановилась.
+    Выполняющуюся или завершённую задачу продолжить нельзя (409).
+    """
+    job = await resume_grant_days(job_id)
+    if not job:
+        if not await get_grant_job(job_id):
+            raise HTTPException(status_code=404, detail="Job not found")
+        raise HTTPException(status_code=409, detail="Job is running or already completed")
+    logger.info(f"Admin {admin.id} resumed grant days job {job_id}")
+    return GrantDaysJobItem.model_validate(job, from_attributes=True)
+
+
+@router.get("/payment-events", response_model=list[PaymentEventItem])
+async def get_payment_events(
+    event_status: Optional[str] = None,
+    limit: int = 50,
+    admin: TelegramUser = Depends(require_admin),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Уведомления YooKassa из outbox (новые первыми).
+    event_status: pending, processing, done, failed
+    """
+    query = select(PaymentEvent).order_by(PaymentEvent.id.desc()).limit(min(limit, 500))
+    if event_status:
+        query = query.where(PaymentEvent.status == event_status)
+    result = await db.execute(query)
+    return [PaymentEventItem.model_validate(e, from_attributes=True) for e in result.scalars().all()]
+
+
+@router.post("/payment-events/{event_id}/retry", response_model=PaymentEventItem)
+async def retry_payment_event(
+    event_id: int,
+    admin: TelegramUser = Depends(require_admin),
+    db: AsyncSession = Depends(get_db),
+):
+    """Вернуть упавшее уведомление в очередь outbox"""
+    payment_event = await db.get(PaymentEvent, event_id)
+    if not payment_event:
+        raise HTTPException(status_code=404, detail="Event not found")
+    if payment_event.status != "failed":
+        raise HTTPException(status_code=400, detail="Only failed events can be retried")
+
+    payment_event.status = "pending"
+    payment_event.attempts = 0
+    payment_event.next_attempt_at = datetime.utcnow()
+    await db.commit()
+    notify_outbox()
+
+    logger.info(f"Admin {admin.id} requeued payment event {event_id}")
+    return PaymentEventItem.model_validate(payment_event, from_attributes=True)
+
+
+def _pending_extension_item(pending: PendingExtension, payment: Optional[Payment]) -> PendingExtensionItem:
+    return PendingExtensionItem(
+        id=pending.id,
+        payment_id=pending.payment_id,
+        user_id=pending.user_id,
+        telegram_id=payment.telegram_id if payment else None,
+        yookassa_payment_id=payment.yookassa_payment_id if payment else None,
+        days=pending.days,
+        status=pending.status,
+        attempts=pending.attempts,
+        next_attempt_at=pending.next_attempt_at,
+        last_error=pending.last_error,
+        created_at=pending.created_at,
+        completed_at=pending.completed_at,
+    )
+
+
+@router.get("/pending-extensions", response_model=list[PendingExtensionItem])
+async def get_pending_extensions(
+    extension_status: Optional[str] = "dead",
+    limit: int = 50,
+    admin: TelegramUser = Depends(require_admin),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Продления по оплаченным платежам (новые первыми).
+    extension_status: pending, processing, done, dead (по умолчанию dead - требуют разбора)
+    """
+    query = (
+        select(PendingExtension, Payment)
+        .join(Payment, Payment.id == PendingExtension.payment_id, isouter=True)
+        .order_by(PendingExtension.id.desc())
+        .limit(min(limit, 500))
+    )
+    if extension_status:
+        query = query.where(PendingExtension.status == extension_status)
+    result = await db.execute(query)
+    return [_pending_extension_item(pending, payment) for pending, payment in result.all()]
+
+
+@router.post("/pending-extensions/{extension_id}/retry", response_model=PendingExtensionItem)
+async def retry_pending_extension(
+    extension_id: int,
+    reapply: bool = False,
+    admin: TelegramUser = Depends(require_admin),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Вернуть продление из dead в очередь (например, после исправления remnawave_uuid).
+
+    reapply=true - админ проверил панель и дни по платежу не применены: сохранённые
+    исходный и целевой expireAt сбрасываются, продление считается заново от текущего.
+    """
+    pending = await db.get(PendingExtension, extension_id)
+    if not pending:
+        raise HTTPException(status_code=404, detail="Extension not found")
+    if pending.status != "dead":
+        raise HTTPException(status_code=400, detail="Only dead extensions can be retried")
+
+    payment = await db.get(Payment, pending.payment_id)
+    if reapply and payment:
+        payment.extension_base_at = None
+        payment.extension_target_at = None
+
+    pending.status = "pending"
+    pending.attempts = 0
+    pending.next_attempt_at = datetime.utcnow()
+    await db.commit()
+
+    logger.info(f"Admin {admin.id} requeued pending extension {extension_id} (reapply={reapply})")
+    return _pending_extension_item(pending, payment)
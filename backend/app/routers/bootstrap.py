@@ -0,0 +1,45 @@
+"""
+API для старта Mini App.
+Пользователь, статистика, тарифы и рефералы одним запросом.
+"""
+
+from fastapi import APIRouter, BackgroundTasks, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import TARIFFS
+from app.database import get_db
+from app.middleware.auth import get_current_user, TelegramUser
+from app.routers.users import (
+    build_referral_stats,
+    build_user_response,
+    build_user_stats,
+    ensure_panel_mirror,
+    get_or_create_user,
+)
+from app.schemas.user import BootstrapResponse
+
+router = APIRouter(prefix="/api", tags=["bootstrap"])
+
+
+@router.get("/bootstrap", response_model=BootstrapResponse)
+async def bootstrap(
+    background_tasks: BackgroundTasks,
+    telegram_user: TelegramUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Данные для первого экрана: заменяет /api/users/me, /api/users/me/stats,
+    /api/tariffs и /api/users/me/referrals.
+
+    Одна проверка initData, одна сессия БД и не больше одного запроса в панель
+    (только если зеркало ни разу не заполнялось, см. ensure_panel_mirror).
+    """
+    user = await get_or_create_user(telegram_user, db)
+    stale = await ensure_panel_mirror(user, db, background_tasks)
+
+    return BootstrapResponse(
+        user=build_user_response(user, stale),
+        stats=build_user_stats(user, stale),
+        tariffs=TARIFFS,
+        referrals=await build_referral_stats(user, db),
+    )
@@ -6,8 +6,9 @@ API для пользователей.
 import logging
 import secrets
 from datetime import datetime
+from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
 from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -18,6 +19,11 @@ from app.models.user import User
 from app.models.referral import ReferralReward
 from app.schemas.user import UserResponse, UserStatsResponse, SetReferrerRequest, ReferralStatsResponse
 from app.services.remnawave import get_remnawave_service, RemnawaveError
+from app.services.panel_mirror import (
+    apply_panel_state,
+    is_mirror_stale,
+    refresh_user_from_panel,
+)
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/users", tags=["users"])
@@ -28,13 +34,51 @@ def generate_referral_code() -> str:
     return secrets.token_urlsafe(8)[:10].upper()
 
 
-@router.get("/me", response_model=UserResponse)
-async def get_current_user_data(
-    telegram_user: TelegramUser = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
-):
+def get_local_subscription_state(user: User) -> tuple[bool, int]:
     """
-    Получить данные текущего пользователя.
+    Статус подписки по локальной БД: (is_active, days_left).
+    Используется, когда Remnawave недоступна.
+    """
+    now = datetime.utcnow()
+    expires_at = user.subscription_expires_at
+    if user.is_active and expires_at and expires_at > now:
+        return True, (expires_at - now).days
+    return False, 0
+
+
+async def ensure_panel_mirror(
+    user: User,
+    db: AsyncSession,
+    background_tasks: BackgroundTasks,
+) -> bool:
+    """
+    Проверить свежесть локального зеркала панели.
+
+    Если зеркало ни разу не заполнялось - один раз синхронно читаем панель.
+    Если устарело - ставим обновление в фон после ответа.
+
+    Returns:
+        True если ответ будет построен по устаревшим данным
+    """
+    if not user.remnawave_uuid or not is_mirror_stale(user):
+        return False
+
+    if user.panel_synced_at is None:
+        try:
+            remnawave_user = await get_remnawave_service().get_user_by_uuid(user.remnawave_uuid)
+            if apply_panel_state(user, remnawave_user):
+                await db.commit()
+                return False
+        except RemnawaveError as e:
+            logger.error(f"Failed to get Remnawave user data: {e}")
+
+    background_tasks.add_task(refresh_user_from_panel, user.id)
+    return True
+
+
+async def get_or_create_user(telegram_user: TelegramUser, db: AsyncSession) -> User:
+    """
+    Найти пользователя по telegram_id.
     Если пользователь новый - создаёт его в БД и Remnawave.
     """
     remnawave = get_remnawave_service()
@@ -84,6 +128,7 @@ async def get_current_user_data(
             user.remnawave_uuid = remnawave_user.get("uuid")
             user.remnawave_username = username
             user.subscription_url = remnawave_user.get("subscriptionUrl")
+            apply_panel_state(user, remnawave_user)
             
         except RemnawaveError as e:
             logger.error(f"Failed to create Remnawave user: {e}")
@@ -113,63 +158,31 @@ async def get_current_user_data(
                 user.remnawave_uuid = existing.get("uuid")
                 user.remnawave_username = existing.get("username")
                 user.subscription_url = existing.get("subscriptionUrl")
+                apply_panel_state(user, existing)
             else:
                 logger.error(f"Could not find Remnawave user for telegram_id={telegram_user.id}")
         
         await db.commit()
         await db.refresh(user)
-    
-    # Получаем актуальные данные из Remnawave
-    traffic_used = 0
-    traffic_limit = 0
-    days_left = 0
-    is_active = False
-    subscription_expires_at = user.subscription_expires_at
-    
-    if user.remnawave_uuid:
-        try:
-            remnawave_user = await remnawave.get_user_by_uuid(user.remnawave_uuid)
-            if remnawave_user:
-                # Обновляем subscription_url если изменился
-                new_url = remnawave_user.get("subscriptionUrl")
-                if new_url and new_url != user.subscription_url:
-                    user.subscription_url = new_url
-                    await db.commit()
-                
-                # Статус подписки
-                expire_at_str = remnawave_user.get("expireAt")
-                if expire_at_str:
-                    try:
-                        expire_at = datetime.fromisoformat(expire_at_str.replace("Z", "+00:00"))
-                        expire_at = expire_at.replace(tzinfo=None)
-                        subscription_expires_at = expire_at
-                        
-                        now = datetime.utcnow()
-                        if expire_at > now:
-                            is_active = remnawave_user.get("status") == "ACTIVE"
-                            days_left = (expire_at - now).days
-                    except ValueError:
-                        pass
-                
-                # Трафик
-                traffic_data = remnawave_user.get("userTraffic", {})
-                traffic_used = traffic_data.get("usedBytes", 0)
-                traffic_limit = remnawave_user.get("trafficLimitBytes", 0)
-                
-        except RemnawaveError as e:
-            logger.error(f"Failed to get Remnawave user data: {e}")
-    
+
+    return user
+
+
+def build_user_response(user: User, stale: bool) -> UserResponse:
+    """Данные пользователя из локальной БД и зеркала панели"""
+    is_active, days_left = get_local_subscription_state(user)
+
     return UserResponse(
         id=user.id,
         telegram_id=user.telegram_id,
         telegram_username=user.telegram_username,
         first_name=user.first_name,
         is_active=is_active,
-        subscription_expires_at=subscription_expires_at,
+        subscription_expires_at=user.subscription_expires_at,
         days_left=days_left,
         subscription_url=user.subscription_url,
-        traffic_used_bytes=traffic_used,
-        traffic_limit_bytes=traffic_limit,
+        traffic_used_bytes=user.traffic_used_bytes or 0,
+        traffic_limit_bytes=user.traffic_limit_bytes or 0,
         referral_code=user.referral_code,
         terms_accepted_at=user.terms_accepted_at,
         trial_used=user.trial_used,
@@ -179,79 +192,111 @@ async def get_current_user_data(
         card_last4=user.card_last4,
         card_brand=user.card_brand,
         sbp_phone=user.sbp_phone,
+        stale=stale,
+        synced_at=user.panel_synced_at,
+    )
+
+
+def build_user_stats(user: Optional[User], stale: bool) -> UserStatsResponse:
+    """Статистика для главного экрана из локального зеркала панели"""
+    if not user or not user.remnawave_uuid:
+        return UserStatsResponse(
+            is_active=False,
+            days_left=0,
+            total_days=30,
+            traffic_left_gb=0,
+            total_traffic_gb=500,
+            subscription_url=None,
+        )
+
+    # Расчёт дней
+    is_active, days_left = get_local_subscription_state(user)
+    total_days = 30
+    
+    # Расчёт трафика
+    traffic_used = user.traffic_used_bytes or 0
+    traffic_limit = user.traffic_limit_bytes or 0
+    
+    # Конвертируем в ГБ
+    traffic_used_gb = traffic_used / (1024 ** 3)
+    traffic_limit_gb = traffic_limit / (1024 ** 3) if traffic_limit > 0 else 500
+    traffic_left_gb = max(0, traffic_limit_gb - traffic_used_gb)
+    
+    return UserStatsResponse(
+        is_active=is_active,
+        days_left=days_left,
+        total_days=total_days,
+        traffic_left_gb=round(traffic_left_gb, 1),
+        total_traffic_gb=round(traffic_limit_gb, 1) if traffic_limit > 0 else 500,
+        subscription_url=user.subscription_url,
+        stale=stale,
+        synced_at=user.panel_synced_at,
+    )
+
+
+async def build_referral_stats(user: User, db: AsyncSession) -> ReferralStatsResponse:
+    """Статистика реферальной программы пользователя"""
+    # Количество приглашённых (у кого referrer_id = мой telegram_id)
+    invited_result = await db.execute(
+        select(func.count()).select_from(User).where(User.referrer_id == user.telegram_id)
+    )
+    total_invited = invited_result.scalar() or 0
+
+    # Количество купивших и сумма бонусных дней (из таблицы referral_rewards)
+    rewards_result = await db.execute(
+        select(
+            func.count(ReferralReward.id),
+            func.coalesce(func.sum(ReferralReward.bonus_days), 0)
+        ).where(ReferralReward.referrer_user_id == user.id)
+    )
+    row = rewards_result.one()
+    total_purchased = row[0] or 0
+    total_bonus_days = row[1] or 0
+
+    return ReferralStatsResponse(
+        referral_code=user.referral_code or "",
+        referral_link=f"https://t.me/{get_settings().telegram_bot_username}?start=ref_{user.referral_code}" if user.referral_code else "",
+        total_invited=total_invited,
+        total_purchased=total_purchased,
+        total_bonus_days=total_bonus_days,
     )
 
 
+@router.get("/me", response_model=UserResponse)
+async def get_current_user_data(
+    background_tasks: BackgroundTasks,
+    telegram_user: TelegramUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Получить данные текущего пользователя.
+    Если пользователь новый - создаёт его в БД и Remnawave.
+    Подписка и трафик - из локального зеркала панели (см. panel_mirror).
+    """
+    user = await get_or_create_user(telegram_user, db)
+
+    # Отвечаем из локального зеркала, при устаревании обновляем его в фоне
+    stale = await ensure_panel_mirror(user, db, background_tasks)
+    return build_user_response(user, stale)
+
+
 @router.get("/me/stats", response_model=UserStatsResponse)
 async def get_user_stats(
+    background_tasks: BackgroundTasks,
     telegram_user: TelegramUser = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    """Получить статистику для главного экрана"""
-    remnawave = get_remnawave_service()
-    
+    """Получить статистику для главного экрана (из локального зеркала панели)"""
     # Ищем пользователя
     result = await db.execute(
         select(User).where(User.telegram_id == telegram_user.id)
     )
     user = result.scalar_one_or_none()
     
-    if not user or not user.remnawave_uuid:
-        return UserStatsResponse(
-            is_active=False,
-            days_left=0,
-            total_days=30,
-            traffic_left_gb=0,
-            total_traffic_gb=500,
-            subscription_url=None,
-        )
-    
-    # Получаем данные из Remnawave
-    try:
-        remnawave_user = await remnawave.get_user_by_uuid(user.remnawave_uuid)
-        if not remnawave_user:
-            return UserStatsResponse()
-        
-        # Расчёт дней
-        is_active = False
-        days_left = 0
-        total_days = 30
-        
-        expire_at_str = remnawave_user.get("expireAt")
-        if expire_at_str:
-            try:
-                expire_at = datetime.fromisoformat(expire_at_str.replace("Z", "+00:00"))
-                expire_at = expire_at.replace(tzinfo=None)
-                now = datetime.utcnow()
-                
-                if expire_at > now:
-                    is_active = remnawave_user.get("status") == "ACTIVE"
-                    days_left = (expire_at - now).days
-            except ValueError:
-                pass
-        
-        # Расчёт трафика
-        traffic_data = remnawave_user.get("userTraffic", {})
-        traffic_used = traffic_data.get("usedBytes", 0)
-        traffic_limit = remnawave_user.get("trafficLimitBytes", 0)
-        
-        # Конвертируем в ГБ
-        traffic_used_gb = traffic_used / (1024 ** 3)
-        traffic_limit_gb = traffic_limit / (1024 ** 3) if traffic_limit > 0 else 500
-        traffic_left_gb = max(0, traffic_limit_gb - traffic_used_gb)
-        
-        return UserStatsResponse(
-            is_active=is_active,
-            days_left=days_left,
-            total_days=total_days,
-            traffic_left_gb=round(traffic_left_gb, 1),
-            total_traffic_gb=round(traffic_limit_gb, 1) if traffic_limit > 0 else 500,
-            subscription_url=user.subscription_url,
-        )
-        
-    except RemnawaveError as e:
-        logger.error(f"Failed to get stats from Remnawave: {e}")
-        return UserStatsResponse()
+    stale = False
+    if user and user.remnawave_uuid:
+        stale = await ensure_panel_mirror(user, db, background_tasks)
+    return build_user_stats(user, stale)
 
 
 @router.post("/me/accept-terms")
@@ -486,28 +531,4 @@ async def get_referral_stats(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # Количество приглашённых (у кого referrer_id = мой telegram_id)
-    invited_result = await db.execute(
-        select(func.count()).select_from(User).where(User.referrer_id == telegram_user.id)
-    )
-    total_invited = invited_result.scalar() or 0
-
-    # Количество купивших и сумма бонусных дней (из таблицы referral_rewards)
-    rewards_result = await db.execute(
-        select(
-            func.count(ReferralReward.id),
-            func.coalesce(func.sum(ReferralReward.bonus_days), 0)
-        ).where(ReferralReward.referrer_user_id == user.id)
-    )
-    row = rewards_result.one()
-    total_purchased = row[0] or 0
-    total_bonus_days = row[1] or 0
-
-    return ReferralStatsResponse(
-        referral_code=user.referral_code or "",
-        referral_link=f"https://t.me/{get_settings().telegram_bot_username}?start=ref_{user.referral_code}" if user.referral_code else "",
-        total_invited=total_invited,
-        total_purchased=total_purchased,
-        total_bonus_days=total_bonus_days,
-    )
-
+    return await build_referral_stats(user, db)
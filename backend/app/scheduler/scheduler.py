@@ -2,18 +2,26 @@
 Инициализация и настройка APScheduler.
 
 Расписание задач:
-- Синхронизация с Remnawave: каждые 6 часов (00:00, 06:00, 12:00, 18:00)
+- Синхронизация с Remnawave: каждые remnawave_sync_interval_minutes (по умолчанию час)
 - Уведомления об истечении: каждый час в :00
 - Автопродления: каждый час в :30
+- Повтор продлений по оплаченным платежам: каждую минуту
+- Сверка зависших платежей с YooKassa: каждые payment_reconcile_interval_minutes
+- Дневная сводка для графиков админки: каждые daily_stats_interval_minutes
 """
 
 import logging
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 
+from app.config import get_settings
 from app.scheduler.tasks.sync_remnawave import sync_users_with_remnawave
 from app.scheduler.tasks.expiration_notify import send_expiration_notifications
 from app.scheduler.tasks.auto_renew import process_auto_renewals
+from app.scheduler.tasks.retry_extensions import process_pending_extensions
+from app.scheduler.tasks.reconcile_payments import reconcile_pending_payments
+from app.scheduler.tasks.daily_stats import rollup_daily_stats
 
 logger = logging.getLogger(__name__)
 
@@ -30,11 +38,13 @@ def setup_scheduler(scheduler: AsyncIOScheduler) -> None:
     """
     global _scheduler
     _scheduler = scheduler
+    settings = get_settings()
+    sync_interval = settings.remnawave_sync_interval_minutes
 
-    # Синхронизация с Remnawave - каждые 6 часов
+    # Синхронизация с Remnawave - bulk режим дешёвый, можно запускать часто
     scheduler.add_job(
         sync_users_with_remnawave,
-        trigger=CronTrigger(hour="0,6,12,18", minute=0),
+        trigger=IntervalTrigger(minutes=sync_interval),
         id="sync_remnawave",
         name="Sync with Remnawave",
         replace_existing=True,
@@ -61,10 +71,47 @@ def setup_scheduler(scheduler: AsyncIOScheduler) -> None:
         max_instances=1,
     )
 
+    # Повтор продлений "оплачено, но не продлено" - каждую минуту
+    # (задержка между попытками одной задачи растёт экспоненциально)
+    scheduler.add_job(
+        process_pending_extensions,
+        trigger=IntervalTrigger(minutes=1),
+        id="retry_extensions",
+        name="Retry pending subscription extensions",
+        replace_existing=True,
+        max_instances=1,
+    )
+
+    # Сверка платежей без webhook - инкрементально по курсору
+    scheduler.add_job(
+        reconcile_pending_payments,
+        trigger=IntervalTrigger(minutes=settings.payment_reconcile_interval_minutes),
+        id="reconcile_payments",
+        name="Reconcile pending payments with YooKassa",
+        replace_existing=True,
+        max_instances=1,
+    )
+
+    # Дневная сводка - пересчёт дней от курсора
+    scheduler.add_job(
+        rollup_daily_stats,
+        trigger=IntervalTrigger(minutes=settings.daily_stats_interval_minutes),
+        id="daily_stats",
+        name="Roll up daily stats",
+        replace_existing=True,
+        max_instances=1,
+    )
+
     logger.info("Scheduler jobs configured:")
-    logger.info("  - sync_remnawave: every 6 hours at :00")
+    logger.info(
+        f"  - sync_remnawave: every {sync_interval} min "
+        f"(mode={settings.remnawave_sync_mode})"
+    )
     logger.info("  - expiration_notify: every hour at :00")
     logger.info("  - auto_renew: every hour at :30")
+    logger.info("  - retry_extensions: every minute")
+    logger.info(f"  - reconcile_payments: every {settings.payment_reconcile_interval_minutes} min")
+    logger.info(f"  - daily_stats: every {settings.daily_stats_interval_minutes} min")
 
 
 def shutdown_scheduler() -> None:
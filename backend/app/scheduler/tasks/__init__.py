@@ -5,9 +5,15 @@
 from app.scheduler.tasks.sync_remnawave import sync_users_with_remnawave
 from app.scheduler.tasks.expiration_notify import send_expiration_notifications
 from app.scheduler.tasks.auto_renew import process_auto_renewals
+from app.scheduler.tasks.retry_extensions import process_pending_extensions
+from app.scheduler.tasks.reconcile_payments import reconcile_pending_payments
+from app.scheduler.tasks.daily_stats import rollup_daily_stats
 
 __all__ = [
     "sync_users_with_remnawave",
     "send_expiration_notifications",
     "process_auto_renewals",
+    "process_pending_extensions",
+    "reconcile_pending_payments",
+    "rollup_daily_stats",
 ]
@@ -3,7 +3,7 @@
 
 Для пользователей с включённым автопродлением:
 1. Создаёт платёж в YooKassa по сохранённому payment_method_id
-2. При успехе: продлевает подписку в Remnawave
+2. При успехе: продлевает подписку в Remnawave (через очередь продлений, с повторами)
 3. При ошибке: уведомляет пользователя, повторяет через 6 часов (до 2 попыток)
 """
 
@@ -18,10 +18,9 @@ from app.config import get_tariff_by_id
 from app.database import async_session_maker
 from app.models.user import User
 from app.models.payment import Payment
-from app.services.remnawave import get_remnawave_service, RemnawaveError
+from app.services.extension_queue import enqueue_extension, run_extension
 from app.services.yookassa_service import get_yookassa_service
 from app.services.telegram_notify import (
-    send_auto_renew_success,
     send_auto_renew_failed,
     send_auto_renew_disabled,
 )
@@ -40,6 +39,42 @@ MAX_ATTEMPTS = 2
 PROCESS_DELAY_MS = 100
 
 
+def auto_renew_candidates_query(window_start: datetime, window_end: datetime):
+    """Пользователи с автопродлением, у которых подписка истекает в окне"""
+    return select(User).where(
+        and_(
+            User.auto_renew_enabled == True,
+            User.payment_method_id.isnot(None),
+            User.subscription_expires_at.isnot(None),
+            User.subscription_expires_at >= window_start,
+            User.subscription_expires_at <= window_end,
+        )
+    )
+
+
+def recent_succeeded_payment_query(user_id: int, since: datetime):
+    """Успешные платежи пользователя (любые, не только автоплатежи) после since"""
+    return select(Payment).where(
+        and_(
+            Payment.user_id == user_id,
+            Payment.status == "succeeded",
+            Payment.created_at > since,
+        )
+    )
+
+
+def failed_auto_payments_query(user_id: int, since: datetime):
+    """Неудачные автоплатежи пользователя после since"""
+    return select(Payment).where(
+        and_(
+            Payment.user_id == user_id,
+            Payment.is_auto_payment == True,
+            Payment.status == "canceled",
+            Payment.created_at > since,
+        )
+    )
+
+
 async def process_auto_renewals() -> None:
     """
     Обработать автопродления подписок.
@@ -73,21 +108,12 @@ async def process_auto_renewals() -> None:
     skipped_count = 0
 
     yookassa = get_yookassa_service()
-    remnawave = get_remnawave_service()
 
     try:
         async with async_session_maker() as db:
             # Находим пользователей для автопродления
             result = await db.execute(
-                select(User).where(
-                    and_(
-                        User.auto_renew_enabled == True,
-                        User.payment_method_id.isnot(None),
-                        User.subscription_expires_at.isnot(None),
-                        User.subscription_expires_at >= window_start,
-                        User.subscription_expires_at <= window_end,
-                    )
-                )
+                auto_renew_candidates_query(window_start, window_end)
             )
             users = result.scalars().all()
 
@@ -99,13 +125,7 @@ async def process_auto_renewals() -> None:
                     # ВАЖНО: проверяем ВСЕ платежи, не только автоплатежи!
                     # Иначе ручной платёж не заблокирует автопродление
                     recent_payment = await db.execute(
-                        select(Payment).where(
-                            and_(
-                                Payment.user_id == user.id,
-                                Payment.status == "succeeded",
-                                Payment.created_at > recent_payment_threshold,
-                            )
-                        )
+                        recent_succeeded_payment_query(user.id, recent_payment_threshold)
                     )
                     if recent_payment.scalar_one_or_none():
                         logger.debug(
@@ -117,14 +137,7 @@ async def process_auto_renewals() -> None:
 
                     # Проверяем количество неудачных попыток за 24 часа
                     failed_attempts = await db.execute(
-                        select(Payment).where(
-                            and_(
-                                Payment.user_id == user.id,
-                                Payment.is_auto_payment == True,
-                                Payment.status == "canceled",
-                                Payment.created_at > recent_payment_threshold,
-                            )
-                        )
+                        failed_auto_payments_query(user.id, recent_payment_threshold)
                     )
                     failed_count_for_user = len(failed_attempts.scalars().all())
 
@@ -151,7 +164,7 @@ async def process_auto_renewals() -> None:
                     )
 
                     # Создаём автоплатёж
-                    yookassa_payment = yookassa.create_auto_payment(
+                    yookassa_payment = await yookassa.create_auto_payment(
                         payment_method_id=user.payment_method_id,
                         amount=AUTO_RENEW_AMOUNT,
                         telegram_id=user.telegram_id,
@@ -211,40 +224,24 @@ async def process_auto_renewals() -> None:
                     if yookassa_payment.status == "succeeded" and yookassa_payment.paid:
                         payment.paid_at = datetime.utcnow()
 
-                        # Продлеваем подписку в Remnawave
-                        if user.remnawave_uuid:
-                            try:
-                                await remnawave.update_user_expiration(
-                                    uuid=user.remnawave_uuid,
-                                    days_to_add=AUTO_RENEW_DAYS,
-                                )
-                                user.is_active = True
-
-                                logger.info(
-                                    f"Auto-renewal successful for user {user.telegram_id}"
-                                )
-                                success_count += 1
-
-                                await send_auto_renew_success(
-                                    telegram_id=user.telegram_id,
-                                    days=AUTO_RENEW_DAYS,
-                                    amount=AUTO_RENEW_AMOUNT,
-                                    card_last4=user.card_last4,
-                                )
-
-                            except RemnawaveError as e:
-                                logger.error(
-                                    f"Failed to extend subscription in Remnawave "
-                                    f"for user {user.telegram_id}: {e}"
-                                )
-                                # Платёж прошёл, но Remnawave не обновился
-                                # Это критично - нужно уведомить и обработать вручную
-                                failed_count += 1
+                        # Продление в очередь - в одной транзакции с платежом
+                        await db.flush()
+                        pending = enqueue_extension(db, payment)
+                        await db.commit()
+
+                        # Продлеваем подписку в Remnawave (уведомление отправит очередь).
+                        # При ошибке или без remnawave_uuid продление повторит scheduler
+                        if await run_extension(pending.id):
+                            logger.info(
+                                f"Auto-renewal successful for user {user.telegram_id}"
+                            )
+                            success_count += 1
                         else:
                             logger.error(
-                                f"No remnawave_uuid for user {user.telegram_id}"
+                                f"Auto-payment {yookassa_payment.id} succeeded but extension "
+                                f"for user {user.telegram_id} is queued for retry"
                             )
-                            success_count += 1  # Платёж прошёл
+                            failed_count += 1
 
                     elif yookassa_payment.status == "canceled":
                         # Платёж отклонён
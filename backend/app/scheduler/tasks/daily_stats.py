@@ -0,0 +1,209 @@
+"""
+Задача пересчёта дневной сводки (daily_stats) для графиков админки.
+
+Курсор (job_cursors) - начало первого МСК-дня, который ещё нужно посчитать.
+Каждый запуск пересчитывает дни от курсора до сегодняшнего включительно, поэтому
+в обычном режиме это сегодня и daily_stats_lookback_days предыдущих дней
+(платёж, созданный вечером, может стать succeeded после полуночи).
+Первый запуск заполняет историю с даты первого пользователя, не больше
+daily_stats_max_days_per_run дней за раз.
+
+Каждый день считается несколькими запросами по индексам за его интервал,
+размер таблиц на время запуска почти не влияет.
+"""
+
+import json
+import logging
+from datetime import date, datetime, time, timedelta, timezone
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.database import async_session_maker
+from app.models.daily_stats import DailyStats
+from app.models.job_cursor import JobCursor
+from app.models.payment import Payment
+from app.models.referral import ReferralReward
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+DAILY_STATS_CURSOR_NAME = "daily_stats"
+
+# Московское время UTC+3
+MSK = timezone(timedelta(hours=3))
+
+
+def msk_today() -> date:
+    return datetime.now(MSK).date()
+
+
+def msk_day_bounds(day: date) -> tuple[datetime, datetime]:
+    """Начало дня и начало следующего дня по МСК (naive UTC, как в БД)"""
+    start = datetime.combine(day, time.min, tzinfo=MSK).astimezone(timezone.utc).replace(tzinfo=None)
+    return start, start + timedelta(days=1)
+
+
+def msk_date(moment: datetime) -> date:
+    """МСК-дата момента из БД (naive UTC)"""
+    return moment.replace(tzinfo=timezone.utc).astimezone(MSK).date()
+
+
+# Оплата платного тарифа (для конверсий)
+_PAID_TARIFF_FILTER = and_(Payment.status == "succeeded", Payment.tariff_id != "trial")
+
+
+def failed_auto_payments_count_query(start: datetime, end: datetime):
+    """Неудачные автоплатежи за интервал - по created_at (у отменённых нет paid_at)"""
+    return select(func.count()).select_from(Payment).where(
+        Payment.status == "canceled",
+        Payment.is_auto_payment == True,
+        Payment.created_at >= start,
+        Payment.created_at < end,
+    )
+
+
+def day_buyers_query(start: datetime, end: datetime):
+    """Покупатели платного тарифа за интервал"""
+    return select(Payment.telegram_id).distinct().where(
+        _PAID_TARIFF_FILTER,
+        Payment.paid_at >= start,
+        Payment.paid_at < end,
+    )
+
+
+def first_paid_purchase_query(buyers: list[int], start: datetime):
+    """Из buyers - те, чья самая ранняя оплата платного тарифа не раньше start"""
+    return (
+        select(Payment.telegram_id)
+        .where(_PAID_TARIFF_FILTER, Payment.telegram_id.in_(buyers))
+        .group_by(Payment.telegram_id)
+        .having(func.min(Payment.paid_at) >= start)
+    )
+
+
+async def _compute_day(db: AsyncSession, day: date) -> dict:
+    """Показатели одного дня"""
+    start, end = msk_day_bounds(day)
+
+    new_users = (await db.execute(
+        select(func.count()).select_from(User).where(
+            User.created_at >= start,
+            User.created_at < end,
+        )
+    )).scalar() or 0
+
+    # Оплаченные платежи дня по тарифу и признаку автоплатежа
+    paid_result = await db.execute(
+        select(
+            Payment.tariff_id,
+            Payment.is_auto_payment,
+            func.count().label("cnt"),
+            func.sum(Payment.amount).label("amount"),
+        )
+        .where(
+            Payment.status == "succeeded",
+            Payment.paid_at >= start,
+            Payment.paid_at < end,
+        )
+        .group_by(Payment.tariff_id, Payment.is_auto_payment)
+    )
+    trials = paid_payments = revenue = auto_renew_succeeded = 0
+    revenue_by_tariff: dict[str, int] = {}
+    for row in paid_result.all():
+        amount = row.amount or 0
+        revenue += amount
+        revenue_by_tariff[row.tariff_id] = revenue_by_tariff.get(row.tariff_id, 0) + amount
+        if row.tariff_id == "trial":
+            trials += row.cnt
+        else:
+            paid_payments += row.cnt
+        if row.is_auto_payment:
+            auto_renew_succeeded += row.cnt
+
+    auto_renew_failed = (await db.execute(
+        failed_auto_payments_count_query(start, end)
+    )).scalar() or 0
+
+    # Первая оплата платного тарифа: у покупателей дня самая ранняя такая оплата - в этот день.
+    # Покупатели дня - отдельным запросом: по списку id история ищется по индексу telegram_id
+    day_buyers = (await db.execute(day_buyers_query(start, end))).scalars().all()
+    paid_conversions = 0
+    if day_buyers:
+        first_paid = first_paid_purchase_query(day_buyers, start).subquery()
+        paid_conversions = (await db.execute(
+            select(func.count()).select_from(first_paid)
+        )).scalar() or 0
+
+    channel_bonuses = (await db.execute(
+        select(func.count()).select_from(User).where(
+            User.channel_bonus_received_at >= start,
+            User.channel_bonus_received_at < end,
+        )
+    )).scalar() or 0
+
+    referral_row = (await db.execute(
+        select(func.count(), func.sum(ReferralReward.bonus_days)).where(
+            ReferralReward.created_at >= start,
+            ReferralReward.created_at < end,
+        )
+    )).one()
+
+    return {
+        "new_users": new_users,
+        "trials": trials,
+        "paid_payments": paid_payments,
+        "paid_conversions": paid_conversions,
+        "revenue": revenue,
+        "revenue_by_tariff_json": json.dumps(revenue_by_tariff, sort_keys=True),
+        "auto_renew_succeeded": auto_renew_succeeded,
+        "auto_renew_failed": auto_renew_failed,
+        "channel_bonuses": channel_bonuses,
+        "referral_bonuses": referral_row[0] or 0,
+        "referral_bonus_days": referral_row[1] or 0,
+    }
+
+
+async def rollup_daily_stats() -> dict:
+    """
+    Пересчитать daily_stats от курсора до сегодняшнего дня.
+
+    Returns:
+        Статистика: days (пересчитано дней), first / last (границы интервала)
+    """
+    settings = get_settings()
+    today = msk_today()
+    # Дни до этого ещё пересчитываются на следующем запуске
+    reopen_from = today - timedelta(days=settings.daily_stats_lookback_days)
+
+    async with async_session_maker() as db:
+        cursor = await db.get(JobCursor, DAILY_STATS_CURSOR_NAME)
+        if cursor and cursor.position:
+            first_day = msk_date(cursor.position)
+        else:
+            first_user_at = (await db.execute(select(func.min(User.created_at)))).scalar()
+            first_day = msk_date(first_user_at) if first_user_at else today
+            cursor = JobCursor(name=DAILY_STATS_CURSOR_NAME)
+            db.add(cursor)
+
+        last_day = min(today, first_day + timedelta(days=settings.daily_stats_max_days_per_run - 1))
+        day = first_day
+        while day <= last_day:
+            values = await _compute_day(db, day)
+            row = await db.get(DailyStats, day)
+            if row is None:
+                db.add(DailyStats(day=day, **values))
+            else:
+                for key, value in values.items():
+                    setattr(row, key, value)
+
+            # Курсор двигается в той же транзакции, что и строка дня
+            cursor.position = msk_day_bounds(min(day + timedelta(days=1), reopen_from))[0]
+            await db.commit()
+            day += timedelta(days=1)
+
+    days = (last_day - first_day).days + 1
+    if days > settings.daily_stats_lookback_days + 1:
+        logger.info(f"Daily stats rolled up for {days} days: {first_day} .. {last_day}")
+    return {"days": days, "first": first_day.isoformat(), "last": last_day.isoformat()}
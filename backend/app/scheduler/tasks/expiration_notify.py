@@ -3,22 +3,71 @@
 
 Отправляет уведомления пользователям, у которых подписка истекает
 в течение 24 часов.
+
+Сообщения уходят параллельно через TelegramSender (лимиты Bot API, пауза на 429).
+Отметки last_notification_sent_at фиксируются порциями по expiration_notify_chunk_size
+одним UPDATE на порцию: после падения процесса следующий запуск продолжит
+с неотправленных, повторно получат сообщение не больше одной порции.
 """
 
 import asyncio
 import logging
 from datetime import datetime, timedelta
 
-from sqlalchemy import select, and_, or_
+from sqlalchemy import select, and_, or_, update
 
+from app.config import get_settings
 from app.database import async_session_maker
 from app.models.user import User
 from app.services.telegram_notify import send_expiration_warning
+from app.services.telegram_sender import TelegramSender
 
 logger = logging.getLogger(__name__)
 
-# Пауза между отправками (чтобы не попасть под rate limit Telegram)
-SEND_DELAY_MS = 50
+
+def users_to_notify_query(now: datetime, expires_before: datetime, notification_threshold: datetime):
+    """Активные пользователи, у которых подписка истекает до expires_before, без свежего уведомления"""
+    return select(
+        User.id,
+        User.telegram_id,
+        User.subscription_expires_at,
+        User.auto_renew_enabled,
+        User.card_last4,
+    ).where(
+        and_(
+            User.is_active == True,
+            User.subscription_expires_at.isnot(None),
+            User.subscription_expires_at > now,
+            User.subscription_expires_at <= expires_before,
+            or_(
+                User.last_notification_sent_at.is_(None),
+                User.last_notification_sent_at < notification_threshold,
+            ),
+        )
+    )
+
+
+async def _notify_user(user, now: datetime, sender: TelegramSender) -> bool:
+    """Отправить уведомление одному пользователю. Returns: True если отправлено"""
+    try:
+        # Считаем оставшиеся часы
+        hours_left = int(
+            (user.subscription_expires_at - now).total_seconds() / 3600
+        )
+
+        return await send_expiration_warning(
+            telegram_id=user.telegram_id,
+            hours_left=hours_left,
+            has_auto_renew=user.auto_renew_enabled,
+            card_last4=user.card_last4,
+            sender=sender,
+        )
+
+    except Exception as e:
+        logger.error(
+            f"Failed to send notification to {user.telegram_id}: {e}"
+        )
+        return False
 
 
 async def send_expiration_notifications() -> None:
@@ -34,6 +83,7 @@ async def send_expiration_notifications() -> None:
     """
     logger.info("Starting expiration notification task...")
 
+    settings = get_settings()
     now = datetime.utcnow()
     expires_before = now + timedelta(hours=24)
     notification_threshold = now - timedelta(hours=23)
@@ -43,62 +93,45 @@ async def send_expiration_notifications() -> None:
 
     try:
         async with async_session_maker() as db:
-            # Находим пользователей с истекающей подпиской
+            # Находим пользователей с истекающей подпиской (только нужные колонки)
             result = await db.execute(
-                select(User).where(
-                    and_(
-                        User.is_active == True,
-                        User.subscription_expires_at.isnot(None),
-                        User.subscription_expires_at > now,
-                        User.subscription_expires_at <= expires_before,
-                        or_(
-                            User.last_notification_sent_at.is_(None),
-                            User.last_notification_sent_at < notification_threshold,
-                        ),
-                    )
-                )
+                users_to_notify_query(now, expires_before, notification_threshold)
             )
-            users = result.scalars().all()
-
-            logger.info(f"Found {len(users)} users to notify about expiration")
-
-            for user in users:
-                try:
-                    # Считаем оставшиеся часы
-                    hours_left = int(
-                        (user.subscription_expires_at - now).total_seconds() / 3600
-                    )
-
-                    # Отправляем уведомление
-                    success = await send_expiration_warning(
-                        telegram_id=user.telegram_id,
-                        hours_left=hours_left,
-                        has_auto_renew=user.auto_renew_enabled,
-                        card_last4=user.card_last4,
-                    )
-
-                    if success:
-                        user.last_notification_sent_at = now
-                        sent_count += 1
-                    else:
-                        error_count += 1
-
-                    # Небольшая пауза между отправками
-                    await asyncio.sleep(SEND_DELAY_MS / 1000)
-
-                except Exception as e:
-                    logger.error(
-                        f"Failed to send notification to {user.telegram_id}: {e}"
-                    )
-                    error_count += 1
-
-            # Сохраняем обновления last_notification_sent_at
-            await db.commit()
+            users = result.all()
+
+        logger.info(f"Found {len(users)} users to notify about expiration")
+
+        chunk_size = settings.expiration_notify_chunk_size
+        async with TelegramSender() as sender:
+            for offset in range(0, len(users), chunk_size):
+                chunk = users[offset:offset + chunk_size]
+                results = await asyncio.gather(
+                    *(_notify_user(user, now, sender) for user in chunk)
+                )
+
+                sent_ids = [user.id for user, success in zip(chunk, results) if success]
+                sent_count += len(sent_ids)
+                error_count += len(chunk) - len(sent_ids)
+
+                # Сохраняем отметки порции (executemany по первичному ключу)
+                if sent_ids:
+                    async with async_session_maker() as db:
+                        await db.execute(
+                            update(User),
+                            [{"id": user_id, "last_notification_sent_at": now} for user_id in sent_ids],
+                        )
+                        await db.commit()
+
+                logger.info(
+                    f"Expiration notifications progress: {offset + len(chunk)}/{len(users)}, "
+                    f"sent={sent_count}, errors={error_count}"
+                )
 
     except Exception as e:
         logger.error(f"Expiration notification task failed: {e}")
         raise
 
     logger.info(
-        f"Expiration notifications completed: sent={sent_count}, errors={error_count}"
+        f"Expiration notifications completed: sent={sent_count}, errors={error_count}, "
+        f"flood_waits={sender.flood_waits}"
     )
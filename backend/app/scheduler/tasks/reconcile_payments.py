@@ -0,0 +1,136 @@
+"""
+Задача сверки зависших платежей с YooKassa.
+
+Платежи в pending / waiting_for_capture, по которым не пришёл webhook, сверяются
+со списком платежей YooKassa за интервал created_at (постранично, по next_cursor).
+Изменившийся статус записывается в outbox как уведомление и обрабатывается
+обычным путём: handle_payment_notification -> очередь продлений.
+
+Курсор (job_cursors) - created_at самого старого платежа, который ещё может
+измениться. Следующий запуск начинает с него, а не со всего окна, поэтому
+в обычном режиме (зависших платежей нет) задача не делает запросов к YooKassa.
+"""
+
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from app.config import get_settings
+from app.database import async_session_maker
+from app.models.job_cursor import JobCursor
+from app.models.payment import Payment
+from app.services.payment_outbox import enqueue_polled_payment_event, process_payment_event
+from app.services.payment_status import is_terminal_status
+from app.services.yookassa_service import YooKassaError, get_yookassa_service
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_CURSOR_NAME = "reconcile_payments"
+
+# Локальные статусы, которые ещё могут измениться
+UNRESOLVED_STATUSES = ("pending", "waiting_for_capture")
+
+# Платёж в YooKassa создаётся раньше, чем строка в БД - запас для нижней границы
+CREATED_AT_SLACK = timedelta(minutes=5)
+
+
+async def _save_cursor(position: datetime) -> None:
+    async with async_session_maker() as db:
+        cursor = await db.get(JobCursor, RECONCILE_CURSOR_NAME)
+        if cursor is None:
+            db.add(JobCursor(name=RECONCILE_CURSOR_NAME, position=position))
+        else:
+            cursor.position = position
+        await db.commit()
+
+
+async def reconcile_pending_payments() -> dict:
+    """
+    Сверить зависшие платежи с YooKassa.
+
+    Returns:
+        Статистика: checked (локальных платежей), pages (страниц YooKassa),
+        updated (статусов записано в outbox)
+    """
+    settings = get_settings()
+    now = datetime.utcnow()
+    window_start = now - timedelta(hours=settings.payment_reconcile_window_hours)
+    # Свежие платежи не трогаем - пользователь ещё на странице оплаты
+    upper = now - timedelta(minutes=settings.payment_reconcile_min_age_minutes)
+
+    stats = {"checked": 0, "pages": 0, "updated": 0}
+
+    async with async_session_maker() as db:
+        cursor = await db.get(JobCursor, RECONCILE_CURSOR_NAME)
+        lower = window_start
+        if cursor and cursor.position and cursor.position > window_start:
+            lower = cursor.position
+
+        result = await db.execute(
+            select(Payment.yookassa_payment_id, Payment.status, Payment.created_at)
+            .where(
+                Payment.status.in_(UNRESOLVED_STATUSES),
+                Payment.created_at >= lower,
+                Payment.created_at < upper,
+                Payment.yookassa_payment_id.isnot(None),
+            )
+        )
+        # yookassa_payment_id -> (локальный статус, created_at)
+        local = {row.yookassa_payment_id: (row.status, row.created_at) for row in result.all()}
+
+    stats["checked"] = len(local)
+    if not local:
+        await _save_cursor(upper)
+        return stats
+
+    logger.info(f"Reconciling {len(local)} unresolved payments with YooKassa")
+
+    yookassa = get_yookassa_service()
+    created_at_gte = min(created_at for _, created_at in local.values()) - CREATED_AT_SLACK
+    resolved = set()
+    page_cursor = None
+
+    try:
+        while True:
+            items, page_cursor = await yookassa.list_payments(
+                created_at_gte=created_at_gte,
+                created_at_lt=upper,
+                cursor=page_cursor,
+                limit=settings.payment_reconcile_page_size,
+            )
+            stats["pages"] += 1
+
+            for payment_object in items:
+                payment_id = payment_object.get("id")
+                if payment_id not in local:
+                    continue
+
+                remote_status = payment_object.get("status")
+                if is_terminal_status(remote_status):
+                    resolved.add(payment_id)
+                if remote_status == local[payment_id][0]:
+                    continue
+
+                # Тот же путь, что и у webhook: outbox -> продление -> уведомления
+                event_id = await enqueue_polled_payment_event(payment_object)
+                if event_id:
+                    await process_payment_event(event_id)
+                    stats["updated"] += 1
+
+            if not page_cursor:
+                break
+    except YooKassaError as e:
+        # Курсор не двигаем - следующий запуск повторит интервал
+        logger.error(f"Payment reconciliation failed: {e}")
+        return stats
+
+    # Следующий запуск начинает с самого старого платежа, который ещё не в конечном статусе
+    unresolved = [created_at for payment_id, (_, created_at) in local.items() if payment_id not in resolved]
+    await _save_cursor(min(unresolved) if unresolved else upper)
+
+    logger.info(
+        f"Payment reconciliation done: checked={stats['checked']}, "
+        f"pages={stats['pages']}, updated={stats['updated']}, still unresolved={len(unresolved)}"
+    )
+    return stats
@@ -0,0 +1,81 @@
+"""
+Задача повтора продлений по оплаченным платежам.
+
+Берёт из pending_extensions задачи, время которых пришло (экспоненциальная задержка
+после неудачи), и выполняет не больше extension_retry_concurrency продлений параллельно.
+После extension_retry_max_attempts неудач задача переходит в dead и видна в админке.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+from app.config import get_settings
+from app.database import async_session_maker
+from app.models.pending_extension import PendingExtension
+from app.services.extension_queue import run_extension
+
+logger = logging.getLogger(__name__)
+
+# Задача в processing дольше этого времени считается брошенной (процесс упал)
+EXTENSION_CLAIM_TIMEOUT = timedelta(minutes=10)
+
+# Сколько задач забирает один запуск
+EXTENSION_BATCH_SIZE = 100
+
+
+async def release_stale_claims() -> int:
+    """Вернуть в очередь задачи, зависшие в processing (процесс упал во время продления)"""
+    async with async_session_maker() as db:
+        result = await db.execute(
+            update(PendingExtension)
+            .where(
+                PendingExtension.status == "processing",
+                PendingExtension.claimed_at < datetime.utcnow() - EXTENSION_CLAIM_TIMEOUT,
+            )
+            .values(status="pending", claimed_at=None)
+        )
+        await db.commit()
+        if result.rowcount:
+            logger.warning(f"Released {result.rowcount} pending extensions stuck in processing")
+        return result.rowcount
+
+
+async def process_pending_extensions() -> None:
+    """Обработать очередь продлений"""
+    settings = get_settings()
+
+    await release_stale_claims()
+
+    async with async_session_maker() as db:
+        result = await db.execute(
+            select(PendingExtension.id)
+            .where(
+                PendingExtension.status == "pending",
+                PendingExtension.next_attempt_at <= datetime.utcnow(),
+            )
+            .order_by(PendingExtension.next_attempt_at)
+            .limit(EXTENSION_BATCH_SIZE)
+        )
+        pending_ids = list(result.scalars().all())
+
+    if not pending_ids:
+        return
+
+    logger.info(f"Retrying {len(pending_ids)} pending extensions...")
+
+    semaphore = asyncio.Semaphore(settings.extension_retry_concurrency)
+
+    async def run(pending_id: int) -> bool:
+        async with semaphore:
+            return await run_extension(pending_id)
+
+    results = await asyncio.gather(*(run(pending_id) for pending_id in pending_ids))
+    extended = sum(1 for r in results if r)
+
+    logger.info(
+        f"Pending extensions processed: extended={extended}, "
+        f"failed={len(pending_ids) - extended}"
+    )
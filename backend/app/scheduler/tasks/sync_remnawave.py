@@ -2,31 +2,195 @@
 Задача синхронизации локальной БД с Remnawave.
 
 Источник правды: Remnawave Panel.
-Синхронизируемые поля:
+Синхронизируемые поля (локальное зеркало, см. app/services/panel_mirror.py):
 - subscription_expires_at (expireAt)
 - is_active (status + expireAt)
+- remnawave_status, traffic_used_bytes, traffic_limit_bytes, subscription_url
+- panel_synced_at
+
+Режимы (настройка remnawave_sync_mode):
+- bulk: постранично читаем GET /api/users (iter_all_users), строим индекс uuid -> состояние
+  и сравниваем с таблицей users одним проходом (N / page_size запросов)
+- per_user: один GET /api/users/{uuid} на каждого пользователя (старый режим)
 """
 
 import asyncio
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from sqlalchemy import select
+from sqlalchemy import DateTime, cast, func, select, update
 
-from app.database import async_session_maker
+from app.config import get_settings
+from app.database import async_session_maker, is_sqlite
 from app.models.user import User
+from app.services.panel_mirror import apply_panel_state, panel_state_values
 from app.services.remnawave import get_remnawave_service, RemnawaveError
 
 logger = logging.getLogger(__name__)
 
-# Настройки батчинга
+# Настройки батчинга (режим per_user)
 BATCH_SIZE = 50
 REQUEST_DELAY_MS = 100  # Пауза между запросами (rate limiting)
 
+# Префикс username пользователей Облепихи в панели
+OBLEPIHA_USERNAME_PREFIX = "oblepiha_"
+
+# Размер пачки UPDATE в режиме bulk
+UPDATE_CHUNK_SIZE = 500
+
+# Поля зеркала, изменение которых считаем обновлением (для статистики)
+MIRROR_FIELDS = (
+    "subscription_expires_at",
+    "is_active",
+    "remnawave_status",
+    "traffic_used_bytes",
+    "traffic_limit_bytes",
+    "subscription_url",
+)
+
 
 async def sync_users_with_remnawave() -> None:
+    """Синхронизация локальной БД с Remnawave (режим из настроек)"""
+    if get_settings().remnawave_sync_mode == "per_user":
+        await sync_users_per_user()
+    else:
+        await sync_users_bulk()
+
+
+async def sync_users_bulk() -> None:
     """
-    Синхронизация локальной БД с Remnawave.
+    Bulk синхронизация через постраничный список пользователей панели.
+
+    1. Читаем GET /api/users страницами, оставляем только oblepiha_*
+    2. Строим индекс uuid -> значения полей зеркала
+    3. Сравниваем с локальными users: UPDATE зеркала только у отличающихся строк,
+       у остальных найденных в панели - только panel_synced_at
+
+    Индекс - снимок панели на момент чтения, а платёж или начисление дней
+    могут изменить пользователя за время синхронизации. Поэтому строки,
+    изменённые после начала чтения панели (users.updated_at), не перезаписываются -
+    их догонит следующий запуск.
+    """
+    settings = get_settings()
+    page_size = settings.remnawave_sync_page_size
+
+    logger.info(f"Starting Remnawave bulk sync (page_size={page_size})...")
+
+    remnawave = get_remnawave_service()
+    now = datetime.utcnow()
+    panel_index: dict[str, dict] = {}
+    parse_errors = 0
+
+    # Время БД до чтения панели: пути записи сначала меняют панель, потом users,
+    # так что всё, что записано в users раньше, в снимке панели уже есть.
+    # Минус секунда - CURRENT_TIMESTAMP в SQLite с точностью до секунды
+    async with async_session_maker() as db:
+        snapshot_started_at = await _db_now(db) - timedelta(seconds=1)
+
+    # === 1-2. Индекс состояния из панели ===
+    try:
+        async for remnawave_user in remnawave.iter_all_users(
+            page_size=page_size,
+            username_prefix=OBLEPIHA_USERNAME_PREFIX,
+        ):
+            uuid = remnawave_user.get("uuid")
+            if not uuid:
+                continue
+            try:
+                panel_index[uuid] = panel_state_values(remnawave_user, now)
+            except ValueError as e:
+                logger.warning(
+                    f"Failed to parse expireAt for {remnawave_user.get('username')}: {e}"
+                )
+                parse_errors += 1
+    except RemnawaveError as e:
+        # Неполный индекс нельзя сравнивать - иначе ложные "не найден"
+        logger.error(f"Remnawave bulk sync aborted: {e}")
+        return
+
+    logger.info(f"Loaded {len(panel_index)} Oblepiha users from Remnawave")
+
+    # === 3. Сравнение с локальной БД ===
+    synced_count = 0
+    updated_count = 0
+    missing_count = 0
+
+    try:
+        async with async_session_maker() as db:
+            result = await db.execute(
+                select(
+                    User.id,
+                    User.telegram_id,
+                    User.remnawave_uuid,
+                    *(getattr(User, field) for field in MIRROR_FIELDS),
+                ).where(User.remnawave_uuid.isnot(None))
+            )
+
+            changes = []
+            unchanged_ids = []
+            for row in result.all():
+                state = panel_index.get(row.remnawave_uuid)
+                if state is None:
+                    logger.debug(
+                        f"User not found in Remnawave: uuid={row.remnawave_uuid}, "
+                        f"telegram_id={row.telegram_id}"
+                    )
+                    missing_count += 1
+                    continue
+
+                synced_count += 1
+                if any(
+                    field in state and state[field] != getattr(row, field)
+                    for field in MIRROR_FIELDS
+                ):
+                    changes.append({"id": row.id, **state})
+                else:
+                    unchanged_ids.append(row.id)
+
+            # Bulk UPDATE по первичному ключу (executemany), строки, изменённые
+            # после начала чтения панели, условие updated_at пропускает
+            guarded_update = (
+                update(User)
+                .where(User.updated_at < snapshot_started_at)
+                .execution_options(synchronize_session=None)
+            )
+            for i in range(0, len(changes), UPDATE_CHUNK_SIZE):
+                await db.execute(guarded_update, changes[i:i + UPDATE_CHUNK_SIZE])
+
+            # Совпадающим с панелью - только отметка синхронизации
+            for i in range(0, len(unchanged_ids), UPDATE_CHUNK_SIZE):
+                await db.execute(
+                    update(User)
+                    .where(User.id.in_(unchanged_ids[i:i + UPDATE_CHUNK_SIZE]))
+                    .values(panel_synced_at=now)
+                )
+            await db.commit()
+
+            updated_count = len(changes)
+
+    except Exception as e:
+        logger.error(f"Sync task failed with error: {e}")
+        raise
+
+    if missing_count:
+        logger.warning(f"{missing_count} local users not found in Remnawave")
+
+    logger.info(
+        f"Remnawave bulk sync completed: "
+        f"synced={synced_count}, updated={updated_count}, "
+        f"missing={missing_count}, parse_errors={parse_errors}"
+    )
+
+
+async def _db_now(db) -> datetime:
+    """Текущее время БД в том виде, в каком onupdate=func.now() пишет users.updated_at"""
+    expression = func.now() if is_sqlite else cast(func.now(), DateTime)
+    return (await db.execute(select(expression))).scalar()
+
+
+async def sync_users_per_user() -> None:
+    """
+    Синхронизация локальной БД с Remnawave по одному пользователю.
 
     Для каждого пользователя с remnawave_uuid:
     1. Запрашиваем данные из Remnawave
@@ -58,7 +222,9 @@ async def sync_users_with_remnawave() -> None:
                         logger.debug(f"Processed {i}/{len(users)} users...")
 
                     # Запрашиваем данные из Remnawave
-                    remnawave_user = await remnawave.get_user_by_uuid(user.remnawave_uuid)
+                    remnawave_user = await remnawave.get_user_by_uuid(
+                        user.remnawave_uuid, use_cache=False
+                    )
 
                     if not remnawave_user:
                         logger.warning(
@@ -68,45 +234,24 @@ async def sync_users_with_remnawave() -> None:
                         error_count += 1
                         continue
 
-                    # Парсим данные
                     old_expires_at = user.subscription_expires_at
                     old_is_active = user.is_active
 
-                    # Обновляем expireAt
-                    expire_at_str = remnawave_user.get("expireAt")
-                    new_expires_at = None
-                    new_is_active = False
-
-                    if expire_at_str:
-                        try:
-                            new_expires_at = datetime.fromisoformat(
-                                expire_at_str.replace("Z", "+00:00")
-                            ).replace(tzinfo=None)
-
-                            # Проверяем активность
-                            now = datetime.utcnow()
-                            status = remnawave_user.get("status", "")
-                            new_is_active = (
-                                status == "ACTIVE" and new_expires_at > now
-                            )
-                        except ValueError as e:
-                            logger.warning(
-                                f"Failed to parse expireAt for user {user.telegram_id}: {e}"
-                            )
-
-                    # Обновляем только если есть изменения
+                    # Обновляем зеркало (expireAt, статус, трафик, panel_synced_at)
+                    if not apply_panel_state(user, remnawave_user):
+                        error_count += 1
+                        continue
+
                     if (
-                        new_expires_at != old_expires_at
-                        or new_is_active != old_is_active
+                        user.subscription_expires_at != old_expires_at
+                        or user.is_active != old_is_active
                     ):
-                        user.subscription_expires_at = new_expires_at
-                        user.is_active = new_is_active
                         updated_count += 1
 
                         logger.debug(
                             f"Updated user {user.telegram_id}: "
-                            f"expires_at {old_expires_at} -> {new_expires_at}, "
-                            f"is_active {old_is_active} -> {new_is_active}"
+                            f"expires_at {old_expires_at} -> {user.subscription_expires_at}, "
+                            f"is_active {old_is_active} -> {user.is_active}"
                         )
 
                     synced_count += 1
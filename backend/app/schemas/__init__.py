@@ -1,4 +1,4 @@
-from app.schemas.user import UserCreate, UserResponse, UserFromTelegram
+from app.schemas.user import UserCreate, UserResponse, UserFromTelegram, TelegramUser
 from app.schemas.payment import PaymentCreate, PaymentResponse, PaymentWebhook
 from app.schemas.tariff import TariffResponse
 
@@ -6,6 +6,7 @@ __all__ = [
     "UserCreate",
     "UserResponse", 
     "UserFromTelegram",
+    "TelegramUser",
     "PaymentCreate",
     "PaymentResponse",
     "PaymentWebhook",
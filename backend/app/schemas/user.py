@@ -8,6 +8,8 @@ from typing import Optional
 from pydantic import BaseModel, ConfigDict
 from pydantic.alias_generators import to_camel
 
+from app.schemas.tariff import TariffResponse
+
 
 # Базовый конфиг для camelCase сериализации
 camel_config = ConfigDict(
@@ -27,6 +29,11 @@ class UserFromTelegram(BaseModel):
     is_premium: Optional[bool] = None
 
 
+class TelegramUser(UserFromTelegram):
+    """Аутентифицированный пользователь Telegram"""
+    pass
+
+
 class UserCreate(BaseModel):
     """Создание пользователя"""
     telegram_id: int
@@ -78,6 +85,10 @@ class UserResponse(BaseModel):
     card_brand: Optional[str] = None
     sbp_phone: Optional[str] = None  # Последние 4 цифры телефона для СБП
 
+    # Свежесть данных из Remnawave (локальное зеркало)
+    stale: bool = False
+    synced_at: Optional[datetime] = None
+
 
 class UserStatsResponse(BaseModel):
     """Статистика пользователя для главного экрана"""
@@ -90,6 +101,10 @@ class UserStatsResponse(BaseModel):
     total_traffic_gb: float = 500
     subscription_url: Optional[str] = None
 
+    # Свежесть данных из Remnawave (локальное зеркало)
+    stale: bool = False
+    synced_at: Optional[datetime] = None
+
 
 class SetReferrerRequest(BaseModel):
     """Запрос на установку реферера"""
@@ -108,3 +123,13 @@ class ReferralStatsResponse(BaseModel):
     total_purchased: int = 0
     total_bonus_days: int = 0
 
+
+
+class BootstrapResponse(BaseModel):
+    """Всё для первого экрана Mini App одним запросом"""
+    model_config = camel_config
+
+    user: UserResponse
+    stats: UserStatsResponse
+    tariffs: list[TariffResponse]
+    referrals: ReferralStatsResponse
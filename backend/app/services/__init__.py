@@ -1,11 +1,12 @@
 from app.services.remnawave import RemnawaveService
-from app.services.telegram import validate_init_data, parse_user_from_init_data
+from app.services.telegram import validate_init_data, parse_user_from_init_data, authenticate_init_data
 from app.services.yookassa_service import YooKassaService
 
 __all__ = [
     "RemnawaveService",
     "validate_init_data",
     "parse_user_from_init_data",
+    "authenticate_init_data",
     "YooKassaService",
 ]
 
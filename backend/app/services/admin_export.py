@@ -0,0 +1,146 @@
+"""
+Выгрузка users / payments для админки (CSV или NDJSON).
+
+Строки читаются серверным курсором (stream + yield_per) и отдаются частями
+по мере чтения: память не зависит от числа строк. Выгрузка только читает -
+в SQLite с WAL читатель не блокирует webhook и scheduler, в PostgreSQL
+читающая транзакция не держит блокировок строк.
+"""
+
+import csv
+import io
+import json
+import logging
+from datetime import datetime
+from typing import Any, AsyncIterator, Literal, Optional
+
+from sqlalchemy import select
+
+from app.config import get_settings
+from app.database import async_session_maker
+from app.models.payment import Payment
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+ExportTable = Literal["users", "payments"]
+ExportFormat = Literal["csv", "ndjson"]
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+# Колонки выгрузки (без способов оплаты и прочих данных, не нужных для сверки)
+EXPORT_COLUMNS = {
+    "users": [
+        User.id,
+        User.telegram_id,
+        User.telegram_username,
+        User.first_name,
+        User.last_name,
+        User.is_active,
+        User.subscription_expires_at,
+        User.remnawave_status,
+        User.trial_used,
+        User.auto_renew_enabled,
+        User.referrer_id,
+        User.channel_bonus_received_at,
+        User.created_at,
+    ],
+    "payments": [
+        Payment.id,
+        Payment.yookassa_payment_id,
+        Payment.user_id,
+        Payment.telegram_id,
+        Payment.tariff_id,
+        Payment.amount,
+        Payment.days,
+        Payment.status,
+        Payment.is_auto_payment,
+        Payment.created_at,
+        Payment.paid_at,
+        Payment.extended_at,
+    ],
+}
+
+PAYMENT_STATUSES = ("pending", "waiting_for_capture", "succeeded", "canceled")
+
+# Фильтр status для users (для payments - статус платежа как есть)
+USER_STATUS_FILTERS = {
+    "active": User.is_active == True,
+    "inactive": User.is_active == False,
+}
+
+
+def build_export_query(
+    table: ExportTable,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    status_filter: Optional[str] = None,
+):
+    """
+    SELECT для выгрузки в порядке id.
+    created_from / created_to - полуинтервал по created_at (naive UTC).
+    status_filter - ключ USER_STATUS_FILTERS или один из PAYMENT_STATUSES (проверяется роутером).
+    """
+    model = User if table == "users" else Payment
+    query = select(*EXPORT_COLUMNS[table]).order_by(model.id)
+
+    if created_from is not None:
+        query = query.where(model.created_at >= created_from)
+    if created_to is not None:
+        query = query.where(model.created_at < created_to)
+
+    if status_filter:
+        if table == "users":
+            query = query.where(USER_STATUS_FILTERS[status_filter])
+        else:
+            query = query.where(Payment.status == status_filter)
+
+    return query
+
+
+def _export_row(table: ExportTable, row) -> dict[str, Any]:
+    values = dict(row._mapping)
+    if table == "payments":
+        # Из копеек в рубли - как в реестрах YooKassa
+        values["amount"] = f"{values['amount'] / 100:.2f}"
+    for key, value in values.items():
+        if isinstance(value, datetime):
+            values[key] = value.isoformat()
+    return values
+
+
+async def stream_export(table: ExportTable, export_format: ExportFormat, query) -> AsyncIterator[str]:
+    """
+    Строки выгрузки порциями по admin_export_batch_size.
+    Сессия открывается здесь, а не в зависимости роутера: генератор работает
+    уже после возврата StreamingResponse.
+    """
+    batch_size = get_settings().admin_export_batch_size
+    columns = [column.key for column in EXPORT_COLUMNS[table]]
+    exported = 0
+
+    if export_format == "csv":
+        # BOM - Excel иначе открывает UTF-8 как cp1251
+        yield "\ufeff" + ",".join(columns) + "\r\n"
+
+    async with async_session_maker() as db:
+        result = await db.stream(query.execution_options(yield_per=batch_size))
+        async for rows in result.partitions():
+            if export_format == "csv":
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                for row in rows:
+                    writer.writerow(_export_row(table, row).values())
+                chunk = buffer.getvalue()
+            else:
+                chunk = "".join(
+                    json.dumps(_export_row(table, row), ensure_ascii=False) + "\n"
+                    for row in rows
+                )
+            exported += len(rows)
+            yield chunk
+
+    logger.info(f"Admin export finished: {table}, {exported} rows, {export_format}")
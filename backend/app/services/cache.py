@@ -0,0 +1,116 @@
+"""
+In-process кеш с TTL и вытеснением по LRU.
+
+Используется для коротких кешей ответов внешних API внутри одного процесса.
+Конкурентные промахи по одному ключу объединяются в один запрос (single-flight).
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Ограниченный по размеру LRU-кеш с временем жизни записей.
+
+    None не кешируется - get() возвращает None при промахе.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        # key -> (stored_at, expires_at, value)
+        self._data: OrderedDict[Hashable, tuple[float, float, Any]] = OrderedDict()
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl_seconds > 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Получить значение или None если его нет / оно устарело"""
+        item = self._data.get(key)
+        if item is not None:
+            _, expires_at, value = item
+            if expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+        self.misses += 1
+        return None
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        """Положить значение в кеш (None игнорируется)"""
+        if value is None or not self.enabled:
+            return
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        now = time.monotonic()
+        self._data[key] = (now, now + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        """Удалить запись"""
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Очистить кеш и счётчики"""
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """
+        Получить значение из кеша или загрузить через loader.
+
+        Если загрузка этого ключа уже идёт - ждём её результат,
+        а не запускаем второй запрос. Отмена одного из ожидающих
+        не отменяет общую загрузку.
+        """
+        if not self.enabled:
+            return await loader()
+
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, loader))
+            self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        started_at = time.monotonic()
+        try:
+            value = await loader()
+            # Не затираем значение, записанное во время загрузки (например, ответ PATCH)
+            current = self._data.get(key)
+            if current is None or current[0] < started_at:
+                self.set(key, value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        """Счётчики для подбора TTL"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "inflight": len(self._inflight),
+        }
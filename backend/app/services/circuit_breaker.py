@@ -0,0 +1,98 @@
+"""
+Circuit breaker для вызовов внешних API.
+
+closed    - запросы идут как обычно, считаем подряд идущие ошибки
+open      - после failure_threshold ошибок запросы сразу отклоняются
+half_open - через recovery_seconds пропускаем один пробный запрос:
+            успех закрывает цепь, ошибка снова открывает
+"""
+
+import logging
+import time
+from typing import Literal, Optional
+
+logger = logging.getLogger(__name__)
+
+CircuitState = Literal["closed", "open", "half_open"]
+
+
+class CircuitBreaker:
+    """Простой circuit breaker (один event loop, без блокировок)"""
+
+    def __init__(self, name: str, failure_threshold: int, recovery_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self._state: CircuitState = "closed"
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self.rejected = 0
+
+    @property
+    def state(self) -> CircuitState:
+        if self._state == "open" and self._recovery_elapsed():
+            return "half_open"
+        return self._state
+
+    def _recovery_elapsed(self) -> bool:
+        return (
+            self._opened_at is not None
+            and time.monotonic() - self._opened_at >= self.recovery_seconds
+        )
+
+    def allow_request(self) -> bool:
+        """Можно ли выполнить запрос сейчас"""
+        if self._state == "closed":
+            return True
+
+        if self._state == "open" and self._recovery_elapsed():
+            self._state = "half_open"
+            self._probe_in_flight = False
+            logger.info(f"Circuit '{self.name}' half-open, probing")
+
+        if self._state == "half_open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+
+        self.rejected += 1
+        return False
+
+    def record_success(self) -> None:
+        """Запрос выполнен (сервис ответил)"""
+        if self._state != "closed":
+            logger.info(f"Circuit '{self.name}' closed")
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+
+    def release_probe(self) -> None:
+        """
+        Запрос прерван без ответа (отмена задачи).
+        Ошибкой не считается; в half-open следующий запрос снова может стать пробным.
+        """
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        """Запрос не выполнен (таймаут, ошибка соединения, 5xx)"""
+        self._failures += 1
+        if self._state == "half_open" or self._failures >= self.failure_threshold:
+            if self._state != "open":
+                logger.warning(
+                    f"Circuit '{self.name}' opened after {self._failures} failures"
+                )
+            self._state = "open"
+            self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def stats(self) -> dict:
+        """Состояние для мониторинга"""
+        return {
+            "name": self.name,
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "failure_threshold": self.failure_threshold,
+            "recovery_seconds": self.recovery_seconds,
+            "rejected": self.rejected,
+        }
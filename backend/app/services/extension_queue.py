@@ -0,0 +1,430 @@
+"""
+Очередь продлений подписки по оплаченным платежам.
+
+Оплаченный платёж и задача продления (pending_extensions) записываются одной транзакцией,
+затем продление сразу пробуется выполнить. Если Remnawave недоступна или remnawave_uuid
+не найден, задача остаётся в очереди: scheduler повторяет её с экспоненциальной задержкой
+и ограничением параллельности, после extension_retry_max_attempts - статус dead
+(виден в /api/admin/pending-extensions). Продления одного пользователя выполняются
+по очереди; если по панели не понять, применено ли продление, задача сразу dead.
+"""
+
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import exists, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.config import get_settings, REFERRAL_BONUS_DAYS, REFERRAL_QUALIFYING_TARIFFS
+from app.database import async_session_maker
+from app.models.user import User
+from app.models.payment import Payment
+from app.models.pending_extension import PendingExtension
+from app.models.referral import ReferralReward
+from app.services.remnawave import get_remnawave_service, RemnawaveError
+from app.services.panel_mirror import apply_panel_state
+from app.services.telegram_notify import (
+    send_payment_success_message,
+    send_referral_bonus_message,
+    send_auto_renew_success,
+)
+
+logger = logging.getLogger(__name__)
+
+# Максимальная задержка между повторами
+EXTENSION_MAX_RETRY_DELAY = timedelta(hours=6)
+
+
+# Точность сравнения expireAt с панелью (панель хранит миллисекунды)
+EXPIRE_AT_TOLERANCE = timedelta(seconds=1)
+
+
+class ExtensionError(Exception):
+    """Продление не выполнено, задача будет повторена"""
+
+
+class ExtensionConflictError(ExtensionError):
+    """
+    Неизвестно, применено ли продление: expireAt в панели изменили другие
+    продления или бонусы. Задача сразу переводится в dead - повтор не решит.
+    """
+
+
+async def find_oblepiha_remnawave_user(user: User) -> Optional[dict]:
+    """
+    Найти пользователя Облепихи в Remnawave по username.
+
+    ВАЖНО: Ищем ТОЛЬКО по username oblepiha_*, чтобы не найти пользователя из другого сервиса!
+    """
+    remnawave = get_remnawave_service()
+    remnawave_user = None
+
+    # Пробуем формат oblepiha_{telegram_id}_{username}
+    if user.telegram_username:
+        try:
+            full_username = f"oblepiha_{user.telegram_id}_{user.telegram_username}"
+            remnawave_user = await remnawave.get_user_by_username(full_username)
+            if remnawave_user:
+                logger.info(f"Found Oblepiha user by full username {full_username}: {remnawave_user.get('uuid')}")
+        except RemnawaveError as e:
+            logger.warning(f"Failed to find by full username: {e}")
+
+    # Пробуем короткий формат oblepiha_{telegram_id}
+    if not remnawave_user:
+        try:
+            short_username = f"oblepiha_{user.telegram_id}"
+            remnawave_user = await remnawave.get_user_by_username(short_username)
+            if remnawave_user:
+                logger.info(f"Found Oblepiha user by short username {short_username}: {remnawave_user.get('uuid')}")
+        except RemnawaveError as e:
+            logger.warning(f"Failed to find by short username: {e}")
+
+    # Пробуем формат с прочерком oblepiha_{telegram_id}_-
+    if not remnawave_user:
+        try:
+            dash_username = f"oblepiha_{user.telegram_id}_-"
+            remnawave_user = await remnawave.get_user_by_username(dash_username)
+            if remnawave_user:
+                logger.info(f"Found Oblepiha user by dash username {dash_username}: {remnawave_user.get('uuid')}")
+        except RemnawaveError as e:
+            logger.warning(f"Failed to find by dash username: {e}")
+
+    return remnawave_user
+
+
+def save_user_payment_method(user: User, payment_method: dict) -> None:
+    """
+    Сохранить данные способа оплаты пользователю и включить автопродление.
+    Вызывается, если пользователь согласился сохранить способ оплаты на странице ЮКассы.
+    """
+    user.payment_method_id = payment_method.get("id")
+    payment_type = payment_method.get("type")
+    user.payment_method_type = payment_type
+
+    # Сохраняем данные в зависимости от типа
+    if payment_type == "bank_card":
+        card_info = payment_method.get("card", {})
+        if card_info:
+            user.card_last4 = card_info.get("last4")
+            user.card_brand = card_info.get("card_type")
+        user.sbp_phone = None
+    elif payment_type == "sbp":
+        # Для СБП: сохраняем телефон если есть
+        sbp_info = payment_method.get("sbp", {})
+        phone = sbp_info.get("phone")
+        if phone:
+            # Маскируем телефон: +7***1234
+            user.sbp_phone = phone[-4:] if len(phone) >= 4 else phone
+        user.card_last4 = None
+        user.card_brand = None
+    elif payment_type in ("sber_pay", "tinkoff_bank", "yoo_money", "mir_pay"):
+        # Для кошельков/банков - просто сохраняем тип
+        user.card_last4 = None
+        user.card_brand = None
+        user.sbp_phone = None
+
+    # Автоматически включаем автопродление при сохранении способа оплаты
+    user.auto_renew_enabled = True
+    logger.info(f"Payment method saved (type={payment_type}), auto-renew enabled for user {user.telegram_id}")
+
+
+async def grant_referral_bonus(db: AsyncSession, user: User, payment: Payment) -> None:
+    """
+    Начислить бонус владельцу реферальной ссылки.
+    Условия: тариф не trial, у пользователя есть referrer_id, бонус ещё не начислялся.
+    """
+    if payment.tariff_id not in REFERRAL_QUALIFYING_TARIFFS or not user.referrer_id:
+        return
+
+    # Проверяем, не начислялся ли уже бонус за этого реферала
+    existing_reward = await db.execute(
+        select(ReferralReward).where(ReferralReward.referred_user_id == user.id)
+    )
+    if existing_reward.scalar_one_or_none():
+        return
+
+    # Находим реферера
+    referrer_result = await db.execute(
+        select(User).where(User.telegram_id == user.referrer_id)
+    )
+    referrer = referrer_result.scalar_one_or_none()
+
+    if not referrer or not referrer.remnawave_uuid:
+        logger.warning(
+            f"Cannot grant referral bonus: referrer {user.referrer_id} not found or no remnawave_uuid"
+        )
+        return
+
+    try:
+        # Начисляем бонус рефереру в Remnawave
+        # Без повторов: продление может быть относительным (не идемпотентно),
+        # после таймаута дни могли уже добавиться
+        referrer_result = await get_remnawave_service().update_user_expiration(
+            uuid=referrer.remnawave_uuid,
+            days_to_add=REFERRAL_BONUS_DAYS,
+        )
+        apply_panel_state(referrer, referrer_result)
+
+        # Записываем в таблицу бонусов
+        reward = ReferralReward(
+            referrer_user_id=referrer.id,
+            referred_user_id=user.id,
+            payment_id=payment.id,
+            bonus_days=REFERRAL_BONUS_DAYS,
+        )
+        db.add(reward)
+        await db.commit()
+
+        # Отправляем уведомление рефереру
+        await send_referral_bonus_message(
+            telegram_id=referrer.telegram_id,
+            referred_name=user.first_name or user.telegram_username or "Друг",
+            bonus_days=REFERRAL_BONUS_DAYS,
+        )
+
+        logger.info(
+            f"Referral bonus granted: +{REFERRAL_BONUS_DAYS} days to user {referrer.telegram_id} "
+            f"for referral {user.telegram_id}"
+        )
+
+    except RemnawaveError as e:
+        logger.error(f"Failed to grant referral bonus: {e}")
+
+
+def enqueue_extension(db: AsyncSession, payment: Payment) -> PendingExtension:
+    """
+    Поставить продление по оплаченному платежу в очередь.
+    Commit делает вызывающий - в той же транзакции, что и статус платежа.
+    """
+    pending = PendingExtension(
+        payment_id=payment.id,
+        user_id=payment.user_id,
+        days=payment.days,
+        status="pending",
+        next_attempt_at=datetime.utcnow(),
+    )
+    db.add(pending)
+    return pending
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    """Экспоненциальная задержка перед повтором"""
+    base = get_settings().extension_retry_base_seconds
+    return min(timedelta(seconds=base * (2 ** (attempts - 1))), EXTENSION_MAX_RETRY_DELAY)
+
+
+async def _claim(pending_id: int) -> bool:
+    """
+    Атомарно перевести задачу pending -> processing (webhook и scheduler не продлят дважды).
+
+    Продления одного пользователя выполняются по очереди: задача не берётся,
+    пока не завершена более ранняя задача того же пользователя. Иначе
+    следующее продление сдвинет expireAt между попытками незавершённой
+    и её повтор не сможет сверить результат с панелью.
+    """
+    earlier = aliased(PendingExtension)
+    async with async_session_maker() as db:
+        result = await db.execute(
+            update(PendingExtension)
+            .where(
+                PendingExtension.id == pending_id,
+                PendingExtension.status == "pending",
+                ~exists().where(
+                    earlier.user_id == PendingExtension.user_id,
+                    earlier.id < PendingExtension.id,
+                    earlier.status.in_(("pending", "processing")),
+                ),
+            )
+            .values(status="processing", claimed_at=datetime.utcnow())
+        )
+        await db.commit()
+        return result.rowcount == 1
+
+
+async def _extend(db: AsyncSession, pending: PendingExtension) -> tuple[Payment, User]:
+    """
+    Продлить подписку в Remnawave и отметить платёж и задачу выполненными.
+
+    Raises:
+        ExtensionError: remnawave_uuid не найден или Remnawave вернула ошибку
+    """
+    payment = await db.get(Payment, pending.payment_id)
+    user = await db.get(User, pending.user_id)
+    if not payment or not user:
+        raise ExtensionError(f"Payment {pending.payment_id} or user {pending.user_id} not found")
+
+    # Если нет remnawave_uuid - пробуем найти в Remnawave
+    if not user.remnawave_uuid:
+        logger.warning(f"No remnawave_uuid for user {user.telegram_id}, trying to find Oblepiha user in Remnawave")
+        remnawave_user = await find_oblepiha_remnawave_user(user)
+        if not remnawave_user:
+            raise ExtensionError(f"Remnawave user not found for telegram_id={user.telegram_id}")
+        user.remnawave_uuid = remnawave_user.get("uuid")
+
+    try:
+        remnawave_result = await _apply_to_panel(db, payment, user.remnawave_uuid, pending.days)
+    except RemnawaveError as e:
+        raise ExtensionError(f"Remnawave error: {e}")
+
+    # Продление выполнено - фиксируем одним commit вместе с задачей
+    now = datetime.utcnow()
+    payment.extended_at = now
+    pending.status = "done"
+    pending.attempts += 1
+    pending.completed_at = now
+    pending.last_error = None
+    user.is_active = True
+
+    # Обновляем локальное зеркало из ответа Remnawave (expireAt, статус, трафик)
+    if apply_panel_state(user, remnawave_result):
+        logger.info(f"Updated subscription_expires_at for user {user.telegram_id}: {user.subscription_expires_at}")
+
+    # Отмечаем использование пробного периода если это был trial
+    if payment.tariff_id == "trial":
+        user.trial_used = True
+        logger.info(f"Trial period marked as used for user {user.telegram_id}")
+
+    # Сохраняем данные способа оплаты если он был сохранён (объект платежа из webhook)
+    payment_method = _saved_payment_method(payment)
+    if payment_method:
+        save_user_payment_method(user, payment_method)
+
+    await db.commit()
+
+    logger.info(
+        f"Subscription extended: user={user.telegram_id}, days={pending.days}, payment={payment.id}"
+    )
+    return payment, user
+
+
+async def _apply_to_panel(db: AsyncSession, payment: Payment, uuid: str, days: int) -> dict:
+    """
+    Выставить в панели expireAt по платежу так, чтобы повтор не продлил дважды.
+
+    На первой попытке по свежей записи панели фиксируются expireAt до продления
+    (payments.extension_base_at) и целевой expireAt (extension_target_at) - до PATCH
+    и больше не пересчитываются. На повторе (таймаут после применения, ошибка commit):
+    - expireAt равен цели - продление дошло, остаётся зафиксировать его локально;
+    - expireAt равен исходному - не дошло, PATCH с той же целью;
+    - иначе expireAt сдвинул кто-то ещё (бонус, начисление админом), и по панели
+      не понять, дошло ли продление - ExtensionConflictError, задача уходит в dead.
+    """
+    remnawave = get_remnawave_service()
+    panel_user = await remnawave.get_user_by_uuid(uuid, use_cache=False)
+    if not panel_user:
+        raise ExtensionError(f"Remnawave user not found: {uuid}")
+
+    current_expire = remnawave.parse_expire_at(panel_user)
+    target = payment.extension_target_at
+
+    if target is None:
+        # Если подписка уже истекла, отсчёт от сейчас
+        target = max(current_expire, datetime.utcnow()) + timedelta(days=days)
+        payment.extension_base_at = current_expire
+        payment.extension_target_at = target
+        await db.commit()
+    elif abs(current_expire - target) <= EXPIRE_AT_TOLERANCE:
+        logger.info(f"Payment {payment.id} already applied in Remnawave (expireAt {current_expire})")
+        return panel_user
+    elif (
+        payment.extension_base_at is None
+        or abs(current_expire - payment.extension_base_at) > EXPIRE_AT_TOLERANCE
+    ):
+        raise ExtensionConflictError(
+            f"expireAt {current_expire} is neither the base {payment.extension_base_at} "
+            f"nor the target {target} of payment {payment.id}, check the panel manually"
+        )
+
+    logger.info(f"Extending subscription for {uuid}: +{days} days until {target} (payment {payment.id})")
+    return await remnawave.set_user_expiration(uuid, target, panel_user)
+
+
+def _saved_payment_method(payment: Payment) -> Optional[dict]:
+    """Сохранённый способ оплаты из объекта платежа YooKassa в metadata_json"""
+    if not payment.metadata_json:
+        return None
+    try:
+        payment_method = json.loads(payment.metadata_json).get("payment_method") or {}
+    except (ValueError, AttributeError):
+        return None
+    if payment_method.get("saved") and payment_method.get("id"):
+        return payment_method
+    return None
+
+
+async def _notify_extended(db: AsyncSession, payment: Payment, user: User) -> None:
+    """Уведомления и реферальный бонус после продления"""
+    if payment.is_auto_payment:
+        await send_auto_renew_success(
+            telegram_id=user.telegram_id,
+            days=payment.days,
+            amount=payment.amount // 100,
+            card_last4=user.card_last4,
+        )
+    else:
+        await send_payment_success_message(
+            telegram_id=user.telegram_id,
+            days=payment.days,
+            tariff_name=payment.tariff_name,
+        )
+
+    # === РЕФЕРАЛЬНЫЙ БОНУС ===
+    await grant_referral_bonus(db, user, payment)
+
+
+async def _record_failure(pending_id: int, error: Exception) -> None:
+    """Запланировать повтор или перевести задачу в dead"""
+    max_attempts = get_settings().extension_retry_max_attempts
+    async with async_session_maker() as db:
+        pending = await db.get(PendingExtension, pending_id)
+        pending.attempts += 1
+        pending.claimed_at = None
+        pending.last_error = str(error)[:512]
+
+        if pending.attempts >= max_attempts or isinstance(error, ExtensionConflictError):
+            pending.status = "dead"
+            logger.error(
+                f"Extension for payment {pending.payment_id} is dead after "
+                f"{pending.attempts} attempts: {error}"
+            )
+        else:
+            delay = _retry_delay(pending.attempts)
+            pending.status = "pending"
+            pending.next_attempt_at = datetime.utcnow() + delay
+            logger.error(
+                f"Failed to extend subscription for payment {pending.payment_id} "
+                f"(attempt {pending.attempts}/{max_attempts}): {error}, "
+                f"retry in {int(delay.total_seconds())}s"
+            )
+        await db.commit()
+
+
+async def run_extension(pending_id: int) -> bool:
+    """
+    Выполнить продление из очереди (в своей сессии).
+
+    Returns:
+        True если подписка продлена этим вызовом
+    """
+    if not await _claim(pending_id):
+        return False
+
+    async with async_session_maker() as db:
+        try:
+            pending = await db.get(PendingExtension, pending_id)
+            payment, user = await _extend(db, pending)
+        except Exception as e:
+            await db.rollback()
+            await _record_failure(pending_id, e)
+            return False
+
+        try:
+            await _notify_extended(db, payment, user)
+        except Exception as e:
+            # Продление уже зафиксировано - повторять нельзя
+            logger.error(f"Post-extension notifications failed for payment {payment.id}: {e}")
+
+    return True
@@ -0,0 +1,455 @@
+"""
+Массовое начисление дней подписки (компенсации, промо, бонусы когортам).
+
+Пользователи когорты обрабатываются пачками по 500 в порядке users.id.
+Активным дни добавляются через POST /api/users/bulk/extend-expiration-date,
+локально - одним относительным UPDATE (subscription_expires_at + N дней) по тем же id:
+продление, пришедшее во время задачи, не перезаписывается.
+Истёкшим подписка продлевается от текущего момента через update_user_expiration.
+
+Задача и курсор хранятся в grant_days_jobs. Если панель недоступна (5xx, таймаут,
+circuit breaker), задача останавливается на текущей пачке (failed). После этого
+или после падения процесса задачу продолжают (POST /api/admin/grant-days/{job_id}/resume),
+а не запускают заново: повторный запуск начислил бы дни второй раз, поэтому новая
+задача с теми же параметрами, пока старая не завершена, отклоняется.
+Относительное продление не идемпотентно, поэтому пачку, на которой задача
+остановилась, продолжение сначала сверяет с панелью.
+"""
+
+import asyncio
+import json
+import logging
+import uuid as uuid_lib
+from datetime import datetime, timedelta
+from typing import Literal, Optional
+
+from sqlalchemy import func, or_, select, update
+
+from app.database import async_session_maker, is_sqlite
+from app.models.grant_days_job import GrantDaysJob
+from app.models.user import User
+from app.services.remnawave import get_remnawave_service, RemnawaveError
+
+logger = logging.getLogger(__name__)
+
+# Лимит uuids в одном запросе bulk/extend-expiration-date
+GRANT_CHUNK_SIZE = 500
+
+# Сколько истёкших пользователей продлеваем параллельно
+EXPIRED_CONCURRENCY = 10
+
+# Задача running без обновлений дольше этого считается упавшей (можно продолжить)
+GRANT_STALE_AFTER = timedelta(minutes=10)
+
+# Точность сравнения expireAt панели с локальным (панель хранит миллисекунды)
+EXPIRE_AT_TOLERANCE = timedelta(seconds=1)
+
+# Сколько последних задач отдаёт список
+MAX_LISTED_JOBS = 50
+
+GrantCohort = Literal["all", "active", "trial_used", "auto_renew", "telegram_ids"]
+
+# Ссылки на фоновые задачи, чтобы их не собрал GC
+_running_tasks: set[asyncio.Task] = set()
+
+
+class GrantDaysConflictError(Exception):
+    """Задача с теми же параметрами ещё не завершена"""
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        super().__init__(f"Grant days job {job_id} with the same parameters is not finished")
+
+
+async def get_grant_job(job_id: str) -> Optional[GrantDaysJob]:
+    """Получить задачу по ID"""
+    async with async_session_maker() as db:
+        return await db.get(GrantDaysJob, job_id)
+
+
+async def list_grant_jobs() -> list[GrantDaysJob]:
+    """Последние задачи, новые первыми"""
+    async with async_session_maker() as db:
+        result = await db.execute(
+            select(GrantDaysJob).order_by(GrantDaysJob.started_at.desc()).limit(MAX_LISTED_JOBS)
+        )
+        return list(result.scalars().all())
+
+
+def _spawn(job_id: str) -> None:
+    task = asyncio.create_task(_run_grant_days(job_id))
+    _running_tasks.add(task)
+    task.add_done_callback(_running_tasks.discard)
+
+
+async def start_grant_days(
+    days: int,
+    cohort: GrantCohort,
+    telegram_ids: Optional[list[int]] = None,
+    include_expired: bool = False,
+) -> GrantDaysJob:
+    """
+    Запустить начисление дней в фоне и вернуть задачу для отслеживания прогресса.
+
+    Raises:
+        GrantDaysConflictError: такая же задача ещё running или failed
+    """
+    telegram_ids_json = json.dumps(sorted(set(telegram_ids))) if cohort == "telegram_ids" else None
+
+    async with async_session_maker() as db:
+        unfinished = (await db.execute(
+            select(GrantDaysJob.id).where(
+                GrantDaysJob.days == days,
+                GrantDaysJob.cohort == cohort,
+                GrantDaysJob.include_expired == include_expired,
+                GrantDaysJob.status.in_(("running", "failed")),
+                GrantDaysJob.telegram_ids_json.is_(None)
+                if telegram_ids_json is None
+                else GrantDaysJob.telegram_ids_json == telegram_ids_json,
+            ).limit(1)
+        )).scalar_one_or_none()
+        if unfinished:
+            raise GrantDaysConflictError(unfinished)
+
+        now = datetime.utcnow()
+        job = GrantDaysJob(
+            id=uuid_lib.uuid4().hex,
+            days=days,
+            cohort=cohort,
+            telegram_ids_json=telegram_ids_json,
+            include_expired=include_expired,
+            status="running",
+            started_at=now,
+            updated_at=now,
+        )
+        job.total = (await db.execute(
+            select(func.count(User.id)).where(
+                User.remnawave_uuid.isnot(None),
+                _cohort_filter(cohort, telegram_ids or []),
+            )
+        )).scalar() or 0
+        db.add(job)
+        await db.commit()
+
+    _spawn(job.id)
+    return job
+
+
+async def resume_grant_days(job_id: str) -> Optional[GrantDaysJob]:
+    """
+    Продолжить failed или упавшую (running без обновлений GRANT_STALE_AFTER) задачу с курсора.
+
+    Returns:
+        Задача или None если её нельзя продолжить (не найдена, выполняется, завершена)
+    """
+    now = datetime.utcnow()
+    async with async_session_maker() as db:
+        # Условие в UPDATE - два процесса не продолжат одну задачу дважды
+        result = await db.execute(
+            update(GrantDaysJob)
+            .where(
+                GrantDaysJob.id == job_id,
+                or_(
+                    GrantDaysJob.status == "failed",
+                    (GrantDaysJob.status == "running")
+                    & (GrantDaysJob.updated_at < now - GRANT_STALE_AFTER),
+                ),
+            )
+            .values(status="running", error=None, finished_at=None, updated_at=now)
+        )
+        await db.commit()
+        if result.rowcount != 1:
+            return None
+        job = await db.get(GrantDaysJob, job_id)
+
+    logger.info(f"Grant days job {job_id} resumed after user id {job.last_user_id}")
+    _spawn(job_id)
+    return job
+
+
+def _cohort_filter(cohort: GrantCohort, telegram_ids: list[int]):
+    """Условие выборки когорты"""
+    if cohort == "active":
+        return User.is_active == True
+    if cohort == "trial_used":
+        return User.trial_used == True
+    if cohort == "auto_renew":
+        return User.auto_renew_enabled == True
+    if cohort == "telegram_ids":
+        return User.telegram_id.in_(telegram_ids)
+    return User.remnawave_uuid.isnot(None)
+
+
+def _shifted_expiry(days: int):
+    """subscription_expires_at + days на стороне БД"""
+    if is_sqlite:
+        # DateTime в SQLite - строка, арифметика через datetime()
+        return func.datetime(User.subscription_expires_at, f"+{days} days")
+    return User.subscription_expires_at + timedelta(days=days)
+
+
+async def _run_grant_days(job_id: str) -> None:
+    """Выполнить задачу начисления дней с курсора last_user_id"""
+    async with async_session_maker() as db:
+        job = await db.get(GrantDaysJob, job_id)
+    telegram_ids = json.loads(job.telegram_ids_json) if job.telegram_ids_json else []
+    cohort_filter = _cohort_filter(job.cohort, telegram_ids)
+    logger.info(f"Grant days job {job.id} started: +{job.days} days, cohort={job.cohort}")
+
+    try:
+        if job.in_flight_until_id is not None:
+            await _resume_in_flight_chunk(job, cohort_filter)
+
+        while True:
+            async with async_session_maker() as db:
+                rows = (await db.execute(
+                    select(User.id, User.remnawave_uuid, User.subscription_expires_at)
+                    .where(
+                        User.remnawave_uuid.isnot(None),
+                        cohort_filter,
+                        User.id > job.last_user_id,
+                    )
+                    .order_by(User.id)
+                    .limit(GRANT_CHUNK_SIZE)
+                )).all()
+            if not rows:
+                break
+            await _grant_chunk(job, rows, rows[-1].id, _new_counts())
+
+        job.status = "completed"
+
+    except Exception as e:
+        # Пачка остаётся in flight, курсор - перед ней: /resume сверит её с панелью
+        logger.error(f"Grant days job {job.id} failed: {e}")
+        job.status = "failed"
+        job.error = str(e)[:512]
+
+    job.finished_at = datetime.utcnow()
+    await _save_job(job)
+    logger.info(
+        f"Grant days job {job.id} {job.status}: extended={job.extended}, failed={job.failed}, "
+        f"skipped_expired={job.skipped_expired}, uncertain={job.uncertain}"
+    )
+
+
+async def _save_job(job: GrantDaysJob, db=None) -> None:
+    """Сохранить состояние задачи (в переданной сессии - без commit)"""
+    job.updated_at = datetime.utcnow()
+    if db is not None:
+        await db.merge(job)
+        return
+    async with async_session_maker() as db:
+        await db.merge(job)
+        await db.commit()
+
+
+def _new_counts() -> dict:
+    """Счётчики пачки - попадают в задачу только вместе с commit пачки"""
+    return {"processed": 0, "extended": 0, "failed": 0, "skipped_expired": 0, "uncertain": 0}
+
+
+async def _resume_in_flight_chunk(job: GrantDaysJob, cohort_filter) -> None:
+    """
+    Досчитать пачку, по которой задача остановилась (ошибка панели или падение процесса).
+
+    Локально пачка не менялась (UPDATE users - в одном commit со сдвигом курсора),
+    поэтому expireAt в панели сверяется с subscription_expires_at:
+    - равен локальному - продление не дошло, пачка продлевается заново;
+    - равен локальному + days - дошло, остаётся локальный UPDATE;
+    - иначе (истёкшего продлили от текущего момента, expireAt сдвинул кто-то ещё) -
+      повторно не продлеваем, uncertain для ручной сверки.
+
+    Raises:
+        RemnawaveError: панель недоступна - пачка остаётся in flight
+    """
+    async with async_session_maker() as db:
+        rows = (await db.execute(
+            select(User.id, User.remnawave_uuid, User.subscription_expires_at)
+            .where(
+                User.remnawave_uuid.isnot(None),
+                cohort_filter,
+                User.id > job.last_user_id,
+                User.id <= job.in_flight_until_id,
+            )
+            .order_by(User.id)
+        )).all()
+
+    remnawave = get_remnawave_service()
+    semaphore = asyncio.Semaphore(EXPIRED_CONCURRENCY)
+    now = datetime.utcnow()
+
+    async def panel_expire(row) -> Optional[datetime]:
+        async with semaphore:
+            panel_user = await remnawave.get_user_by_uuid(row.remnawave_uuid, use_cache=False)
+        return remnawave.parse_expire_at(panel_user) if panel_user else None
+
+    expires = await asyncio.gather(*(panel_expire(r) for r in rows), return_exceptions=True)
+    error = next((e for e in expires if isinstance(e, BaseException)), None)
+    if error:
+        raise error
+
+    counts = _new_counts()
+    retry, applied_ids, uncertain_ids = [], [], []
+    for row, expire in zip(rows, expires):
+        local = row.subscription_expires_at
+        if expire is None:
+            counts["failed"] += 1
+        elif local is not None and abs(expire - local) <= EXPIRE_AT_TOLERANCE:
+            retry.append(row)
+        elif local is not None and abs(expire - local - timedelta(days=job.days)) <= EXPIRE_AT_TOLERANCE:
+            applied_ids.append(row.id)
+        elif (local is None or local <= now) and expire <= now:
+            retry.append(row)
+        else:
+            uncertain_ids.append(row.id)
+
+    counts["extended"] += len(applied_ids)
+    counts["uncertain"] += len(uncertain_ids)
+    counts["processed"] += len(rows) - len(retry)
+    if uncertain_ids:
+        logger.warning(
+            f"Grant days job {job.id}: {len(uncertain_ids)} users of the chunk "
+            f"{job.last_user_id + 1}..{job.in_flight_until_id} may already have the days, "
+            f"not granting them again - check manually: {uncertain_ids}"
+        )
+
+    await _grant_chunk(job, retry, job.in_flight_until_id, counts, applied_ids)
+
+
+async def _grant_chunk(
+    job: GrantDaysJob,
+    rows: list,
+    chunk_end_id: int,
+    counts: dict,
+    applied_ids: Optional[list[int]] = None,
+) -> None:
+    """
+    Продлить пачку и сдвинуть курсор до chunk_end_id одним commit с локальным UPDATE.
+
+    applied_ids - пользователи пачки, которых панель уже продлила (при продолжении).
+
+    Raises:
+        RemnawaveError: панель недоступна, 5xx или таймаут - пачка остаётся in flight,
+            курсор и счётчики не меняются
+    """
+    now = datetime.utcnow()
+    active = [r for r in rows if r.subscription_expires_at and r.subscription_expires_at > now]
+    expired = [r for r in rows if not (r.subscription_expires_at and r.subscription_expires_at > now)]
+
+    if job.in_flight_until_id != chunk_end_id:
+        job.in_flight_until_id = chunk_end_id
+        await _save_job(job)
+
+    # Сначала активные: если bulk-запрос не прошёл, истёкших не трогаем
+    active_ids = await _grant_active(job, active, counts)
+    expired_changes = await _grant_expired(job, expired, counts) if job.include_expired else []
+    if not job.include_expired:
+        counts["skipped_expired"] += len(expired)
+    counts["processed"] += len(rows)
+
+    shifted_ids = active_ids + (applied_ids or [])
+    async with async_session_maker() as db:
+        if shifted_ids:
+            await db.execute(
+                update(User)
+                .where(User.id.in_(shifted_ids))
+                .values(subscription_expires_at=_shifted_expiry(job.days))
+            )
+        if expired_changes:
+            # Абсолютные значения - из ответа панели на продление
+            await db.execute(update(User), expired_changes)
+
+        for name, value in counts.items():
+            setattr(job, name, getattr(job, name) + value)
+        job.last_user_id = chunk_end_id
+        job.in_flight_until_id = None
+        await _save_job(job, db)
+        await db.commit()
+
+
+async def _grant_active(job: GrantDaysJob, rows: list, counts: dict) -> list[int]:
+    """
+    Продлить активных пользователей через bulk/extend-expiration-date.
+
+    Returns:
+        id пользователей, которых панель точно продлила (для локального UPDATE)
+
+    Raises:
+        RemnawaveError: панель недоступна, 5xx или таймаут (4xx - пачка в failed)
+    """
+    if not rows:
+        return []
+
+    remnawave = get_remnawave_service()
+    uuids = [r.remnawave_uuid for r in rows]
+
+    try:
+        affected = await remnawave.bulk_extend_expiration(uuids, job.days)
+    except RemnawaveError as e:
+        if e.retryable:
+            raise
+        logger.error(f"Grant days job {job.id}: chunk after user id {job.last_user_id} failed: {e}")
+        counts["failed"] += len(rows)
+        return []
+
+    for remnawave_uuid in uuids:
+        remnawave.user_cache.invalidate(remnawave_uuid)
+
+    counts["extended"] += affected
+    counts["failed"] += max(len(rows) - affected, 0)
+
+    if affected != len(rows):
+        # Ответ содержит только affectedRows - каких именно uuid нет, неизвестно.
+        # Локально пачку не трогаем: expireAt из панели перенесёт sync_remnawave
+        logger.warning(
+            f"Grant days job {job.id}: chunk after user id {job.last_user_id} "
+            f"affected {affected} of {len(rows)}, local expiry left to sync"
+        )
+        return []
+
+    return [r.id for r in rows]
+
+
+async def _grant_expired(job: GrantDaysJob, rows: list, counts: dict) -> list[dict]:
+    """
+    Продлить истёкших пользователей от текущего момента.
+
+    Returns:
+        Значения для UPDATE users (executemany по первичному ключу)
+
+    Raises:
+        RemnawaveError: панель недоступна, 5xx или таймаут хотя бы для одного
+            пользователя (4xx - пользователь в failed)
+    """
+    remnawave = get_remnawave_service()
+    semaphore = asyncio.Semaphore(EXPIRED_CONCURRENCY)
+
+    async def grant(row):
+        async with semaphore:
+            try:
+                return await remnawave.update_user_expiration(row.remnawave_uuid, job.days)
+            except RemnawaveError as e:
+                logger.error(f"Grant days job {job.id}: failed for {row.remnawave_uuid}: {e}")
+                return e
+
+    results = await asyncio.gather(*(grant(r) for r in rows))
+
+    unavailable = next((r for r in results if isinstance(r, RemnawaveError) and r.retryable), None)
+    if unavailable:
+        raise unavailable
+
+    changes = []
+    for row, updated in zip(rows, results):
+        if isinstance(updated, RemnawaveError) or not updated or not updated.get("expireAt"):
+            counts["failed"] += 1
+            continue
+        try:
+            expires_at = datetime.fromisoformat(
+                updated["expireAt"].replace("Z", "+00:00")
+            ).replace(tzinfo=None)
+        except ValueError:
+            counts["failed"] += 1
+            continue
+        changes.append({"id": row.id, "subscription_expires_at": expires_at, "is_active": True})
+        counts["extended"] += 1
+
+    return changes
@@ -0,0 +1,114 @@
+"""
+Локальное зеркало состояния пользователя в Remnawave.
+
+Поля панели (expireAt, status, usedBytes, trafficLimitBytes, subscriptionUrl)
+хранятся в users и обновляются задачей синхронизации и всеми путями записи.
+Эндпоинты /api/users/me* отвечают из БД и обновляют зеркало в фоне,
+если оно старше panel_mirror_max_age_seconds.
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from app.config import get_settings
+from app.database import async_session_maker
+from app.models.user import User
+from app.services.remnawave import get_remnawave_service, RemnawaveError
+
+logger = logging.getLogger(__name__)
+
+# Пользователи, для которых фоновое обновление уже запущено
+_refreshing: set[int] = set()
+
+
+def parse_panel_state(
+    remnawave_user: dict,
+    now: datetime,
+) -> tuple[Optional[datetime], bool]:
+    """
+    Получить (subscription_expires_at, is_active) из записи панели.
+
+    Raises:
+        ValueError: если expireAt не парсится
+    """
+    expire_at_str = remnawave_user.get("expireAt")
+    if not expire_at_str:
+        return None, False
+
+    expires_at = datetime.fromisoformat(
+        expire_at_str.replace("Z", "+00:00")
+    ).replace(tzinfo=None)
+    is_active = remnawave_user.get("status", "") == "ACTIVE" and expires_at > now
+    return expires_at, is_active
+
+
+def panel_state_values(remnawave_user: dict, now: datetime) -> dict:
+    """
+    Значения колонок users из записи панели.
+
+    Raises:
+        ValueError: если expireAt не парсится
+    """
+    expires_at, is_active = parse_panel_state(remnawave_user, now)
+    traffic = remnawave_user.get("userTraffic") or {}
+    values = {
+        "subscription_expires_at": expires_at,
+        "is_active": is_active,
+        "remnawave_status": remnawave_user.get("status"),
+        "traffic_used_bytes": traffic.get("usedTrafficBytes", traffic.get("usedBytes", 0)) or 0,
+        "traffic_limit_bytes": remnawave_user.get("trafficLimitBytes", 0) or 0,
+        "panel_synced_at": now,
+    }
+    if remnawave_user.get("subscriptionUrl"):
+        values["subscription_url"] = remnawave_user["subscriptionUrl"]
+    return values
+
+
+def apply_panel_state(user: User, remnawave_user: Optional[dict]) -> bool:
+    """
+    Записать состояние из ответа панели в строку пользователя (без commit).
+    Возвращает False если запись пустая или expireAt не парсится.
+    """
+    if not remnawave_user:
+        return False
+    try:
+        values = panel_state_values(remnawave_user, datetime.utcnow())
+    except ValueError as e:
+        logger.warning(f"Failed to parse panel state for user {user.telegram_id}: {e}")
+        return False
+    for column, value in values.items():
+        setattr(user, column, value)
+    return True
+
+
+def is_mirror_stale(user: User) -> bool:
+    """Зеркало не обновлялось дольше panel_mirror_max_age_seconds"""
+    if user.panel_synced_at is None:
+        return True
+    max_age = timedelta(seconds=get_settings().panel_mirror_max_age_seconds)
+    return datetime.utcnow() - user.panel_synced_at > max_age
+
+
+async def refresh_user_from_panel(user_id: int) -> None:
+    """
+    Обновить зеркало пользователя из панели в отдельной сессии.
+    Запускается фоном после ответа; повторный запуск для того же юзера пропускается.
+    """
+    if user_id in _refreshing:
+        return
+    _refreshing.add(user_id)
+    try:
+        async with async_session_maker() as db:
+            user = await db.get(User, user_id)
+            if not user or not user.remnawave_uuid:
+                return
+            remnawave_user = await get_remnawave_service().get_user_by_uuid(user.remnawave_uuid)
+            if apply_panel_state(user, remnawave_user):
+                await db.commit()
+    except RemnawaveError as e:
+        logger.warning(f"Background panel refresh failed for user_id={user_id}: {e}")
+    except Exception as e:
+        logger.error(f"Unexpected error refreshing user_id={user_id} from panel: {e}")
+    finally:
+        _refreshing.discard(user_id)
@@ -0,0 +1,276 @@
+"""
+Outbox уведомлений YooKassa.
+
+Webhook проверяет уведомление по API YooKassa, сохраняет подтверждённое событие
+в payment_events и сразу отвечает 200 - медленная панель или Telegram
+не вызывают повторов YooKassa.
+Фоновый воркер (запускается в lifespan FastAPI) забирает события и обрабатывает их
+через handle_payment_notification (по объекту платежа из API YooKassa),
+при ошибке повторяет с экспоненциальной задержкой.
+"""
+
+import asyncio
+import json
+import logging
+from contextlib import suppress
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.database import async_session_maker
+from app.models.payment_event import PaymentEvent
+from app.services.payment_processing import handle_payment_notification
+from app.services.payment_status import publish_payment_update
+
+logger = logging.getLogger(__name__)
+
+# Сколько событий забираем за один проход
+OUTBOX_BATCH_SIZE = 20
+
+# Максимальная задержка между повторами
+OUTBOX_MAX_RETRY_DELAY = timedelta(hours=1)
+
+# Событие в processing дольше этого времени считается брошенным (процесс упал)
+OUTBOX_CLAIM_TIMEOUT = timedelta(minutes=10)
+
+# События YooKassa, которые можно восстановить по статусу платежа из API
+POLLED_PAYMENT_EVENTS = frozenset({
+    "payment.waiting_for_capture",
+    "payment.succeeded",
+    "payment.canceled",
+})
+
+_wakeup: Optional[asyncio.Event] = None
+_worker_task: Optional[asyncio.Task] = None
+
+
+def _get_wakeup() -> asyncio.Event:
+    global _wakeup
+    if _wakeup is None:
+        _wakeup = asyncio.Event()
+    return _wakeup
+
+
+async def enqueue_payment_event(
+    db: AsyncSession,
+    event: str,
+    payment_object: dict,
+) -> PaymentEvent:
+    """Добавить уведомление в outbox (commit делает вызывающий)"""
+    payment_event = PaymentEvent(
+        yookassa_payment_id=payment_object["id"],
+        event=event,
+        payload=json.dumps(payment_object),
+        status="pending",
+        next_attempt_at=datetime.utcnow(),
+    )
+    db.add(payment_event)
+    return payment_event
+
+
+async def enqueue_polled_payment_event(payment_object: dict) -> Optional[int]:
+    """
+    Записать статус платежа, полученный из API YooKassa, как уведомление outbox.
+
+    Единственный путь в журнал: webhook, опрос статуса и сверка пишут только
+    подтверждённый API статус. Событие попадает в журнал, поэтому запоздавший
+    webhook будет отброшен как повтор.
+
+    Returns: id нового события или None (событие уже в журнале или статус не из POLLED_PAYMENT_EVENTS)
+    """
+    payment_id = payment_object["id"]
+    event_type = f"payment.{payment_object.get('status')}"
+    if event_type not in POLLED_PAYMENT_EVENTS:
+        return None
+
+    async with async_session_maker() as db:
+        existing = await db.execute(
+            select(PaymentEvent.id).where(
+                PaymentEvent.yookassa_payment_id == payment_id,
+                PaymentEvent.event == event_type,
+            )
+        )
+        if existing.scalar_one_or_none():
+            return None
+
+        payment_event = await enqueue_payment_event(db, event_type, payment_object)
+        try:
+            await db.commit()
+        except IntegrityError:
+            # Webhook с тем же событием записался параллельно
+            await db.rollback()
+            return None
+
+    logger.info(f"Payment {payment_id} {event_type} taken from YooKassa API")
+    return payment_event.id
+
+
+def notify_outbox() -> None:
+    """Разбудить воркер (вызывается после commit нового события)"""
+    _get_wakeup().set()
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    """Экспоненциальная задержка перед повтором"""
+    base = get_settings().payment_outbox_retry_base_seconds
+    return min(timedelta(seconds=base * (2 ** (attempts - 1))), OUTBOX_MAX_RETRY_DELAY)
+
+
+async def _claim(event_id: int) -> bool:
+    """Атомарно перевести событие pending -> processing (одно событие - один обработчик)"""
+    async with async_session_maker() as db:
+        result = await db.execute(
+            update(PaymentEvent)
+            .where(PaymentEvent.id == event_id, PaymentEvent.status == "pending")
+            .values(status="processing", claimed_at=datetime.utcnow())
+        )
+        await db.commit()
+        return result.rowcount == 1
+
+
+async def process_payment_event(event_id: int) -> None:
+    """Обработать одно событие outbox"""
+    if not await _claim(event_id):
+        return
+
+    async with async_session_maker() as db:
+        payment_event = await db.get(PaymentEvent, event_id)
+        try:
+            # payload - только запись уведомления, состояние платежа берётся из API
+            await handle_payment_notification(db, payment_event.yookassa_payment_id)
+        except Exception as e:
+            await db.rollback()
+            await _record_failure(event_id, e)
+            return
+
+        payment_event.status = "done"
+        payment_event.claimed_at = None
+        payment_event.attempts += 1
+        payment_event.processed_at = datetime.utcnow()
+        payment_event.last_error = None
+        await db.commit()
+
+    # Статус платежа в БД обновлён - будим long-poll запросы Mini App
+    publish_payment_update(payment_event.yookassa_payment_id)
+
+
+async def _record_failure(event_id: int, error: Exception) -> None:
+    """Запланировать повтор или перевести событие в failed"""
+    max_attempts = get_settings().payment_outbox_max_attempts
+    async with async_session_maker() as db:
+        payment_event = await db.get(PaymentEvent, event_id)
+        payment_event.attempts += 1
+        payment_event.claimed_at = None
+        payment_event.last_error = f"{type(error).__name__}: {error}"[:512]
+
+        if payment_event.attempts >= max_attempts:
+            payment_event.status = "failed"
+            logger.error(
+                f"Payment event {event_id} ({payment_event.event} {payment_event.yookassa_payment_id}) "
+                f"failed after {payment_event.attempts} attempts: {error}"
+            )
+        else:
+            delay = _retry_delay(payment_event.attempts)
+            payment_event.status = "pending"
+            payment_event.next_attempt_at = datetime.utcnow() + delay
+            logger.warning(
+                f"Payment event {event_id} attempt {payment_event.attempts}/{max_attempts} "
+                f"failed: {error}, retry in {int(delay.total_seconds())}s"
+            )
+        await db.commit()
+
+
+async def drain_outbox() -> int:
+    """
+    Обработать все события, время которых пришло.
+    Returns: количество взятых в обработку событий
+    """
+    processed = 0
+    while True:
+        async with async_session_maker() as db:
+            result = await db.execute(
+                select(PaymentEvent.id)
+                .where(
+                    PaymentEvent.status == "pending",
+                    PaymentEvent.next_attempt_at <= datetime.utcnow(),
+                )
+                .order_by(PaymentEvent.id)
+                .limit(OUTBOX_BATCH_SIZE)
+            )
+            event_ids = list(result.scalars().all())
+
+        if not event_ids:
+            return processed
+
+        # По порядку: уведомления одного платежа применяются в порядке поступления
+        for event_id in event_ids:
+            await process_payment_event(event_id)
+            processed += 1
+
+        if len(event_ids) < OUTBOX_BATCH_SIZE:
+            return processed
+
+
+async def _release_stuck_events() -> None:
+    """
+    Вернуть в очередь события, зависшие в processing (процесс упал во время обработки).
+
+    Воркеров может быть несколько (по одному на процесс API), поэтому свежие
+    processing - чужие, ещё обрабатываемые: возвращаются только взятые дольше
+    OUTBOX_CLAIM_TIMEOUT назад. Без claimed_at - взятые до появления поля.
+    """
+    async with async_session_maker() as db:
+        result = await db.execute(
+            update(PaymentEvent)
+            .where(
+                PaymentEvent.status == "processing",
+                or_(
+                    PaymentEvent.claimed_at.is_(None),
+                    PaymentEvent.claimed_at < datetime.utcnow() - OUTBOX_CLAIM_TIMEOUT,
+                ),
+            )
+            .values(status="pending", claimed_at=None)
+        )
+        await db.commit()
+        if result.rowcount:
+            logger.warning(f"Released {result.rowcount} payment events stuck in processing")
+
+
+async def _worker_loop() -> None:
+    """Обрабатывать outbox: сразу после нового события или раз в poll_seconds"""
+    poll_seconds = get_settings().payment_outbox_poll_seconds
+    wakeup = _get_wakeup()
+
+    while True:
+        wakeup.clear()
+        try:
+            await _release_stuck_events()
+            await drain_outbox()
+        except Exception as e:
+            logger.error(f"Payment outbox drain failed: {e}")
+
+        with suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(wakeup.wait(), timeout=poll_seconds)
+
+
+def start_outbox_worker() -> None:
+    """Запустить воркер outbox (lifespan FastAPI)"""
+    global _worker_task
+    if _worker_task is None or _worker_task.done():
+        _worker_task = asyncio.create_task(_worker_loop())
+        logger.info("Payment outbox worker started")
+
+
+async def stop_outbox_worker() -> None:
+    """Остановить воркер outbox"""
+    global _worker_task
+    if _worker_task is not None:
+        _worker_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await _worker_task
+        _worker_task = None
+        logger.info("Payment outbox worker stopped")
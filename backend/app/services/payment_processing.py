@@ -0,0 +1,117 @@
+"""
+Обработка уведомлений YooKassa о платежах.
+
+Вызывается воркером outbox (app/services/payment_outbox.py), а не из webhook напрямую.
+Состояние платежа берётся из API YooKassa, а не из тела уведомления: поддельное
+или устаревшее уведомление не переводит платёж в succeeded.
+Обработчик идемпотентен: продление по платежу ставится в очередь один раз
+(UNIQUE pending_extensions.payment_id) и выполняется один раз (payments.extended_at),
+реферальный бонус - один раз за реферала (UNIQUE referral_rewards.referred_user_id).
+"""
+
+import json
+import logging
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.payment import Payment
+from app.models.pending_extension import PendingExtension
+from app.services.extension_queue import enqueue_extension, run_extension
+from app.services.payment_status import is_terminal_status
+from app.services.yookassa_service import get_yookassa_service
+
+logger = logging.getLogger(__name__)
+
+
+def _is_status_regression(current: str, new: str) -> bool:
+    """
+    Уведомление тянет статус платежа назад: финальный статус не меняется,
+    waiting_for_capture не возвращается в pending.
+    """
+    if current == new:
+        return False
+    if is_terminal_status(current):
+        return True
+    return current == "waiting_for_capture" and new == "pending"
+
+
+class PaymentNotFoundError(LookupError):
+    """
+    Платёж из уведомления ещё не записан в БД.
+    Например, webhook автоплатежа пришёл раньше commit в auto_renew - обработка повторится.
+    """
+
+
+async def handle_payment_notification(db: AsyncSession, yookassa_payment_id: str) -> None:
+    """
+    Применить к платежу его текущее состояние в YooKassa.
+
+    Объект платежа запрашивается в API (GET /payments/{id}). Обновляет статус
+    платежа; при успешной оплате в той же транзакции ставит продление подписки
+    в очередь (pending_extensions) и сразу пробует его выполнить.
+    Если Remnawave недоступна - продление повторит scheduler.
+
+    Raises:
+        YooKassaError: API YooKassa недоступен (обработка будет повторена)
+        PaymentNotFoundError: платежа ещё нет в БД (обработка будет повторена)
+    """
+    payment_object = await get_yookassa_service().get_payment_object(yookassa_payment_id)
+    payment_id = payment_object.get("id")
+
+    # Находим платёж в БД
+    result = await db.execute(
+        select(Payment).where(Payment.yookassa_payment_id == payment_id)
+    )
+    payment = result.scalar_one_or_none()
+
+    if not payment:
+        raise PaymentNotFoundError(f"Payment not found in DB: {payment_id}")
+
+    new_status = payment_object.get("status", "unknown")
+
+    # Уведомления (webhook и опрос API) могут прийти не по порядку
+    if _is_status_regression(payment.status, new_status):
+        logger.warning(
+            f"Payment {payment_id} notification {new_status} ignored: "
+            f"payment is already {payment.status}"
+        )
+        return
+
+    # Обновляем статус платежа
+    payment.status = new_status
+    payment.metadata_json = json.dumps(payment_object)
+
+    if not (new_status == "succeeded" and payment_object.get("paid")):
+        await db.commit()
+        return
+
+    # Повторное уведомление об уже обработанном платеже
+    if payment.extended_at:
+        logger.info(f"Payment {payment_id} already applied at {payment.extended_at}, skipping")
+        await db.commit()
+        return
+
+    logger.info(f"Payment succeeded: {payment_id}, extending subscription")
+
+    if not payment.paid_at:
+        payment.paid_at = datetime.utcnow()
+
+    # Сохраняем payment_method_id если карта была сохранена
+    payment_method = payment_object.get("payment_method", {})
+    if payment_method.get("saved") and payment_method.get("id"):
+        payment.payment_method_id = payment_method["id"]
+        logger.info(f"Saved payment_method_id: {payment.payment_method_id}")
+
+    # Продление в очередь - в одной транзакции со статусом платежа
+    existing = await db.execute(
+        select(PendingExtension).where(PendingExtension.payment_id == payment.id)
+    )
+    pending = existing.scalar_one_or_none()
+    if pending is None:
+        pending = enqueue_extension(db, payment)
+    await db.commit()
+
+    # Пробуем продлить сразу; при ошибке задача останется в очереди
+    await run_extension(pending.id)
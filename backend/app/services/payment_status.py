@@ -0,0 +1,90 @@
+"""
+Ожидание смены статуса платежа.
+
+Mini App ждёт результат оплаты long-poll запросом /api/payments/{id}/status?wait=N.
+Запрос просыпается по in-process уведомлению, которое outbox публикует после
+применения webhook YooKassa. Если webhook задерживается - статус берётся из YooKassa
+через короткий кеш. По платежу в конечном статусе YooKassa больше не запрашивается.
+"""
+
+import asyncio
+import logging
+from contextlib import contextmanager, suppress
+from typing import Iterator, Optional
+
+from app.config import get_settings
+from app.services.cache import TTLCache
+from app.services.yookassa_service import get_yookassa_service
+
+logger = logging.getLogger(__name__)
+
+# Статусы, после которых платёж больше не меняется
+TERMINAL_PAYMENT_STATUSES = frozenset({"succeeded", "canceled"})
+
+# yookassa_payment_id -> события ожидающих запросов
+_waiters: dict[str, set[asyncio.Event]] = {}
+
+_yookassa_status_cache: Optional[TTLCache] = None
+
+
+def is_terminal_status(status: str) -> bool:
+    return status in TERMINAL_PAYMENT_STATUSES
+
+
+def publish_payment_update(yookassa_payment_id: str) -> None:
+    """Разбудить запросы, ждущие этот платёж (вызывается после commit нового статуса)"""
+    for event in _waiters.get(yookassa_payment_id, ()):
+        event.set()
+
+
+@contextmanager
+def subscribe_payment_update(yookassa_payment_id: str) -> Iterator[asyncio.Event]:
+    """
+    Подписаться на уведомления о платеже.
+    Подписка оформляется до чтения статуса из БД: commit с publish между чтением
+    и ожиданием иначе не разбудил бы запрос.
+    """
+    event = asyncio.Event()
+    _waiters.setdefault(yookassa_payment_id, set()).add(event)
+    try:
+        yield event
+    finally:
+        waiters = _waiters.get(yookassa_payment_id)
+        if waiters is not None:
+            waiters.discard(event)
+            if not waiters:
+                del _waiters[yookassa_payment_id]
+
+
+async def wait_for_payment_update(update: asyncio.Event, timeout: float) -> bool:
+    """
+    Ждать уведомления по подписке subscribe_payment_update не дольше timeout секунд.
+    Returns: True если пришло уведомление, False по таймауту
+    """
+    with suppress(asyncio.TimeoutError):
+        await asyncio.wait_for(update.wait(), timeout=timeout)
+    return update.is_set()
+
+
+def get_yookassa_status_cache() -> TTLCache:
+    """Кеш ответов YooKassa по платежам (yookassa_payment_id -> объект платежа)"""
+    global _yookassa_status_cache
+    if _yookassa_status_cache is None:
+        settings = get_settings()
+        _yookassa_status_cache = TTLCache(
+            max_size=settings.payment_status_cache_size,
+            ttl_seconds=settings.payment_status_cache_seconds,
+        )
+    return _yookassa_status_cache
+
+
+async def fetch_yookassa_payment(yookassa_payment_id: str) -> Optional[dict]:
+    """
+    Объект платежа из YooKassa через кеш.
+    Конкурентные запросы по одному платежу объединяются в один вызов API.
+    """
+    async def load() -> Optional[dict]:
+        payment = await get_yookassa_service().get_payment(yookassa_payment_id)
+        return dict(payment) if payment else None
+
+    return await get_yookassa_status_cache().get_or_load(yookassa_payment_id, load)
@@ -3,16 +3,25 @@
 Все операции с пользователями VPN проходят через этот сервис.
 """
 
+import asyncio
 import logging
+import random
+import time
+from contextlib import suppress
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import AsyncIterator, Optional
 
 import httpx
 
 from app.config import get_settings
+from app.services.cache import TTLCache
+from app.services.circuit_breaker import CircuitBreaker
 
 logger = logging.getLogger(__name__)
 
+# Минимальный остаток подписки для продления через bulk/extend-expiration-date
+EXTEND_IN_PLACE_MIN_REMAINING = timedelta(hours=1)
+
 
 class RemnawaveError(Exception):
     """Ошибка при работе с Remnawave API"""
@@ -22,6 +31,17 @@ class RemnawaveError(Exception):
         self.response_data = response_data or {}
         super().__init__(self.message)
 
+    @property
+    def retryable(self) -> bool:
+        """Сетевая ошибка, 429 или 5xx - запрос можно повторить"""
+        return self.status_code == 0 or self.status_code == 429 or self.status_code >= 500
+
+
+class RemnawaveUnavailableError(RemnawaveError):
+    """Circuit breaker открыт - панель не опрашиваем до окончания паузы"""
+    def __init__(self):
+        super().__init__("Remnawave temporarily unavailable (circuit open)", status_code=503)
+
 
 class RemnawaveService:
     """Сервис для работы с Remnawave Panel API"""
@@ -33,6 +53,63 @@ class RemnawaveService:
             "Authorization": f"Bearer {self.settings.remnawave_api_token}",
             "Content-Type": "application/json",
         }
+        self._client: Optional[httpx.AsyncClient] = None
+        self.breaker = CircuitBreaker(
+            name="remnawave",
+            failure_threshold=self.settings.remnawave_circuit_failure_threshold,
+            recovery_seconds=self.settings.remnawave_circuit_recovery_seconds,
+        )
+        # Кеш записей пользователей панели по uuid
+        self.user_cache = TTLCache(
+            max_size=self.settings.remnawave_user_cache_max_size,
+            ttl_seconds=self.settings.remnawave_user_cache_ttl_seconds,
+        )
+
+    def _create_client(self) -> httpx.AsyncClient:
+        """Создать HTTP клиент с пулом keep-alive соединений"""
+        settings = self.settings
+        return httpx.AsyncClient(
+            base_url=self.base_url,
+            headers=self.headers,
+            http2=settings.remnawave_http2,
+            timeout=httpx.Timeout(
+                settings.remnawave_timeout_seconds,
+                connect=settings.remnawave_connect_timeout_seconds,
+            ),
+            limits=httpx.Limits(
+                max_connections=settings.remnawave_max_connections,
+                max_keepalive_connections=settings.remnawave_max_keepalive_connections,
+                keepalive_expiry=settings.remnawave_keepalive_expiry_seconds,
+            ),
+        )
+
+    async def start(self) -> None:
+        """
+        Открыть HTTP клиент.
+        Вызывается при старте приложения (lifespan FastAPI, start_bot).
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+            logger.info(
+                f"Remnawave HTTP client opened (http2={self.settings.remnawave_http2})"
+            )
+
+    async def close(self) -> None:
+        """Закрыть HTTP клиент и все соединения пула"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            logger.info("Remnawave HTTP client closed")
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """
+        HTTP клиент Remnawave.
+        Если start() не вызывался (скрипты, задачи) - создаётся лениво.
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+        return self._client
 
     async def _request(
         self,
@@ -40,36 +117,107 @@ class RemnawaveService:
         endpoint: str,
         json_data: dict = None,
         params: dict = None,
+        timeout: float = None,
     ) -> dict:
-        """Выполнить запрос к API"""
-        url = f"{self.base_url}{endpoint}"
-        
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        """
+        Выполнить запрос к API через общий пул соединений.
+
+        GET запросы (идемпотентные) повторяются при сетевых ошибках и 5xx
+        с экспоненциальной задержкой и jitter. Пока circuit breaker открыт,
+        запросы сразу завершаются RemnawaveUnavailableError.
+
+        Args:
+            timeout: Общий бюджет времени на запрос вместе с повторами и паузами
+                между ними (None = таймаут клиента на каждую попытку)
+        """
+        settings = self.settings
+        attempts = 1 + (settings.remnawave_retry_attempts if method == "GET" else 0)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+
+        for attempt in range(attempts):
+            remaining = deadline - time.monotonic() if deadline is not None else None
             try:
-                response = await client.request(
+                return await self._send(method, endpoint, json_data, params, remaining)
+            except RemnawaveUnavailableError:
+                raise
+            except RemnawaveError as e:
+                if not e.retryable or attempt == attempts - 1:
+                    raise
+                # Full jitter: случайная задержка от 0 до base * 2^attempt
+                delay = random.uniform(
+                    0,
+                    min(
+                        settings.remnawave_retry_max_delay_seconds,
+                        settings.remnawave_retry_base_delay_seconds * (2 ** attempt),
+                    ),
+                )
+                # Повтор не успеет уложиться в бюджет - отдаём ошибку сейчас
+                if deadline is not None and deadline - time.monotonic() - delay <= 0:
+                    raise
+                logger.warning(
+                    f"Remnawave {method} {endpoint} failed ({e}), "
+                    f"retry {attempt + 1}/{attempts - 1} in {delay:.2f}s"
+                )
+                await asyncio.sleep(delay)
+
+    async def _send(
+        self,
+        method: str,
+        endpoint: str,
+        json_data: Optional[dict],
+        params: Optional[dict],
+        timeout: Optional[float],
+    ) -> dict:
+        """
+        Один HTTP запрос с учётом circuit breaker.
+        timeout - оставшийся бюджет на весь запрос, а не на каждую операцию httpx.
+        """
+        if not self.breaker.allow_request():
+            raise RemnawaveUnavailableError()
+
+        try:
+            response = await asyncio.wait_for(
+                self.client.request(
                     method=method,
-                    url=url,
-                    headers=self.headers,
+                    url=endpoint,
                     json=json_data,
                     params=params,
-                )
-                
-                if response.status_code >= 400:
-                    error_data = response.json() if response.text else {}
-                    logger.error(
-                        f"Remnawave API error: {response.status_code} - {error_data}"
-                    )
-                    raise RemnawaveError(
-                        message=error_data.get("message", "Unknown error"),
-                        status_code=response.status_code,
-                        response_data=error_data,
-                    )
-                
-                return response.json()
-                
-            except httpx.RequestError as e:
-                logger.error(f"Remnawave connection error: {e}")
-                raise RemnawaveError(f"Connection error: {e}")
+                    timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT,
+                ),
+                timeout=timeout,
+            )
+        except (httpx.RequestError, asyncio.TimeoutError) as e:
+            self.breaker.record_failure()
+            logger.error(f"Remnawave connection error: {e!r}")
+            raise RemnawaveError(f"Connection error: {e!r}")
+        except BaseException:
+            # Запрос отменён (клиент отключился, остановка процесса) - исход неизвестен,
+            # но пробный запрос half-open освобождаем, иначе цепь не закроется никогда
+            self.breaker.release_probe()
+            raise
+
+        # 4xx - панель отвечает, это не сбой сервиса
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+        if response.status_code >= 400:
+            try:
+                error_data = response.json() if response.text else {}
+            except ValueError:
+                # Например, HTML страница от прокси при 502
+                error_data = {"message": response.text[:200]}
+            logger.error(
+                f"Remnawave API error: {response.status_code} - {error_data}"
+            )
+            raise RemnawaveError(
+                message=error_data.get("message", "Unknown error"),
+                status_code=response.status_code,
+                response_data=error_data,
+            )
+
+        return response.json()
 
     async def get_user_by_telegram_id(self, telegram_id: int) -> Optional[dict]:
         """
@@ -79,7 +227,8 @@ class RemnawaveService:
         try:
             result = await self._request(
                 "GET",
-                f"/api/users/by-telegram-id/{telegram_id}"
+                f"/api/users/by-telegram-id/{telegram_id}",
+                timeout=self.settings.remnawave_read_timeout_seconds,
             )
             # API возвращает массив пользователей
             users = result.get("response", [])
@@ -99,7 +248,8 @@ class RemnawaveService:
         try:
             result = await self._request(
                 "GET",
-                f"/api/users/by-username/{username}"
+                f"/api/users/by-username/{username}",
+                timeout=self.settings.remnawave_read_timeout_seconds,
             )
             return result.get("response")
         except RemnawaveError as e:
@@ -107,16 +257,51 @@ class RemnawaveService:
                 return None
             raise
 
-    async def get_user_by_uuid(self, uuid: str) -> Optional[dict]:
-        """Получить пользователя по UUID"""
+    async def get_user_by_uuid(self, uuid: str, use_cache: bool = True) -> Optional[dict]:
+        """
+        Получить пользователя по UUID.
+
+        По умолчанию читает из кеша (TTL remnawave_user_cache_ttl_seconds).
+        Параллельные запросы одного uuid разделяют один запрос к панели.
+        use_cache=False - всегда идти в панель (ответ всё равно обновляет кеш).
+        """
+        if not use_cache:
+            user = await self._fetch_user_by_uuid(uuid)
+            self._remember_user(user)
+            return user
+        return await self.user_cache.get_or_load(
+            uuid, lambda: self._fetch_user_by_uuid(uuid)
+        )
+
+    async def _fetch_user_by_uuid(self, uuid: str) -> Optional[dict]:
+        """Запросить пользователя по UUID из панели (без кеша)"""
         try:
-            result = await self._request("GET", f"/api/users/{uuid}")
+            result = await self._request(
+                "GET",
+                f"/api/users/{uuid}",
+                timeout=self.settings.remnawave_read_timeout_seconds,
+            )
             return result.get("response")
         except RemnawaveError as e:
             if e.status_code == 404:
+                self.user_cache.invalidate(uuid)
                 return None
             raise
 
+    def _remember_user(self, user: Optional[dict]) -> Optional[dict]:
+        """Обновить кеш записью из ответа панели (GET/POST/PATCH)"""
+        if user and user.get("uuid"):
+            self.user_cache.set(user["uuid"], user)
+        return user
+
+    def cache_stats(self) -> dict:
+        """Статистика кеша пользователей (hit/miss)"""
+        return self.user_cache.stats()
+
+    def circuit_stats(self) -> dict:
+        """Состояние circuit breaker"""
+        return self.breaker.stats()
+
     async def create_user(
         self,
         username: str,
@@ -161,7 +346,7 @@ class RemnawaveService:
         logger.info(f"Creating Remnawave user: {username}, telegram_id: {telegram_id}")
         
         result = await self._request("POST", "/api/users", json_data=payload)
-        return result.get("response")
+        return self._remember_user(result.get("response"))
 
     async def update_user_expiration(
         self,
@@ -175,25 +360,35 @@ class RemnawaveService:
         Если активна - добавляем к текущей дате истечения.
         Также назначает external squad если он настроен.
         При продлении также устанавливает лимит трафика если он не был установлен.
-        """
-        settings = self.settings
 
-        # Сначала получаем текущие данные пользователя
-        user = await self.get_user_by_uuid(uuid)
+        Запросы к панели:
+        - запись есть в кеше, подписка активна, лимит и сквады уже на месте -
+          один POST bulk/extend-expiration-date (дни добавляет сама панель)
+        - иначе - GET без кеша + PATCH
+
+        Абсолютный expireAt для PATCH считается только от свежей записи:
+        кеш может отставать на TTL (продление в другом процессе, правка админом
+        в панели), и PATCH от устаревшего expireAt стёр бы чужое продление.
+
+        Returns:
+            Запись панели после продления; {} если дни добавлены, но запись
+            перечитать не удалось (зеркало не обновлять)
+        """
+        # Кеш нужен только чтобы решить, подходит ли относительное продление.
+        # Относительное продление не идемпотентно: при таймауте или 5xx панель могла
+        # уже добавить дни, поэтому ошибка отдаётся вызывающему без повтора и без PATCH
+        cached = self.user_cache.get(uuid)
+        if cached is not None:
+            expire_dt = self.parse_expire_at(cached)
+            if self._can_extend_in_place(cached, expire_dt, days_to_add):
+                extended = await self._extend_in_place(uuid, days_to_add)
+                if extended is not None:
+                    return extended
+
+        user = await self.get_user_by_uuid(uuid, use_cache=False)
         if not user:
             raise RemnawaveError(f"User not found: {uuid}", status_code=404)
-
-        current_expire = user.get("expireAt")
-        if current_expire:
-            # Парсим текущую дату истечения
-            try:
-                expire_dt = datetime.fromisoformat(current_expire.replace("Z", "+00:00"))
-                # Убираем timezone для сравнения
-                expire_dt = expire_dt.replace(tzinfo=None)
-            except ValueError:
-                expire_dt = datetime.utcnow()
-        else:
-            expire_dt = datetime.utcnow()
+        expire_dt = self.parse_expire_at(user)
 
         # Если подписка уже истекла, отсчёт от сейчас
         now = datetime.utcnow()
@@ -202,7 +397,18 @@ class RemnawaveService:
 
         # Добавляем дни
         new_expire = expire_dt + timedelta(days=days_to_add)
+        logger.info(f"Extending subscription for {uuid}: +{days_to_add} days until {new_expire}")
+        return await self.set_user_expiration(uuid, new_expire, user)
 
+    async def set_user_expiration(self, uuid: str, new_expire: datetime, user: dict) -> dict:
+        """
+        Установить expireAt (naive UTC) одним PATCH, статус ACTIVE.
+
+        user - свежая запись панели: из неё сохраняются сквады и лимит трафика
+        (лимит ставится, если не был установлен). Повтор с тем же new_expire
+        ничего не добавляет - так продление по платежу можно безопасно повторить.
+        """
+        settings = self.settings
         payload = {
             "uuid": uuid,
             "expireAt": new_expire.isoformat() + "Z",
@@ -236,17 +442,104 @@ class RemnawaveService:
         if self.settings.remnawave_external_squad_id:
             payload["externalSquadUuid"] = self.settings.remnawave_external_squad_id
         
-        logger.info(f"Extending subscription for {uuid}: +{days_to_add} days until {new_expire}")
-        
         result = await self._request("PATCH", "/api/users", json_data=payload)
-        return result.get("response")
+        return self._remember_user(result.get("response"))
+
+    @staticmethod
+    def parse_expire_at(user: dict) -> datetime:
+        """expireAt записи панели (naive UTC), без даты - текущий момент"""
+        current_expire = user.get("expireAt")
+        if not current_expire:
+            return datetime.utcnow()
+        try:
+            expire_dt = datetime.fromisoformat(current_expire.replace("Z", "+00:00"))
+        except ValueError:
+            return datetime.utcnow()
+        # Убираем timezone для сравнения
+        return expire_dt.replace(tzinfo=None)
+
+    def _can_extend_in_place(self, user: dict, expire_dt: datetime, days_to_add: int) -> bool:
+        """
+        Можно ли продлить через bulk/extend-expiration-date без PATCH.
+
+        Относительное продление не меняет статус, лимит трафика и сквады,
+        поэтому подходит только когда менять их не нужно.
+        """
+        settings = self.settings
+        if not 1 <= days_to_add <= 9999:
+            return False
+        if user.get("status") != "ACTIVE":
+            return False
+        # Запас, чтобы подписка не истекла между чтением кеша и запросом
+        if expire_dt < datetime.utcnow() + EXTEND_IN_PLACE_MIN_REMAINING:
+            return False
+        if user.get("trafficLimitBytes", 0) == 0 and settings.remnawave_traffic_limit_bytes > 0:
+            return False
+        if not user.get("activeInternalSquads") and settings.remnawave_squad_id:
+            return False
+        if (
+            settings.remnawave_external_squad_id
+            and user.get("externalSquadUuid") != settings.remnawave_external_squad_id
+        ):
+            return False
+        return True
+
+    async def _extend_in_place(self, uuid: str, days_to_add: int) -> Optional[dict]:
+        """
+        Продлить одного пользователя через bulk/extend-expiration-date.
+
+        Returns:
+            Запись панели после продления; {} если дни добавлены, но запись
+            перечитать не удалось; None если панель не обновила пользователя
+        """
+        affected = await self.bulk_extend_expiration([uuid], days_to_add)
+        if affected != 1:
+            logger.warning(
+                f"bulk/extend-expiration-date affected {affected} rows for {uuid}, "
+                f"falling back to PATCH"
+            )
+            return None
+
+        # Ответ содержит только affectedRows, а кешированная запись могла отставать -
+        # expireAt для локального зеркала перечитываем из панели
+        self.user_cache.invalidate(uuid)
+        try:
+            extended = await self.get_user_by_uuid(uuid, use_cache=False)
+        except RemnawaveError as e:
+            # Дни уже добавлены: ошибку не отдаём, иначе вызывающий продлил бы снова.
+            # Зеркало уточнит sync_remnawave
+            logger.warning(f"Extended {uuid} by {days_to_add} days, but failed to re-read it: {e}")
+            return {}
+
+        if not extended:
+            return {}
+        logger.info(f"Extended subscription for {uuid}: +{days_to_add} days until {extended.get('expireAt')}")
+        return extended
+
+    async def bulk_extend_expiration(self, uuids: list[str], extend_days: int) -> int:
+        """
+        Продлить подписку нескольким пользователям (до 500 за запрос).
+        Дни добавляются к текущему expireAt на стороне панели.
+
+        Запрос не идемпотентен и не повторяется (_request повторяет только GET):
+        после таймаута или 5xx дни могли быть уже добавлены, повтор добавил бы их дважды.
+
+        Returns:
+            Количество обновлённых пользователей (affectedRows)
+        """
+        result = await self._request(
+            "POST",
+            "/api/users/bulk/extend-expiration-date",
+            json_data={"uuids": uuids, "extendDays": extend_days},
+        )
+        return int(result.get("response", {}).get("affectedRows", 0))
 
     async def update_user_squads(self, uuid: str) -> dict:
         """
         Обновить сквады пользователя (internal и external).
         Используется для назначения external squad существующим пользователям.
         """
-        user = await self.get_user_by_uuid(uuid)
+        user = await self.get_user_by_uuid(uuid, use_cache=False)
         if not user:
             raise RemnawaveError(f"User not found: {uuid}", status_code=404)
         
@@ -276,7 +569,7 @@ class RemnawaveService:
         logger.info(f"Updating squads for user {uuid}")
         
         result = await self._request("PATCH", "/api/users", json_data=payload)
-        return result.get("response")
+        return self._remember_user(result.get("response"))
 
     async def get_user_traffic(self, uuid: str) -> dict:
         """Получить информацию о трафике пользователя"""
@@ -315,7 +608,7 @@ class RemnawaveService:
         logger.info(f"Updating traffic limit for {uuid}: {payload['trafficLimitBytes']} bytes")
 
         result = await self._request("PATCH", "/api/users", json_data=payload)
-        return result.get("response")
+        return self._remember_user(result.get("response"))
 
     async def get_all_users(self, start: int = 0, size: int = 100) -> list:
         """
@@ -335,15 +628,68 @@ class RemnawaveService:
         )
         return result.get("response", {}).get("users", [])
 
+    async def iter_all_users(
+        self,
+        page_size: int = 500,
+        prefetch: int = 2,
+        username_prefix: Optional[str] = None,
+    ) -> AsyncIterator[dict]:
+        """
+        Лениво перебрать всех пользователей панели.
+
+        Следующие страницы запрашиваются в фоне, пока вызывающий код
+        обрабатывает текущую. В памяти не больше prefetch + 1 страниц.
+
+        Args:
+            page_size: Размер страницы GET /api/users
+            prefetch: Сколько страниц загружать наперёд (минимум 1)
+            username_prefix: Отдавать только пользователей с таким префиксом username
+
+        Raises:
+            RemnawaveError: если не удалось загрузить очередную страницу
+        """
+        pages: asyncio.Queue = asyncio.Queue(maxsize=max(prefetch, 1))
+
+        async def fetch_pages() -> None:
+            start = 0
+            try:
+                while True:
+                    page = await self.get_all_users(start=start, size=page_size)
+                    await pages.put(page)
+                    if len(page) < page_size:
+                        break
+                    start += page_size
+            except Exception as e:
+                await pages.put(e)
+                return
+            await pages.put(None)
+
+        fetcher = asyncio.create_task(fetch_pages())
+        try:
+            while True:
+                page = await pages.get()
+                if page is None:
+                    break
+                if isinstance(page, Exception):
+                    raise page
+                for user in page:
+                    if username_prefix and not (user.get("username") or "").startswith(username_prefix):
+                        continue
+                    yield user
+        finally:
+            fetcher.cancel()
+            with suppress(asyncio.CancelledError):
+                await fetcher
+
     async def disable_user(self, uuid: str) -> dict:
         """Отключить пользователя"""
         result = await self._request("POST", f"/api/users/{uuid}/disable")
-        return result.get("response")
+        return self._remember_user(result.get("response"))
 
     async def enable_user(self, uuid: str) -> dict:
         """Включить пользователя"""
         result = await self._request("POST", f"/api/users/{uuid}/enable")
-        return result.get("response")
+        return self._remember_user(result.get("response"))
 
 
 # Singleton instance
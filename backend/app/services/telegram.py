@@ -1,120 +1,188 @@
 """
 Валидация Telegram Web App initData.
 https://core.telegram.org/bots/webapps#validating-data-received-via-the-mini-app
+
+Фронтенд шлёт одну и ту же строку initData на каждый запрос сессии,
+поэтому результат проверки кешируется по sha256(initData) до auth_date + max_age.
 """
 
 import hashlib
 import hmac
 import json
 import logging
+import time
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional
 from urllib.parse import parse_qs, unquote
 
 from app.config import get_settings
-from app.schemas.user import UserFromTelegram
+from app.schemas.user import TelegramUser
+from app.services.cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# Максимальный возраст initData по умолчанию (24 часа)
+INIT_DATA_MAX_AGE_SECONDS = 86400
+
+_init_data_cache: Optional[TTLCache] = None
+
+
+@lru_cache
+def _webapp_secret_key(bot_token: str) -> bytes:
+    """secret_key = HMAC_SHA256(bot_token, "WebAppData") - считается один раз на токен"""
+    return hmac.new(
+        b"WebAppData",
+        bot_token.encode(),
+        hashlib.sha256
+    ).digest()
+
+
+def _check_parsed_init_data(parsed: dict[str, list[str]], max_age_seconds: int) -> bool:
+    """Проверка подписи и возраста уже распарсенной initData"""
+    # Получаем hash
+    received_hash = parsed.get("hash", [None])[0]
+    if not received_hash:
+        logger.warning("No hash in initData")
+        return False
+
+    # Проверяем auth_date (время создания данных)
+    auth_date_str = parsed.get("auth_date", [None])[0]
+    if auth_date_str:
+        auth_date = datetime.fromtimestamp(int(auth_date_str))
+        if datetime.now() - auth_date > timedelta(seconds=max_age_seconds):
+            logger.warning(f"initData expired: {auth_date}")
+            return False
+
+    # Формируем строку для проверки (все параметры кроме hash, отсортированные)
+    data_check_items = []
+    for key, values in sorted(parsed.items()):
+        if key != "hash":
+            data_check_items.append(f"{key}={values[0]}")
+
+    data_check_string = "\n".join(data_check_items)
+
+    # Вычисляем hash
+    calculated_hash = hmac.new(
+        _webapp_secret_key(get_settings().telegram_bot_token),
+        data_check_string.encode(),
+        hashlib.sha256
+    ).hexdigest()
+
+    # Сравниваем
+    is_valid = hmac.compare_digest(calculated_hash, received_hash)
 
-def validate_init_data(init_data: str, max_age_seconds: int = 86400) -> bool:
+    if not is_valid:
+        logger.warning("initData hash mismatch")
+
+    return is_valid
+
+
+def _user_from_parsed_init_data(parsed: dict[str, list[str]]) -> Optional[TelegramUser]:
+    """Пользователь из уже распарсенной initData"""
+    user_json = parsed.get("user", [None])[0]
+
+    if not user_json:
+        logger.warning("No user in initData")
+        return None
+
+    # user приходит как URL-encoded JSON
+    user_data = json.loads(unquote(user_json))
+
+    return TelegramUser(
+        id=user_data.get("id"),
+        first_name=user_data.get("first_name"),
+        last_name=user_data.get("last_name"),
+        username=user_data.get("username"),
+        language_code=user_data.get("language_code"),
+        is_premium=user_data.get("is_premium"),
+    )
+
+
+def validate_init_data(init_data: str, max_age_seconds: int = INIT_DATA_MAX_AGE_SECONDS) -> bool:
     """
     Валидация initData от Telegram Web App.
-    
+
     Args:
         init_data: Строка initData от Telegram
         max_age_seconds: Максимальный возраст данных (по умолчанию 24 часа)
-    
+
     Returns:
         True если данные валидны
     """
-    settings = get_settings()
-    bot_token = settings.telegram_bot_token
-    
     try:
-        # Парсим данные
-        parsed = parse_qs(init_data)
-        
-        # Получаем hash
-        received_hash = parsed.get("hash", [None])[0]
-        if not received_hash:
-            logger.warning("No hash in initData")
-            return False
-        
-        # Проверяем auth_date (время создания данных)
-        auth_date_str = parsed.get("auth_date", [None])[0]
-        if auth_date_str:
-            auth_date = datetime.fromtimestamp(int(auth_date_str))
-            if datetime.now() - auth_date > timedelta(seconds=max_age_seconds):
-                logger.warning(f"initData expired: {auth_date}")
-                return False
-        
-        # Формируем строку для проверки (все параметры кроме hash, отсортированные)
-        data_check_items = []
-        for key, values in sorted(parsed.items()):
-            if key != "hash":
-                data_check_items.append(f"{key}={values[0]}")
-        
-        data_check_string = "\n".join(data_check_items)
-        
-        # Создаём secret_key = HMAC_SHA256(bot_token, "WebAppData")
-        secret_key = hmac.new(
-            b"WebAppData",
-            bot_token.encode(),
-            hashlib.sha256
-        ).digest()
-        
-        # Вычисляем hash
-        calculated_hash = hmac.new(
-            secret_key,
-            data_check_string.encode(),
-            hashlib.sha256
-        ).hexdigest()
-        
-        # Сравниваем
-        is_valid = hmac.compare_digest(calculated_hash, received_hash)
-        
-        if not is_valid:
-            logger.warning("initData hash mismatch")
-        
-        return is_valid
-        
+        return _check_parsed_init_data(parse_qs(init_data), max_age_seconds)
     except Exception as e:
         logger.error(f"Error validating initData: {e}")
         return False
 
 
-def parse_user_from_init_data(init_data: str) -> Optional[UserFromTelegram]:
+def parse_user_from_init_data(init_data: str) -> Optional[TelegramUser]:
     """
     Извлечь данные пользователя из initData.
-    
+
     Args:
         init_data: Строка initData от Telegram
-    
+
     Returns:
-        UserFromTelegram или None если не удалось распарсить
+        TelegramUser или None если не удалось распарсить
     """
+    try:
+        return _user_from_parsed_init_data(parse_qs(init_data))
+    except Exception as e:
+        logger.error(f"Error parsing user from initData: {e}")
+        return None
+
+
+def get_init_data_cache() -> TTLCache:
+    """Кеш проверенных initData (sha256 -> TelegramUser)"""
+    global _init_data_cache
+    if _init_data_cache is None:
+        _init_data_cache = TTLCache(
+            max_size=get_settings().telegram_init_data_cache_size,
+            ttl_seconds=INIT_DATA_MAX_AGE_SECONDS,
+        )
+    return _init_data_cache
+
+
+def authenticate_init_data(
+    init_data: str,
+    max_age_seconds: int = INIT_DATA_MAX_AGE_SECONDS,
+) -> Optional[TelegramUser]:
+    """
+    Проверить initData и получить пользователя.
+
+    Повторные запросы с той же строкой берутся из кеша без HMAC, парсинга
+    и сборки модели. Запись живёт до auth_date + max_age_seconds.
+    Неудачные проверки не кешируются.
+
+    Returns:
+        TelegramUser или None если данные невалидны
+    """
+    cache = get_init_data_cache()
+    cache_key = hashlib.sha256(init_data.encode()).digest()
+
+    user = cache.get(cache_key)
+    if user is not None:
+        return user
+
     try:
         parsed = parse_qs(init_data)
-        user_json = parsed.get("user", [None])[0]
-        
-        if not user_json:
-            logger.warning("No user in initData")
+        if not _check_parsed_init_data(parsed, max_age_seconds):
             return None
-        
-        # user приходит как URL-encoded JSON
-        user_data = json.loads(unquote(user_json))
-        
-        return UserFromTelegram(
-            id=user_data.get("id"),
-            first_name=user_data.get("first_name"),
-            last_name=user_data.get("last_name"),
-            username=user_data.get("username"),
-            language_code=user_data.get("language_code"),
-            is_premium=user_data.get("is_premium"),
-        )
-        
+        user = _user_from_parsed_init_data(parsed)
     except Exception as e:
-        logger.error(f"Error parsing user from initData: {e}")
+        logger.error(f"Error validating initData: {e}")
         return None
 
+    if user is None:
+        return None
+
+    # Без auth_date срок жизни неизвестен - не кешируем
+    auth_date_str = parsed.get("auth_date", [None])[0]
+    if auth_date_str:
+        ttl = int(auth_date_str) + max_age_seconds - time.time()
+        if ttl > 0:
+            cache.set(cache_key, user, ttl_seconds=ttl)
+
+    return user
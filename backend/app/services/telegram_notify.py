@@ -4,31 +4,41 @@
 """
 
 import logging
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 import httpx
 
 from app.config import get_settings
 
+if TYPE_CHECKING:
+    from app.services.telegram_sender import TelegramSender
+
 logger = logging.getLogger(__name__)
 
 TELEGRAM_API_URL = "https://api.telegram.org/bot{token}/sendMessage"
 
 
-async def _send_telegram_message(
+class TelegramFloodError(Exception):
+    """429 от Bot API: повторять не раньше чем через retry_after секунд"""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(f"Flood control, retry after {retry_after}s")
+
+
+async def post_telegram_message(
+    client: httpx.AsyncClient,
     telegram_id: int,
     text: str,
     keyboard: Optional[dict] = None,
 ) -> bool:
     """
-    Базовая функция отправки сообщения в Telegram.
-
-    Args:
-        telegram_id: Telegram ID пользователя
-        text: Текст сообщения (HTML)
-        keyboard: Inline клавиатура (опционально)
+    Один запрос sendMessage через переданный клиент.
 
     Returns:
         True если сообщение отправлено успешно
+
+    Raises:
+        TelegramFloodError: Bot API ответил 429
     """
     settings = get_settings()
     url = TELEGRAM_API_URL.format(token=settings.telegram_bot_token)
@@ -42,15 +52,45 @@ async def _send_telegram_message(
     if keyboard:
         payload["reply_markup"] = keyboard
 
+    response = await client.post(url, json=payload, timeout=10.0)
+
+    if response.status_code == 200:
+        return True
+    if response.status_code == 429:
+        try:
+            retry_after = response.json().get("parameters", {}).get("retry_after", 1)
+        except ValueError:
+            retry_after = 1
+        raise TelegramFloodError(float(retry_after))
+
+    logger.error(f"Failed to send message to {telegram_id}: {response.text}")
+    return False
+
+
+async def _send_telegram_message(
+    telegram_id: int,
+    text: str,
+    keyboard: Optional[dict] = None,
+    sender: Optional["TelegramSender"] = None,
+) -> bool:
+    """
+    Базовая функция отправки сообщения в Telegram.
+
+    Args:
+        telegram_id: Telegram ID пользователя
+        text: Текст сообщения (HTML)
+        keyboard: Inline клавиатура (опционально)
+        sender: Отправитель массовой рассылки (общий клиент и лимиты Bot API)
+
+    Returns:
+        True если сообщение отправлено успешно
+    """
+    if sender is not None:
+        return await sender.send(telegram_id, text, keyboard)
+
     try:
         async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=payload, timeout=10.0)
-
-            if response.status_code == 200:
-                return True
-            else:
-                logger.error(f"Failed to send message to {telegram_id}: {response.text}")
-                return False
+            return await post_telegram_message(client, telegram_id, text, keyboard)
 
     except Exception as e:
         logger.error(f"Error sending message to {telegram_id}: {e}")
@@ -101,6 +141,7 @@ async def send_expiration_warning(
     hours_left: int,
     has_auto_renew: bool = False,
     card_last4: Optional[str] = None,
+    sender: Optional["TelegramSender"] = None,
 ) -> bool:
     """
     Отправить уведомление об истечении подписки.
@@ -110,6 +151,7 @@ async def send_expiration_warning(
         hours_left: Часов до истечения
         has_auto_renew: Включено ли автопродление
         card_last4: Последние 4 цифры карты (если есть)
+        sender: Отправитель массовой рассылки (scheduler)
 
     Returns:
         True если сообщение отправлено успешно
@@ -134,7 +176,7 @@ async def send_expiration_warning(
             "💡 Продлите подписку сейчас, чтобы не потерять доступ к VPN."
         )
 
-    result = await _send_telegram_message(telegram_id, message, _get_app_keyboard())
+    result = await _send_telegram_message(telegram_id, message, _get_app_keyboard(), sender)
     if result:
         logger.info(f"Expiration warning sent to {telegram_id}, hours_left={hours_left}")
     return result
@@ -0,0 +1,123 @@
+"""
+Массовая отправка сообщений через Bot API с учётом лимитов Telegram.
+
+Bot API допускает порядка 30 сообщений в секунду на бота и около одного
+в секунду в один чат. TelegramSender держит не больше telegram_send_concurrency
+запросов в полёте, общий token bucket на telegram_send_rate_per_second и
+интервал между сообщениями в один чат. На 429 вся отправка ставится на паузу
+на retry_after из ответа, сообщение повторяется (до telegram_send_max_attempts).
+
+Используется задачами scheduler на время одной рассылки:
+
+    async with TelegramSender() as sender:
+        await send_expiration_warning(..., sender=sender)
+"""
+
+import asyncio
+import logging
+import time
+from typing import Optional
+
+import httpx
+
+from app.config import get_settings
+from app.services.telegram_notify import TelegramFloodError, post_telegram_message
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Token bucket: rate токенов в секунду, не больше capacity подряд.
+    Ожидающие получают токены по очереди (один event loop).
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Не выдавать токены seconds секунд (после паузы - без накопленного запаса)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+        self._updated_at = self._paused_until
+
+
+class TelegramSender:
+    """Отправитель одной рассылки: общий HTTP клиент, лимиты и повтор на 429"""
+
+    def __init__(self):
+        settings = get_settings()
+        self.max_attempts = settings.telegram_send_max_attempts
+        self.chat_interval = settings.telegram_send_chat_interval_seconds
+        # Без запаса на всплеск: всплеск поверх ровного потока и даёт 429
+        self._bucket = TokenBucket(rate=settings.telegram_send_rate_per_second, capacity=1)
+        self._in_flight = asyncio.Semaphore(settings.telegram_send_concurrency)
+        # chat_id -> когда можно отправить следующее сообщение в этот чат
+        self._chat_next_at: dict[int, float] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+        self.flood_waits = 0
+
+    async def __aenter__(self) -> "TelegramSender":
+        concurrency = get_settings().telegram_send_concurrency
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        )
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self._client.aclose()
+        self._client = None
+
+    async def _wait_for_chat(self, telegram_id: int) -> None:
+        now = time.monotonic()
+        next_at = self._chat_next_at.get(telegram_id, now)
+        self._chat_next_at[telegram_id] = max(next_at, now) + self.chat_interval
+        if next_at > now:
+            await asyncio.sleep(next_at - now)
+
+    async def send(self, telegram_id: int, text: str, keyboard: Optional[dict] = None) -> bool:
+        """
+        Отправить сообщение с соблюдением лимитов.
+
+        Returns:
+            True если сообщение отправлено успешно
+        """
+        async with self._in_flight:
+            await self._wait_for_chat(telegram_id)
+
+            for attempt in range(self.max_attempts):
+                await self._bucket.acquire()
+                try:
+                    return await post_telegram_message(self._client, telegram_id, text, keyboard)
+                except TelegramFloodError as e:
+                    self.flood_waits += 1
+                    self._bucket.pause(e.retry_after)
+                    logger.warning(
+                        f"Telegram flood control on {telegram_id}, pausing sends for {e.retry_after}s "
+                        f"(attempt {attempt + 1}/{self.max_attempts})"
+                    )
+                except Exception as e:
+                    logger.error(f"Error sending message to {telegram_id}: {e}")
+                    return False
+
+            return False
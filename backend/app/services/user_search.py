@@ -0,0 +1,115 @@
+"""
+Поиск пользователей для админки: "@username", имя, реферальный код или telegram id.
+
+Число - сначала точный поиск по telegram_id (уникальный индекс).
+Текст - префиксный поиск по словам: в SQLite через FTS5 (users_fts),
+в PostgreSQL и в SQLite до миграции add_users_fts - ILIKE по началу значений
+тех же колонок (без FTS, последовательный просмотр).
+"""
+
+import logging
+import re
+
+from sqlalchemy import and_, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import is_sqlite
+from app.models.user import User
+from app.models.user_fts import USERS_FTS_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+# Слова запроса - так же, как их режет токенизатор unicode61 ("_" и "@" - разделители)
+_TERM_RE = re.compile(r"[^\W_]+")
+
+# ORDER BY rowid, а не rank: bm25 считается для всех совпадений, и частый префикс
+# ("user", "ив") стоит сотни миллисекунд, а обход по rowid останавливается на LIMIT
+_FTS_QUERY = text(
+    "SELECT rowid FROM users_fts WHERE users_fts MATCH :match ORDER BY rowid DESC LIMIT :limit"
+)
+
+
+# users_fts найдена (для существующей БД появляется после migrations/add_users_fts)
+_fts_ready = False
+
+
+async def _has_fts_index(db: AsyncSession) -> bool:
+    """Есть ли users_fts; пока миграция не выполнена - поиск через LIKE с предупреждением"""
+    global _fts_ready
+    if _fts_ready:
+        return True
+    found = (await db.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users_fts'")
+    )).scalar_one_or_none()
+    if found:
+        _fts_ready = True
+    else:
+        logger.warning("users_fts not found, run migrations.add_users_fts - searching users with LIKE")
+    return _fts_ready
+
+
+def _fts_match(phrases: list[list[str]], prefix: bool) -> str:
+    """
+    Выражение MATCH: каждое слово запроса - фраза из его частей ("user_12" -> "user 12"),
+    все фразы через AND. prefix - последняя часть фразы как префикс.
+    """
+    star = "*" if prefix else ""
+    return " AND ".join('"' + " ".join(terms) + '"' + star for terms in phrases)
+
+
+def _like_prefix(term: str) -> str:
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{escaped}%"
+
+
+async def search_users(db: AsyncSession, query: str, limit: int = 20) -> list[User]:
+    """
+    Найти пользователей по строке запроса.
+
+    Returns:
+        Пользователи в порядке релевантности (не больше limit)
+    """
+    query = query.strip().lstrip("@")
+
+    if query.isdigit():
+        user = (await db.execute(
+            select(User).where(User.telegram_id == int(query))
+        )).scalar_one_or_none()
+        if user:
+            return [user]
+
+    # Кавычки и операторы FTS5 в части слов не попадают
+    phrases = [terms for terms in (_TERM_RE.findall(word) for word in query.split()) if terms]
+    if not phrases:
+        return []
+
+    if is_sqlite and await _has_fts_index(db):
+        # Сначала точные совпадения слов, затем по префиксу; внутри - новые пользователи первыми
+        ids: list[int] = []
+        for prefix in (False, True):
+            found = (await db.execute(
+                _FTS_QUERY, {"match": _fts_match(phrases, prefix), "limit": limit}
+            )).scalars().all()
+            for user_id in found:
+                if user_id not in ids:
+                    ids.append(user_id)
+            if len(ids) >= limit:
+                break
+        ids = ids[:limit]
+        if not ids:
+            return []
+        users = (await db.execute(select(User).where(User.id.in_(ids)))).scalars().all()
+        by_id = {user.id: user for user in users}
+        return [by_id[user_id] for user_id in ids if user_id in by_id]
+
+    # ILIKE сравнивает с началом значения - слово целиком ("user_12"), а не по частям.
+    # В SQLite без users_fts - LIKE (регистронезависим только для ASCII)
+    columns = [getattr(User, column) for column in USERS_FTS_COLUMNS]
+    conditions = [
+        or_(*(column.ilike(_like_prefix(word), escape="\\") for column in columns))
+        for word in query.split()
+    ]
+    result = await db.execute(
+        select(User).where(and_(*conditions)).order_by(User.id.desc()).limit(limit)
+    )
+    return list(result.scalars().all())
@@ -1,12 +1,18 @@
 """
 Сервис для работы с YooKassa.
+
+Запросы идут напрямую в API v3 через общий httpx.AsyncClient (синхронный SDK
+блокировал event loop на всё время запроса). Ответы оборачиваются в
+PaymentResponse из SDK, поэтому вызывающий код работает с теми же объектами.
 """
 
+import asyncio
 import logging
 import uuid
+from datetime import datetime
 from typing import Optional
 
-from yookassa import Configuration, Payment as YKPayment
+import httpx
 from yookassa.domain.response import PaymentResponse as YKPaymentResponse
 
 from app.config import get_settings, get_tariff_by_id
@@ -14,14 +20,142 @@ from app.config import get_settings, get_tariff_by_id
 logger = logging.getLogger(__name__)
 
 
+class YooKassaError(Exception):
+    """Ошибка при работе с YooKassa API"""
+    def __init__(self, message: str, status_code: int = 0, response_data: dict = None):
+        self.message = message
+        self.status_code = status_code
+        self.response_data = response_data or {}
+        super().__init__(self.message)
+
+    @property
+    def retryable(self) -> bool:
+        """Сетевая ошибка, 429 или 5xx - запрос можно повторить с тем же ключом идемпотентности"""
+        return self.status_code == 0 or self.status_code == 429 or self.status_code >= 500
+
+
 class YooKassaService:
     """Сервис для работы с YooKassa API"""
 
     def __init__(self):
-        settings = get_settings()
-        Configuration.account_id = settings.yookassa_shop_id
-        Configuration.secret_key = settings.yookassa_secret_key
-        self.return_url = settings.yookassa_return_url
+        self.settings = get_settings()
+        self.base_url = self.settings.yookassa_api_url.rstrip("/")
+        self.return_url = self.settings.yookassa_return_url
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _create_client(self) -> httpx.AsyncClient:
+        """Создать HTTP клиент с пулом keep-alive соединений"""
+        settings = self.settings
+        return httpx.AsyncClient(
+            base_url=self.base_url,
+            auth=(settings.yookassa_shop_id, settings.yookassa_secret_key),
+            headers={"Content-Type": "application/json"},
+            timeout=httpx.Timeout(
+                settings.yookassa_timeout_seconds,
+                connect=settings.yookassa_connect_timeout_seconds,
+            ),
+            limits=httpx.Limits(
+                max_connections=settings.yookassa_max_connections,
+                max_keepalive_connections=settings.yookassa_max_connections,
+            ),
+        )
+
+    async def start(self) -> None:
+        """
+        Открыть HTTP клиент.
+        Вызывается при старте приложения (lifespan FastAPI, start_bot).
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+            logger.info("YooKassa HTTP client opened")
+
+    async def close(self) -> None:
+        """Закрыть HTTP клиент и все соединения пула"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            logger.info("YooKassa HTTP client closed")
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """
+        HTTP клиент YooKassa.
+        Если start() не вызывался (скрипты, задачи) - создаётся лениво.
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+        return self._client
+
+    async def _request(
+        self,
+        method: str,
+        endpoint: str,
+        json_data: dict = None,
+        idempotence_key: Optional[str] = None,
+        params: Optional[dict] = None,
+    ) -> dict:
+        """
+        Выполнить запрос к API YooKassa.
+
+        POST запросы отправляются с заголовком Idempotence-Key. Все попытки
+        (202 "ещё обрабатывается", сетевые ошибки, 429, 5xx) повторяются с тем же
+        ключом, поэтому повтор не создаст второй платёж.
+        """
+        headers = {}
+        if idempotence_key:
+            headers["Idempotence-Key"] = idempotence_key
+
+        attempts = max(1, self.settings.yookassa_max_attempts)
+        for attempt in range(attempts):
+            last_attempt = attempt == attempts - 1
+            try:
+                response = await self.client.request(
+                    method=method,
+                    url=endpoint,
+                    json=json_data,
+                    params=params,
+                    headers=headers,
+                )
+            except httpx.RequestError as e:
+                if last_attempt:
+                    raise YooKassaError(f"Connection error: {e!r}")
+                delay = self.settings.yookassa_retry_delay_seconds * (2 ** attempt)
+                logger.warning(f"YooKassa {method} {endpoint} failed ({e!r}), retry in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            try:
+                data = response.json() if response.content else {}
+            except ValueError:
+                data = {"description": response.text[:200]}
+
+            if response.status_code == 200:
+                return data
+
+            # 202 - запрос принят, но ещё обрабатывается: повторить через retry_after мс
+            if response.status_code == 202 and not last_attempt:
+                delay = data.get("retry_after", 1000) / 1000
+                logger.info(f"YooKassa {method} {endpoint} processing, retry in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            error = YooKassaError(
+                message=data.get("description") or data.get("code") or "Unknown error",
+                status_code=response.status_code,
+                response_data=data,
+            )
+            if error.retryable and not last_attempt:
+                delay = self.settings.yookassa_retry_delay_seconds * (2 ** attempt)
+                logger.warning(
+                    f"YooKassa {method} {endpoint} error {response.status_code}, retry in {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+                continue
+
+            logger.error(f"YooKassa API error: {response.status_code} - {data}")
+            raise error
+
+        raise YooKassaError(f"YooKassa {method} {endpoint}: attempts exhausted", status_code=202)
 
     def _build_description(
         self,
@@ -91,7 +225,7 @@ class YooKassaService:
                 return f"Авто | {telegram_id}"
             return f"{tariff_name} | {telegram_id}"
 
-    def create_payment(
+    async def create_payment(
         self,
         tariff_id: str,
         telegram_id: int,
@@ -163,7 +297,9 @@ class YooKassaService:
                 payment_data["save_payment_method"] = True
                 payment_data["merchant_customer_id"] = str(telegram_id)
 
-            payment = YKPayment.create(payment_data, uuid.uuid4())
+            payment = YKPaymentResponse(await self._request(
+                "POST", "/payments", payment_data, idempotence_key=str(uuid.uuid4())
+            ))
 
             logger.info(
                 f"Created YooKassa payment: {payment.id} for user {telegram_id}, "
@@ -176,7 +312,7 @@ class YooKassaService:
             logger.error(f"Error creating YooKassa payment: {e}")
             return None
 
-    def create_auto_payment(
+    async def create_auto_payment(
         self,
         payment_method_id: str,
         amount: int,
@@ -211,7 +347,7 @@ class YooKassaService:
                 is_auto=True,
             )
 
-            payment = YKPayment.create({
+            payment_data = {
                 "amount": {
                     "value": str(amount) + ".00",
                     "currency": "RUB"
@@ -226,7 +362,10 @@ class YooKassaService:
                     "days": str(days),
                     "is_auto_payment": "true",
                 }
-            }, uuid.uuid4())
+            }
+            payment = YKPaymentResponse(await self._request(
+                "POST", "/payments", payment_data, idempotence_key=str(uuid.uuid4())
+            ))
 
             logger.info(
                 f"Created auto-payment: {payment.id} for user {telegram_id}, "
@@ -239,14 +378,50 @@ class YooKassaService:
             logger.error(f"Error creating auto-payment for user {telegram_id}: {e}")
             return None
 
-    def get_payment(self, payment_id: str) -> Optional[YKPaymentResponse]:
+    async def get_payment_object(self, payment_id: str) -> dict:
+        """
+        Объект платежа из API (GET /payments/{id}).
+
+        Raises:
+            YooKassaError: ошибка API (404 - платежа нет в магазине)
+        """
+        return await self._request("GET", f"/payments/{payment_id}")
+
+    async def get_payment(self, payment_id: str) -> Optional[YKPaymentResponse]:
         """Получить информацию о платеже"""
         try:
-            return YKPayment.find_one(payment_id)
+            return YKPaymentResponse(await self.get_payment_object(payment_id))
         except Exception as e:
             logger.error(f"Error getting YooKassa payment {payment_id}: {e}")
             return None
 
+    async def list_payments(
+        self,
+        created_at_gte: datetime,
+        created_at_lt: datetime,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+    ) -> tuple[list[dict], Optional[str]]:
+        """
+        Страница списка платежей за интервал created_at (время UTC).
+
+        Returns:
+            (объекты платежей, next_cursor или None если страница последняя)
+
+        Raises:
+            YooKassaError: ошибка API
+        """
+        params = {
+            "created_at.gte": created_at_gte.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            "created_at.lt": created_at_lt.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            "limit": min(max(limit, 1), 100),
+        }
+        if cursor:
+            params["cursor"] = cursor
+
+        data = await self._request("GET", "/payments", params=params)
+        return data.get("items", []), data.get("next_cursor")
+
     def is_payment_succeeded(self, payment: YKPaymentResponse) -> bool:
         """Проверить, успешен ли платёж"""
         return payment.status == "succeeded" and payment.paid
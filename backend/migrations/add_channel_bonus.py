@@ -16,21 +16,18 @@ from pathlib import Path
 backend_dir = Path(__file__).parent.parent
 sys.path.insert(0, str(backend_dir))
 
-from sqlalchemy import text
+from sqlalchemy import inspect, text
 from app.database import engine
 from app.config import get_settings
 
 
 async def add_column_if_not_exists(conn, table: str, column: str, column_type: str):
     """Добавить колонку если её нет"""
-    result = await conn.execute(text(f"""
-        SELECT COUNT(*) as cnt
-        FROM pragma_table_info('{table}')
-        WHERE name='{column}'
-    """))
-    row = result.fetchone()
+    columns = await conn.run_sync(
+        lambda sync_conn: [c["name"] for c in inspect(sync_conn).get_columns(table)]
+    )
 
-    if row and row[0] > 0:
+    if column in columns:
         print(f"  ✓ Column '{table}.{column}' already exists, skipping")
         return False
 
@@ -56,7 +53,7 @@ async def run_migration():
 
             await add_column_if_not_exists(
                 conn, "users", "channel_bonus_received_at",
-                "DATETIME NULL"
+                "TIMESTAMP NULL"
             )
 
             print()
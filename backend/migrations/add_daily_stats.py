@@ -0,0 +1,54 @@
+"""
+Миграция: дневная сводка для графиков админки
+
+- Таблица daily_stats (показатели по МСК-дням, заполняется задачей scheduler)
+- Индекс ix_payments_auto_status_created (status, created_at) WHERE is_auto_payment = 1 -
+  неудачные автоплатежи за день
+
+Запуск:
+    python -m migrations.add_daily_stats
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию в путь
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from sqlalchemy import text
+from app.database import engine
+from app.config import get_settings
+from app.models.daily_stats import DailyStats
+
+
+async def run_migration():
+    """Выполняет миграцию"""
+    settings = get_settings()
+    print(f"Running migration: add_daily_stats")
+    print(f"Database: {settings.database_url}")
+    print()
+
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(lambda sync_conn: DailyStats.__table__.create(sync_conn, checkfirst=True))
+            print("  ✓ Table 'daily_stats' ready")
+
+            true_literal = "TRUE" if conn.dialect.name == "postgresql" else "1"
+            await conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_payments_auto_status_created "
+                f"ON payments (status, created_at) WHERE is_auto_payment = {true_literal}"
+            ))
+            print("  ✓ Index 'ix_payments_auto_status_created' ready")
+            print()
+
+            print("Migration completed successfully!")
+
+    except Exception as e:
+        print(f"✗ Migration failed: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    asyncio.run(run_migration())
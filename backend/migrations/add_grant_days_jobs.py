@@ -0,0 +1,44 @@
+"""
+Миграция: задачи массового начисления дней хранятся в БД
+
+- Таблица grant_days_jobs (параметры, курсор и прогресс /api/admin/grant-days)
+
+Запуск:
+    python -m migrations.add_grant_days_jobs
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию в путь
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.database import engine
+from app.config import get_settings
+from app.models.grant_days_job import GrantDaysJob
+
+
+async def run_migration():
+    """Выполняет миграцию"""
+    settings = get_settings()
+    print(f"Running migration: add_grant_days_jobs")
+    print(f"Database: {settings.database_url}")
+    print()
+
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(lambda sync_conn: GrantDaysJob.__table__.create(sync_conn, checkfirst=True))
+            print("  ✓ Table 'grant_days_jobs' ready")
+            print()
+
+            print("Migration completed successfully!")
+
+    except Exception as e:
+        print(f"✗ Migration failed: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    asyncio.run(run_migration())
@@ -0,0 +1,84 @@
+"""
+Миграция: составные и частичные индексы для горячих запросов
+
+users:
+- ix_users_active_expires (subscription_expires_at, last_notification_sent_at) WHERE is_active = 1
+  уведомления об истечении, "истекает сегодня/завтра" и число активных подписок в админке
+- ix_users_auto_renew_expires (subscription_expires_at, payment_method_id) WHERE auto_renew_enabled = 1
+  кандидаты на автопродление, число включённых автопродлений
+- ix_users_created_at (created_at) - новые пользователи за день
+- ix_users_channel_bonus_received_at (channel_bonus_received_at) WHERE channel_bonus_received_at IS NOT NULL
+- ix_users_trial_used (telegram_id) WHERE trial_used = 1 - конверсия trial -> платный
+
+payments:
+- ix_payments_user_status_created (user_id, status, created_at) - проверки автопродления
+- ix_payments_status_paid_at (status, paid_at) - оплаченные платежи за период
+
+Проверка планов запросов: python scripts/check_query_plans.py --current
+
+Запуск:
+    python -m migrations.add_hot_query_indexes
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию в путь
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from sqlalchemy import text
+from app.database import engine
+from app.config import get_settings
+
+
+# {true} - литерал истины диалекта: условие частичного индекса в SQLite должно
+# совпадать с тем, как SQLAlchemy рендерит "== True" в запросах (= 1)
+INDEXES = {
+    "users": [
+        ("ix_users_active_expires",
+         "(subscription_expires_at, last_notification_sent_at) WHERE is_active = {true}"),
+        ("ix_users_auto_renew_expires",
+         "(subscription_expires_at, payment_method_id) WHERE auto_renew_enabled = {true}"),
+        ("ix_users_created_at", "(created_at)"),
+        ("ix_users_channel_bonus_received_at",
+         "(channel_bonus_received_at) WHERE channel_bonus_received_at IS NOT NULL"),
+        ("ix_users_trial_used", "(telegram_id) WHERE trial_used = {true}"),
+    ],
+    "payments": [
+        ("ix_payments_user_status_created", "(user_id, status, created_at)"),
+        ("ix_payments_status_paid_at", "(status, paid_at)"),
+    ],
+}
+
+
+async def run_migration():
+    """Выполняет миграцию"""
+    settings = get_settings()
+    print(f"Running migration: add_hot_query_indexes")
+    print(f"Database: {settings.database_url}")
+    print()
+
+    try:
+        async with engine.begin() as conn:
+            true_literal = "TRUE" if conn.dialect.name == "postgresql" else "1"
+            for table, indexes in INDEXES.items():
+                print(f"Migrating table '{table}':")
+                for name, definition in indexes:
+                    await conn.execute(text(
+                        f"CREATE INDEX IF NOT EXISTS {name} ON {table} "
+                        + definition.format(true=true_literal)
+                    ))
+                    print(f"  ✓ Index '{name}' ready")
+                print()
+
+            print("Migration completed successfully!")
+
+    except Exception as e:
+        print(f"✗ Migration failed: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    asyncio.run(run_migration())
@@ -0,0 +1,86 @@
+"""
+Миграция: локальное зеркало состояния пользователя в Remnawave
+
+Новые поля в users:
+- remnawave_status: статус в панели (ACTIVE, DISABLED, LIMITED, EXPIRED)
+- traffic_used_bytes: использованный трафик
+- traffic_limit_bytes: лимит трафика
+- panel_synced_at: когда зеркало последний раз обновлялось из панели
+
+Запуск:
+    python -m migrations.add_panel_mirror_fields
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию в путь
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from sqlalchemy import inspect, text
+from app.database import engine
+from app.config import get_settings
+
+
+async def add_column_if_not_exists(conn, table: str, column: str, column_type: str):
+    """Добавить колонку если её нет"""
+    columns = await conn.run_sync(
+        lambda sync_conn: [c["name"] for c in inspect(sync_conn).get_columns(table)]
+    )
+
+    if column in columns:
+        print(f"  ✓ Column '{table}.{column}' already exists, skipping")
+        return False
+
+    await conn.execute(text(f"""
+        ALTER TABLE {table}
+        ADD COLUMN {column} {column_type}
+    """))
+    print(f"  ✓ Column '{table}.{column}' added successfully")
+    return True
+
+
+async def run_migration():
+    """Выполняет миграцию"""
+    settings = get_settings()
+    print(f"Running migration: add_panel_mirror_fields")
+    print(f"Database: {settings.database_url}")
+    print()
+
+    try:
+        async with engine.begin() as conn:
+            # === Таблица users ===
+            print("Migrating table 'users':")
+
+            await add_column_if_not_exists(
+                conn, "users", "remnawave_status",
+                "VARCHAR(16) NULL"
+            )
+
+            await add_column_if_not_exists(
+                conn, "users", "traffic_used_bytes",
+                "BIGINT DEFAULT 0 NOT NULL"
+            )
+
+            await add_column_if_not_exists(
+                conn, "users", "traffic_limit_bytes",
+                "BIGINT DEFAULT 0 NOT NULL"
+            )
+
+            await add_column_if_not_exists(
+                conn, "users", "panel_synced_at",
+                "TIMESTAMP NULL"
+            )
+
+            print()
+            print("Migration completed successfully!")
+
+    except Exception as e:
+        print(f"✗ Migration failed: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    asyncio.run(run_migration())
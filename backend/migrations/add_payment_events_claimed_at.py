@@ -0,0 +1,80 @@
+"""
+Миграция: аренда событий outbox
+
+Новые поля в payment_events:
+- claimed_at: когда событие взято воркером в processing. Воркеров несколько
+  (процессы API), зависшими считаются только события, взятые дольше таймаута.
+
+Запуск:
+    python -m migrations.add_payment_events_claimed_at
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию в путь
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from sqlalchemy import inspect, text
+from app.database import engine
+from app.config import get_settings
+
+
+async def table_exists(conn, table: str) -> bool:
+    """Проверить наличие таблицы"""
+    return await conn.run_sync(lambda sync_conn: inspect(sync_conn).has_table(table))
+
+
+async def add_column_if_not_exists(conn, table: str, column: str, column_type: str):
+    """Добавить колонку если её нет"""
+    columns = await conn.run_sync(
+        lambda sync_conn: [c["name"] for c in inspect(sync_conn).get_columns(table)]
+    )
+
+    if column in columns:
+        print(f"  ✓ Column '{table}.{column}' already exists, skipping")
+        return False
+
+    await conn.execute(text(f"""
+        ALTER TABLE {table}
+        ADD COLUMN {column} {column_type}
+    """))
+    print(f"  ✓ Column '{table}.{column}' added successfully")
+    return True
+
+
+async def run_migration():
+    """Выполняет миграцию"""
+    settings = get_settings()
+    print(f"Running migration: add_payment_events_claimed_at")
+    print(f"Database: {settings.database_url}")
+    print()
+
+    try:
+        async with engine.begin() as conn:
+            # === Таблица payment_events ===
+            print("Migrating table 'payment_events':")
+
+            if not await table_exists(conn, "payment_events"):
+                print("  ✓ Table 'payment_events' not found, it will be created on startup")
+                print()
+                print("Migration completed successfully!")
+                return
+
+            await add_column_if_not_exists(
+                conn, "payment_events", "claimed_at",
+                "TIMESTAMP NULL"
+            )
+
+            print()
+            print("Migration completed successfully!")
+
+    except Exception as e:
+        print(f"✗ Migration failed: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    asyncio.run(run_migration())
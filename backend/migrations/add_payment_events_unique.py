@@ -0,0 +1,81 @@
+"""
+Миграция: журнал уведомлений YooKassa с уникальным ключом
+
+payment_events становится журналом событий:
+- UNIQUE (yookassa_payment_id, event) - повторная доставка уведомления
+  отсекается в webhook одним запросом по индексу
+- индекс ix_payment_events_yookassa_payment_id больше не нужен
+  (его покрывает уникальный индекс)
+
+Перед созданием индекса удаляются дубликаты (остаётся самая ранняя запись).
+
+Запуск:
+    python -m migrations.add_payment_events_unique
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию в путь
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from sqlalchemy import inspect, text
+from app.database import engine
+from app.config import get_settings
+
+
+async def table_exists(conn, table: str) -> bool:
+    """Проверить наличие таблицы"""
+    return await conn.run_sync(lambda sync_conn: inspect(sync_conn).has_table(table))
+
+
+async def run_migration():
+    """Выполняет миграцию"""
+    settings = get_settings()
+    print(f"Running migration: add_payment_events_unique")
+    print(f"Database: {settings.database_url}")
+    print()
+
+    try:
+        async with engine.begin() as conn:
+            # === Таблица payment_events ===
+            print("Migrating table 'payment_events':")
+
+            if not await table_exists(conn, "payment_events"):
+                print("  ✓ Table 'payment_events' not found, it will be created on startup")
+                print()
+                print("Migration completed successfully!")
+                return
+
+            result = await conn.execute(text("""
+                DELETE FROM payment_events
+                WHERE id NOT IN (
+                    SELECT MIN(id) FROM payment_events
+                    GROUP BY yookassa_payment_id, event
+                )
+            """))
+            print(f"  ✓ Removed {result.rowcount} duplicate events")
+
+            await conn.execute(text("""
+                CREATE UNIQUE INDEX IF NOT EXISTS uq_payment_events_payment_event
+                ON payment_events (yookassa_payment_id, event)
+            """))
+            print("  ✓ Index 'uq_payment_events_payment_event' ready")
+
+            await conn.execute(text("""
+                DROP INDEX IF EXISTS ix_payment_events_yookassa_payment_id
+            """))
+            print("  ✓ Index 'ix_payment_events_yookassa_payment_id' dropped")
+
+            print()
+            print("Migration completed successfully!")
+
+    except Exception as e:
+        print(f"✗ Migration failed: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    asyncio.run(run_migration())
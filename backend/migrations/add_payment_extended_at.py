@@ -0,0 +1,82 @@
+"""
+Миграция: отметка о продлении подписки по платежу
+
+Новые поля в payments:
+- extended_at: когда подписка продлена по этому платежу.
+  Повторные уведомления YooKassa не продлевают подписку второй раз.
+
+Уже оплаченные платежи помечаются продлёнными (extended_at = paid_at),
+иначе повторное уведомление по старому платежу продлило бы подписку снова.
+
+Таблица payment_events (outbox уведомлений) создаётся автоматически при старте (init_db).
+
+Запуск:
+    python -m migrations.add_payment_extended_at
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию в путь
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from sqlalchemy import inspect, text
+from app.database import engine
+from app.config import get_settings
+
+
+async def add_column_if_not_exists(conn, table: str, column: str, column_type: str):
+    """Добавить колонку если её нет"""
+    columns = await conn.run_sync(
+        lambda sync_conn: [c["name"] for c in inspect(sync_conn).get_columns(table)]
+    )
+
+    if column in columns:
+        print(f"  ✓ Column '{table}.{column}' already exists, skipping")
+        return False
+
+    await conn.execute(text(f"""
+        ALTER TABLE {table}
+        ADD COLUMN {column} {column_type}
+    """))
+    print(f"  ✓ Column '{table}.{column}' added successfully")
+    return True
+
+
+async def run_migration():
+    """Выполняет миграцию"""
+    settings = get_settings()
+    print(f"Running migration: add_payment_extended_at")
+    print(f"Database: {settings.database_url}")
+    print()
+
+    try:
+        async with engine.begin() as conn:
+            # === Таблица payments ===
+            print("Migrating table 'payments':")
+
+            added = await add_column_if_not_exists(
+                conn, "payments", "extended_at",
+                "TIMESTAMP NULL"
+            )
+
+            if added:
+                result = await conn.execute(text("""
+                    UPDATE payments
+                    SET extended_at = COALESCE(paid_at, created_at)
+                    WHERE status = 'succeeded'
+                """))
+                print(f"  ✓ Marked {result.rowcount} succeeded payments as extended")
+
+            print()
+            print("Migration completed successfully!")
+
+    except Exception as e:
+        print(f"✗ Migration failed: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    asyncio.run(run_migration())
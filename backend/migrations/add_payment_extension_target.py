@@ -0,0 +1,75 @@
+"""
+Миграция: целевой expireAt продления по платежу
+
+Новые поля в payments:
+- extension_base_at: expireAt в панели до продления по платежу.
+- extension_target_at: expireAt, который выставляется в панели по платежу.
+  Оба записываются до первого запроса в панель; повтор продления после таймаута
+  или ошибки commit сверяет их с панелью и не добавляет дни второй раз.
+
+Запуск:
+    python -m migrations.add_payment_extension_target
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию в путь
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from sqlalchemy import inspect, text
+from app.database import engine
+from app.config import get_settings
+
+
+async def add_column_if_not_exists(conn, table: str, column: str, column_type: str):
+    """Добавить колонку если её нет"""
+    columns = await conn.run_sync(
+        lambda sync_conn: [c["name"] for c in inspect(sync_conn).get_columns(table)]
+    )
+
+    if column in columns:
+        print(f"  ✓ Column '{table}.{column}' already exists, skipping")
+        return False
+
+    await conn.execute(text(f"""
+        ALTER TABLE {table}
+        ADD COLUMN {column} {column_type}
+    """))
+    print(f"  ✓ Column '{table}.{column}' added successfully")
+    return True
+
+
+async def run_migration():
+    """Выполняет миграцию"""
+    settings = get_settings()
+    print(f"Running migration: add_payment_extension_target")
+    print(f"Database: {settings.database_url}")
+    print()
+
+    try:
+        async with engine.begin() as conn:
+            # === Таблица payments ===
+            print("Migrating table 'payments':")
+
+            await add_column_if_not_exists(
+                conn, "payments", "extension_base_at",
+                "TIMESTAMP NULL"
+            )
+            await add_column_if_not_exists(
+                conn, "payments", "extension_target_at",
+                "TIMESTAMP NULL"
+            )
+
+            print()
+            print("Migration completed successfully!")
+
+    except Exception as e:
+        print(f"✗ Migration failed: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    asyncio.run(run_migration())
@@ -0,0 +1,82 @@
+"""
+Миграция: повторное использование неоплаченного платежа
+
+Новые поля в payments:
+- confirmation_url: URL оплаты YooKassa (отдаётся при повторном нажатии "Оплатить")
+- save_payment_method: запрошено ли сохранение способа оплаты
+
+Индекс ix_payments_reuse_lookup (telegram_id, tariff_id, status, created_at) -
+поиск свежего pending платежа пользователя по тарифу.
+
+Запуск:
+    python -m migrations.add_payment_reuse_fields
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию в путь
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from sqlalchemy import inspect, text
+from app.database import engine
+from app.config import get_settings
+
+
+async def add_column_if_not_exists(conn, table: str, column: str, column_type: str):
+    """Добавить колонку если её нет"""
+    columns = await conn.run_sync(
+        lambda sync_conn: [c["name"] for c in inspect(sync_conn).get_columns(table)]
+    )
+
+    if column in columns:
+        print(f"  ✓ Column '{table}.{column}' already exists, skipping")
+        return False
+
+    await conn.execute(text(f"""
+        ALTER TABLE {table}
+        ADD COLUMN {column} {column_type}
+    """))
+    print(f"  ✓ Column '{table}.{column}' added successfully")
+    return True
+
+
+async def run_migration():
+    """Выполняет миграцию"""
+    settings = get_settings()
+    print(f"Running migration: add_payment_reuse_fields")
+    print(f"Database: {settings.database_url}")
+    print()
+
+    try:
+        async with engine.begin() as conn:
+            # === Таблица payments ===
+            print("Migrating table 'payments':")
+
+            await add_column_if_not_exists(
+                conn, "payments", "confirmation_url",
+                "VARCHAR(512) NULL"
+            )
+            await add_column_if_not_exists(
+                conn, "payments", "save_payment_method",
+                "BOOLEAN DEFAULT FALSE"
+            )
+
+            await conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_payments_reuse_lookup
+                ON payments (telegram_id, tariff_id, status, created_at)
+            """))
+            print("  ✓ Index 'ix_payments_reuse_lookup' ready")
+
+            print()
+            print("Migration completed successfully!")
+
+    except Exception as e:
+        print(f"✗ Migration failed: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    asyncio.run(run_migration())
@@ -13,7 +13,7 @@ from pathlib import Path
 backend_dir = Path(__file__).parent.parent
 sys.path.insert(0, str(backend_dir))
 
-from sqlalchemy import text
+from sqlalchemy import inspect, text
 from app.database import engine
 from app.config import get_settings
 
@@ -26,22 +26,19 @@ async def run_migration():
     
     try:
         async with engine.begin() as conn:
-            # Проверяем, существует ли уже колонка
-            result = await conn.execute(text("""
-                SELECT COUNT(*) as cnt 
-                FROM pragma_table_info('users') 
-                WHERE name='terms_accepted_at'
-            """))
-            row = result.fetchone()
+            # Проверяем, существует ли уже колонка (SQLite и PostgreSQL)
+            columns = await conn.run_sync(
+                lambda sync_conn: [c["name"] for c in inspect(sync_conn).get_columns("users")]
+            )
             
-            if row and row[0] > 0:
+            if "terms_accepted_at" in columns:
                 print("✓ Column 'terms_accepted_at' already exists, skipping migration")
                 return
             
             # Добавляем колонку
             await conn.execute(text("""
                 ALTER TABLE users 
-                ADD COLUMN terms_accepted_at DATETIME NULL
+                ADD COLUMN terms_accepted_at TIMESTAMP NULL
             """))
             print("✓ Column 'terms_accepted_at' added successfully")
             
@@ -0,0 +1,60 @@
+"""
+Миграция: полнотекстовый поиск пользователей (SQLite FTS5)
+
+- Виртуальная таблица users_fts (telegram_username, first_name, last_name,
+  referral_code, remnawave_username) поверх users
+- Триггеры users_fts_ai / users_fts_ad / users_fts_au - синхронизация с users
+- Заполнение индекса из существующих строк (rebuild)
+
+В PostgreSQL не нужна: поиск там идёт через ILIKE.
+
+Запуск:
+    python -m migrations.add_users_fts
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию в путь
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from sqlalchemy import text
+from app.database import engine
+from app.config import get_settings
+from app.models.user_fts import USERS_FTS_DDL
+
+
+async def run_migration():
+    """Выполняет миграцию"""
+    settings = get_settings()
+    print(f"Running migration: add_users_fts")
+    print(f"Database: {settings.database_url}")
+    print()
+
+    try:
+        async with engine.begin() as conn:
+            if conn.dialect.name != "sqlite":
+                print("  ✓ Not SQLite, nothing to do")
+                return
+
+            for statement in USERS_FTS_DDL:
+                await conn.execute(text(statement))
+            print("  ✓ Table 'users_fts' and triggers ready")
+
+            # Индекс строится заново из users - безопасно запускать повторно
+            await conn.execute(text("INSERT INTO users_fts(users_fts) VALUES ('rebuild')"))
+            indexed = (await conn.execute(text("SELECT COUNT(*) FROM users"))).scalar()
+            print(f"  ✓ Indexed {indexed} users")
+            print()
+
+            print("Migration completed successfully!")
+
+    except Exception as e:
+        print(f"✗ Migration failed: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    asyncio.run(run_migration())
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк конкурентного чтения/записи SQLite с PRAGMA по умолчанию и с настройками из Settings.
+
+Моделирует backend + bot на одном файле БД: N читателей делают короткие SELECT
+(как /api/users/me), писатель выполняет длинные транзакции пачками UPDATE
+(как синхронизация с Remnawave в scheduler). Для каждого режима создаётся
+отдельный временный файл БД - journal_mode=WAL сохраняется в файле.
+
+default - как было: NullPool, PRAGMA по умолчанию.
+tuned - как app/database.py: пул соединений, PRAGMA из Settings.
+
+Запуск:
+    cd backend
+    python scripts/bench_sqlite.py
+
+    # Дольше и больше читателей:
+    python scripts/bench_sqlite.py --seconds 30 --readers 50
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Добавляем путь к приложению (родитель папки scripts)
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+
+from app.database import apply_sqlite_pragmas, sqlite_pragmas
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+async def run_mode(name: str, tuned: bool, args) -> dict:
+    """Прогнать нагрузку на новом файле БД"""
+    db_file = Path(tempfile.mkdtemp()) / "bench.db"
+    engine_kwargs = {"poolclass": NullPool}
+    if tuned:
+        engine_kwargs = {"poolclass": AsyncAdaptedQueuePool, "pool_size": args.readers + 2}
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{db_file}",
+        connect_args={"check_same_thread": False},
+        **engine_kwargs,
+    )
+    if tuned:
+        pragmas = sqlite_pragmas()
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def _on_connect(dbapi_connection, connection_record):
+            apply_sqlite_pragmas(dbapi_connection, pragmas)
+
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            "CREATE TABLE users (id INTEGER PRIMARY KEY, telegram_id INTEGER UNIQUE, "
+            "traffic_used_bytes INTEGER, panel_synced_at TEXT)"
+        ))
+        await conn.execute(
+            text("INSERT INTO users (telegram_id, traffic_used_bytes) VALUES (:t, 0)"),
+            [{"t": 1_000_000 + i} for i in range(args.users)],
+        )
+
+    stats = {"read_ms": [], "write_ms": [], "read_errors": 0, "write_errors": 0}
+    deadline = time.perf_counter() + args.seconds
+
+    async def reader():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                async with engine.connect() as conn:
+                    await conn.execute(
+                        text("SELECT * FROM users WHERE telegram_id = :t"),
+                        {"t": 1_000_000 + random.randrange(args.users)},
+                    )
+                stats["read_ms"].append((time.perf_counter() - started) * 1000)
+            except OperationalError:
+                stats["read_errors"] += 1
+            await asyncio.sleep(0.001)
+
+    async def writer():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                async with engine.begin() as conn:
+                    for _ in range(args.write_batches):
+                        offset = random.randrange(args.users)
+                        await conn.execute(
+                            text(
+                                "UPDATE users SET traffic_used_bytes = traffic_used_bytes + 1, "
+                                "panel_synced_at = datetime('now') WHERE id BETWEEN :a AND :b"
+                            ),
+                            {"a": offset, "b": offset + args.batch_size},
+                        )
+                        # Пауза внутри транзакции - как ожидание ответа панели
+                        await asyncio.sleep(args.write_pause_ms / 1000)
+                stats["write_ms"].append((time.perf_counter() - started) * 1000)
+            except OperationalError:
+                stats["write_errors"] += 1
+
+    await asyncio.gather(writer(), *(reader() for _ in range(args.readers)))
+
+    async with engine.connect() as conn:
+        journal_mode = (await conn.exec_driver_sql("PRAGMA journal_mode")).scalar()
+    await engine.dispose()
+
+    return {
+        "mode": f"{name} ({journal_mode})",
+        "reads/s": len(stats["read_ms"]) / args.seconds,
+        "read p50 ms": percentile(stats["read_ms"], 0.5),
+        "read p99 ms": percentile(stats["read_ms"], 0.99),
+        "read errors": stats["read_errors"],
+        "write tx": len(stats["write_ms"]),
+        "write p50 ms": percentile(stats["write_ms"], 0.5),
+        "write errors": stats["write_errors"],
+    }
+
+
+async def main(args):
+    results = [
+        await run_mode("default", tuned=False, args=args),
+        await run_mode("tuned", tuned=True, args=args),
+    ]
+
+    print(f"readers={args.readers}, users={args.users}, seconds={args.seconds}")
+    print("tuned pragmas: " + ", ".join(f"{k}={v}" for k, v in sqlite_pragmas()))
+    print()
+    columns = list(results[0].keys())
+    print(" | ".join(f"{c:>16}" for c in columns))
+    for row in results:
+        print(" | ".join(
+            f"{v:>16.1f}" if isinstance(v, float) else f"{v!s:>16}" for v in row.values()
+        ))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SQLite concurrency benchmark")
+    parser.add_argument("--seconds", type=float, default=10, help="Длительность каждого режима")
+    parser.add_argument("--readers", type=int, default=20, help="Параллельных читателей")
+    parser.add_argument("--users", type=int, default=20000, help="Строк в таблице users")
+    parser.add_argument("--write-batches", type=int, default=20, help="UPDATE в одной транзакции")
+    parser.add_argument("--batch-size", type=int, default=200, help="Строк в одном UPDATE")
+    parser.add_argument("--write-pause-ms", type=float, default=20, help="Пауза между UPDATE внутри транзакции")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Проверка планов горячих запросов через EXPLAIN QUERY PLAN.
+
+Запросы строятся теми же функциями, что и выборки scheduler (автопродление,
+уведомления об истечении, дневная сводка) и статистики админки. Скрипт падает (код 1), если хоть один
+из них читает users / payments полным сканированием таблицы, а не по индексу.
+
+По умолчанию таблицы создаются по моделям во временной БД - проверяются индексы
+из кода. С --current проверяется БД из DATABASE_URL (применены ли миграции).
+
+Запуск:
+    cd backend
+    python scripts/check_query_plans.py
+
+    # Проверить рабочую БД после миграции add_hot_query_indexes:
+    python scripts/check_query_plans.py --current
+"""
+
+import argparse
+import asyncio
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Добавляем путь к приложению (родитель папки scripts)
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.database import Base, engine as app_engine
+from app.routers.admin import paid_payments_stats_query, top_referrers_query
+from app.scheduler.tasks.auto_renew import (
+    auto_renew_candidates_query,
+    failed_auto_payments_query,
+    recent_succeeded_payment_query,
+)
+from app.scheduler.tasks.daily_stats import (
+    day_buyers_query,
+    failed_auto_payments_count_query,
+    first_paid_purchase_query,
+)
+from app.scheduler.tasks.expiration_notify import users_to_notify_query
+
+# "SCAN users" без "INDEX" - полное сканирование таблицы
+FULL_SCAN = re.compile(r"^SCAN (users|payments)\b(?!.*INDEX)")
+
+
+def hot_queries() -> dict:
+    """Запросы задач и админки - их же построители, с правдоподобными параметрами"""
+    now = datetime.utcnow()
+    day_ago = now - timedelta(hours=24)
+    tomorrow = now + timedelta(days=1)
+
+    return {
+        "auto_renew: candidates": auto_renew_candidates_query(now, tomorrow),
+        "auto_renew: recent succeeded payment": recent_succeeded_payment_query(1, day_ago),
+        "auto_renew: failed auto payments": failed_auto_payments_query(1, day_ago),
+        "expiration_notify: users to notify": users_to_notify_query(now, tomorrow, day_ago),
+        # Счётчики по users считаются одним агрегатом за один проход по таблице -
+        # здесь только запрос по платежам, который должен идти по индексу статуса
+        "stats: succeeded payments aggregate": paid_payments_stats_query(day_ago),
+        "stats: top referrers": top_referrers_query(limit=5),
+        "daily_stats: failed auto payments of a day": failed_auto_payments_count_query(day_ago, now),
+        "daily_stats: buyers of a day": day_buyers_query(day_ago, now),
+        "daily_stats: first paid purchase of buyers": first_paid_purchase_query([1, 2, 3], day_ago),
+    }
+
+
+async def explain_all(engine) -> bool:
+    """Вывести планы запросов. Returns: True если полных сканирований нет"""
+
+    # Подменяем SQL на EXPLAIN QUERY PLAN - параметры обрабатываются как при обычном запросе
+    @event.listens_for(engine.sync_engine, "before_cursor_execute", retval=True)
+    def _explain(conn, cursor, statement, parameters, context, executemany):
+        if context.execution_options.get("explain_query_plan"):
+            statement = "EXPLAIN QUERY PLAN " + statement
+        return statement, parameters
+
+    ok = True
+    async with engine.connect() as conn:
+        for name, query in hot_queries().items():
+            result = await conn.execute(query.execution_options(explain_query_plan=True))
+            plan = [row[-1] for row in result.cursor.fetchall()]
+            full_scans = [line for line in plan if FULL_SCAN.match(line)]
+            ok = ok and not full_scans
+
+            print(f"{'FAIL' if full_scans else 'ok  '} {name}")
+            for line in plan:
+                print(f"       {line}")
+    return ok
+
+
+async def main(args) -> int:
+    if args.current:
+        engine = app_engine
+    else:
+        db_file = Path(tempfile.mkdtemp()) / "plans.db"
+        engine = create_async_engine(f"sqlite+aiosqlite:///{db_file}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    try:
+        ok = await explain_all(engine)
+    finally:
+        await engine.dispose()
+
+    print()
+    print("All hot queries use indexes" if ok else "Full table scans found")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EXPLAIN QUERY PLAN for hot queries")
+    parser.add_argument("--current", action="store_true", help="Проверить БД из DATABASE_URL")
+    sys.exit(asyncio.run(main(parser.parse_args())))
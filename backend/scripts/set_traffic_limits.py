@@ -39,33 +39,25 @@ async def set_traffic_limits(dry_run: bool = False):
         print("DRY RUN - изменения НЕ будут применены\n")
     print()
 
-    # Получаем всех пользователей (пагинация)
-    all_users = []
-    start = 0
-    size = 100
-
-    print("Загружаем пользователей из Remnawave...")
-
-    while True:
-        try:
-            users = await remnawave.get_all_users(start=start, size=size)
-            if not users:
-                break
-            all_users.extend(users)
-            print(f"   Загружено: {len(all_users)} пользователей...")
-            start += size
-        except RemnawaveError as e:
-            print(f"Ошибка при получении пользователей: {e}")
-            return
-
-    print(f"\nВсего пользователей: {len(all_users)}")
-
-    # Фильтруем только oblepiha_*
-    oblepiha_users = [u for u in all_users if u.get("username", "").startswith("oblepiha_")]
-    print(f"Пользователей Облепихи: {len(oblepiha_users)}")
+    # Перебираем пользователей постранично (следующая страница грузится в фоне)
+    # и держим в памяти только тех, кому нужно обновить лимит
+    total_count = 0
+    users_without_limit = []
+
+    print("Загружаем пользователей Облепихи из Remnawave...")
+
+    try:
+        async for user in remnawave.iter_all_users(page_size=100, username_prefix="oblepiha_"):
+            total_count += 1
+            if user.get("trafficLimitBytes", 0) == 0:
+                users_without_limit.append(user)
+            if total_count % 1000 == 0:
+                print(f"   Просмотрено: {total_count} пользователей...")
+    except RemnawaveError as e:
+        print(f"Ошибка при получении пользователей: {e}")
+        return
 
-    # Находим тех, у кого лимит = 0 (безлимит)
-    users_without_limit = [u for u in oblepiha_users if u.get("trafficLimitBytes", 0) == 0]
+    print(f"\nПользователей Облепихи: {total_count}")
     print(f"Без лимита трафика: {len(users_without_limit)}")
 
     if not users_without_limit:
@@ -131,7 +123,13 @@ def main():
     )
     args = parser.parse_args()
 
-    asyncio.run(set_traffic_limits(dry_run=args.dry_run))
+    async def run():
+        try:
+            await set_traffic_limits(dry_run=args.dry_run)
+        finally:
+            await get_remnawave_service().close()
+
+    asyncio.run(run())
 
 
 if __name__ == "__main__":
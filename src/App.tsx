@@ -8,7 +8,7 @@ import type { Tariff } from './types'
 
 function App() {
   const { firstName, userOS, tg } = useTelegram()
-  const { isLoading, error, stats, tariffs, user, createPayment, refreshStats, acceptTerms, toggleAutoRenew, deletePaymentMethod } = useUser()
+  const { isLoading, error, stats, tariffs, user, referrals, createPayment, refreshStats, acceptTerms, toggleAutoRenew, deletePaymentMethod } = useUser()
   
   const [selectedTariff, setSelectedTariff] = useState<Tariff | null>(null)
   const [activeTab, setActiveTab] = useState<'shop' | 'vpn' | 'friends'>('shop')
@@ -252,7 +252,7 @@ function App() {
         )
       
       case 'friends':
-        return <ReferralScreen />
+        return <ReferralScreen initialStats={referrals} />
       
       default:
         return null
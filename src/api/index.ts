@@ -37,6 +37,13 @@ export interface UserResponse {
   sbpPhone: string | null  // Последние 4 цифры телефона для СБП
 }
 
+export interface BootstrapResponse {
+  user: UserResponse
+  stats: UserStats
+  tariffs: Tariff[]
+  referrals: ReferralStats
+}
+
 export interface PaymentResponse {
   paymentId: string
   confirmationUrl: string
@@ -111,6 +118,15 @@ async function apiFetch<T>(
  * API методы
  */
 export const api = {
+  /**
+   * Данные для старта приложения одним запросом:
+   * пользователь, статистика, тарифы и рефералы
+   * Создаёт пользователя если он новый
+   */
+  async getBootstrap(): Promise<BootstrapResponse> {
+    return apiFetch<BootstrapResponse>('/api/bootstrap')
+  },
+
   /**
    * Получить список тарифов
    */
@@ -148,9 +164,11 @@ export const api = {
   
   /**
    * Проверить статус платежа
+   * wait > 0 - сервер держит запрос до смены статуса (но не дольше wait секунд)
    */
-  async getPaymentStatus(paymentId: string): Promise<PaymentStatus> {
-    return apiFetch<PaymentStatus>(`/api/payments/${paymentId}/status`)
+  async getPaymentStatus(paymentId: string, wait = 0): Promise<PaymentStatus> {
+    const query = wait > 0 ? `?wait=${wait}` : ''
+    return apiFetch<PaymentStatus>(`/api/payments/${paymentId}/status${query}`)
   },
 
   /**
@@ -14,18 +14,24 @@ function StatCard({ value, label }: { value: number; label: string }) {
   )
 }
 
-export function ReferralScreen() {
-  const [stats, setStats] = useState<ReferralStats | null>(null)
-  const [isLoading, setIsLoading] = useState(true)
+interface ReferralScreenProps {
+  // Статистика из /api/bootstrap - если есть, повторно не запрашиваем
+  initialStats?: ReferralStats | null
+}
+
+export function ReferralScreen({ initialStats = null }: ReferralScreenProps) {
+  const [stats, setStats] = useState<ReferralStats | null>(initialStats)
+  const [isLoading, setIsLoading] = useState(!initialStats)
   const [copied, setCopied] = useState(false)
   const [showEarnMoreModal, setShowEarnMoreModal] = useState(false)
 
   useEffect(() => {
+    if (initialStats) return
     api.getReferralStats()
       .then(setStats)
       .catch(err => console.error('[Referral] Failed to load stats:', err))
       .finally(() => setIsLoading(false))
-  }, [])
+  }, [initialStats])
 
   const handleShare = () => {
     if (!stats) return
@@ -1,7 +1,7 @@
 import { useEffect, useState, useCallback } from 'react'
 import { api } from '../api'
 import type { UserStats, UserResponse } from '../api'
-import type { Tariff } from '../types'
+import type { Tariff, ReferralStats } from '../types'
 import { mockUserData } from '../config'
 
 // Проверка наличия Telegram initData
@@ -18,6 +18,7 @@ interface UseUserReturn {
   stats: UserStats | null
   tariffs: Tariff[]
   user: UserResponse | null
+  referrals: ReferralStats | null
 
   // Mock режим (для скриншотов без Telegram)
   isMockMode: boolean
@@ -37,6 +38,7 @@ export function useUser(): UseUserReturn {
   const [stats, setStats] = useState<UserStats | null>(null)
   const [tariffs, setTariffs] = useState<Tariff[]>([])
   const [user, setUser] = useState<UserResponse | null>(null)
+  const [referrals, setReferrals] = useState<ReferralStats | null>(null)
 
   // Флаг: используем моковые данные (нет Telegram auth)
   const useMockData = !hasTelegramAuth()
@@ -67,35 +69,25 @@ export function useUser(): UseUserReturn {
       }
 
       try {
-        // Загружаем параллельно: пользователя, статистику и тарифы
-        const [userResponse, statsResponse, tariffsResponse] = await Promise.all([
-          api.getCurrentUser().catch(err => {
-            console.error('Failed to get user:', err)
-            return null
-          }),
-          api.getUserStats().catch(err => {
-            console.error('Failed to get stats:', err)
-            return null
-          }),
-          api.getTariffs().catch(err => {
-            console.error('Failed to get tariffs:', err)
-            return []
-          }),
-        ])
-
-        if (userResponse) {
-          setUser(userResponse)
-        }
-
-        if (statsResponse) {
-          setStats(statsResponse)
-        }
+        // Один запрос: пользователь, статистика, тарифы и рефералы
+        const data = await api.getBootstrap()
 
-        setTariffs(tariffsResponse)
+        setUser(data.user)
+        setStats(data.stats)
+        setTariffs(data.tariffs)
+        setReferrals(data.referrals)
 
       } catch (err) {
         console.error('Failed to load user data:', err)
         setError(err instanceof Error ? err.message : 'Ошибка загрузки данных')
+
+        // Тарифы публичные - показываем их даже если bootstrap не удался
+        try {
+          setTariffs(await api.getTariffs())
+        } catch (tariffsErr) {
+          console.error('Failed to get tariffs:', tariffsErr)
+          setTariffs([])
+        }
       } finally {
         setIsLoading(false)
       }
@@ -217,6 +209,7 @@ export function useUser(): UseUserReturn {
     stats,
     tariffs,
     user,
+    referrals,
     isMockMode: useMockData,
     refreshStats,
     createPayment,